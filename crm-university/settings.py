@@ -1,6 +1,8 @@
 
 import os
 
+from student_management_app.db_config import database_settings, replica_database_settings
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -31,11 +33,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'student_management_app.QueryCountMiddleWare.QueryCountMiddleWare',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'student_management_app.ReadYourWritesMiddleWare.ReadYourWritesMiddleWare',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -66,13 +70,23 @@ WSGI_APPLICATION = 'crm-university.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Set with DATABASE_* environment variables (engine, credentials, CONN_MAX_AGE, health checks and
+# an optional connection pool), see student_management_app/db_config.py. Without them: db.sqlite3.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': database_settings(os.environ, default_name=os.path.join(BASE_DIR, 'db.sqlite3')),
 }
 
+# Read replica (student_management_app.db_router), configured with DATABASE_REPLICA_* variables:
+# the reads of @read_replica views go to it, except for DATABASE_REPLICA_LAG_SECONDS after the
+# same user wrote to the primary
+DATABASE_REPLICA = None
+replica_database = replica_database_settings(os.environ, DATABASES['default'])
+if replica_database:
+    DATABASES['replica'] = replica_database
+    DATABASE_REPLICA = 'replica'
+DATABASE_REPLICA_LAG_SECONDS = 5
+DATABASE_ROUTERS = ['student_management_app.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -119,9 +133,92 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Exports and uploaded imports of the background tasks, outside MEDIA_ROOT: they are only served
+# by views that check the user (see tasks.py)
+PRIVATE_FILES_ROOT = os.path.join(BASE_DIR, 'private')
+
 
 #For Custom USER
 AUTH_USER_MODEL = "student_management_app.CustomUser"
 
 # Registering Custom Backend "EmailBackEnd"
 AUTHENTICATION_BACKENDS = ['student_management_app.EmailBackEnd.EmailBackEnd']
+
+
+# Request metrics (QueryCountMiddleWare): Server-Timing header and one JSON log line per request
+# The middleware removes itself when QUERY_COUNT_ENABLED is False
+QUERY_COUNT_ENABLED = False
+# Log every SQL query of requests running more queries than this (None to disable)
+QUERY_COUNT_THRESHOLD = 200
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'student_management_app.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Caches. locmem is per process: with several workers use a shared backend, e.g.
+# 'django.core.cache.backends.filebased.FileBasedCache' with 'LOCATION': '/var/tmp/crm_cache'
+# or 'django.core.cache.backends.redis.RedisCache' with 'LOCATION': 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Dashboard cache (student_management_app.dashboard_cache): cache alias and seconds a context is kept
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Attendance storage (student_management_app.attendance_storage): 'rows' keeps one AttendanceReport
+# per Student and lecture, 'packed' one PackedAttendance per lecture (for large cohorts).
+# Convert existing data with "manage.py convert_attendance_storage --to ..." before switching.
+ATTENDANCE_STORAGE = 'rows'
+
+# Background tasks (student_management_app.tasks), run by "manage.py run_task_worker":
+# first retry delay in seconds (doubled on every attempt), and seconds without progress
+# after which a running task is taken over by another worker
+TASK_RETRY_DELAY = 10
+TASK_STALE_SECONDS = 600
+
+# Processes hashing the passwords of a CSV student import (None: one per CPU)
+IMPORT_HASH_PROCESSES = None
+
+# Password hashing: the first hasher makes new hashes, the others still check old ones.
+# PASSWORD_HASH_ITERATIONS sets the PBKDF2 cost (None: Django's default); hashes made with
+# another cost are saved again at their next login.
+PASSWORD_HASHERS = [
+    'student_management_app.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = None
+
+# Login (student_management_app.login_guard): seconds an unknown email is remembered, failed
+# logins allowed per email from one client address and per email from all addresses within
+# LOGIN_FAILURE_WINDOW seconds
+LOGIN_CACHE_ALIAS = 'default'
+LOGIN_UNKNOWN_EMAIL_TIMEOUT = 60
+LOGIN_FAILURE_LIMIT = 10
+LOGIN_EMAIL_FAILURE_LIMIT = 1000
+LOGIN_FAILURE_WINDOW = 300
+
+# Async views (the login and the AJAX endpoints of AsyncViews) instead of the sync ones, for ASGI
+# deployments: asgi.py sets DJANGO_ASYNC_VIEWS=1. Under WSGI the sync views are faster.
+#   WSGI: gunicorn crm-university.wsgi --workers 4 --threads 8
+#   ASGI: uvicorn crm-university.asgi:application --workers 4   (or: daphne crm-university.asgi:application)
+# Compare both with "manage.py run_benchmarks --concurrency".
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '') == '1'
@@ -0,0 +1,53 @@
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+
+from .attendance import roll_call_version, roll_call_rows, attendance_dates_version, attendance_dates_rows, attendance_students_version, attendance_students_rows
+from .attendance_matrix import AttendanceMatrix, attendance_matrix_version
+from .jsonapi import json_array_response, json_etag, int_params, invalid_parameters
+
+
+# Versioned JSON API (/api/v1/...) used by the attendance pages of HODs and Staffs.
+# Every endpoint supports If-None-Match (see jsonapi), lists are returned as JSON arrays.
+
+
+@require_GET
+def attendance_roll_call(request):
+    # Students of the Subject's Course in a Session Year: [{"id": admin_id, "name": ...}]
+    params = int_params(request.GET, "subject", "session_year")
+    if params is None:
+        return invalid_parameters("subject", "session_year")
+    return json_array_response(request, roll_call_version(*params), roll_call_rows(*params))
+
+
+@require_GET
+def attendance_dates(request):
+    # Attendance taken for a Subject in a Session Year: [{"id", "attendance_date", "session_year_id"}]
+    params = int_params(request.GET, "subject", "session_year")
+    if params is None:
+        return invalid_parameters("subject", "session_year")
+    return json_array_response(request, attendance_dates_version(*params), attendance_dates_rows(*params))
+
+
+@require_GET
+def attendance_students(request):
+    # Reports of one Attendance: [{"id": admin_id, "name": ..., "status": true/false}]
+    params = int_params(request.GET, "attendance")
+    if params is None:
+        return invalid_parameters("attendance")
+    return json_array_response(request, attendance_students_version(*params), attendance_students_rows(*params))
+
+
+@require_GET
+def attendance_matrix(request):
+    # Register grid of a Subject in a Session Year (see attendance_matrix.AttendanceMatrix.as_json)
+    params = int_params(request.GET, "subject", "session_year")
+    if params is None:
+        return invalid_parameters("subject", "session_year")
+    etag = json_etag(attendance_matrix_version(*params))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(AttendanceMatrix.build(*params).as_json())
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,63 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+
+from student_management_app.models import CustomUser
+from .attendance import aroll_call_rows, aattendance_dates_rows, attendance_students_rows
+from .LoginCheckMiddleWare import allow_roles
+
+
+# Async versions of the AJAX endpoints polled by the attendance and add user pages, used instead
+# of the sync ones when ASYNC_VIEWS is on (ASGI deployments, see asgi.py). They answer the same
+# requests with the same responses, reading through the async ORM, so a request waiting on the
+# database does not hold a thread. Each one is opened to the role of the view it replaces.
+
+
+def async_csrf_exempt(view_func):
+    # csrf_exempt of Django 4.2 wraps views in a sync function, which hides coroutines
+    @wraps(view_func)
+    async def wrapper_view(request, *args, **kwargs):
+        return await view_func(request, *args, **kwargs)
+
+    wrapper_view.csrf_exempt = True
+    return wrapper_view
+
+
+@allow_roles("2")
+@async_csrf_exempt
+async def get_students(request):
+    subject_id = request.POST.get("subject")
+    session_year = request.POST.get("session_year")
+    return JsonResponse([row async for row in aroll_call_rows(subject_id, session_year)], safe=False)
+
+
+@allow_roles("2")
+@async_csrf_exempt
+async def get_attendance_dates(request):
+    subject_id = request.POST.get("subject")
+    session_year = request.POST.get("session_year_id")
+    return JsonResponse([row async for row in aattendance_dates_rows(subject_id, session_year)], safe=False)
+
+
+@allow_roles("2")
+@async_csrf_exempt
+async def get_attendance_student(request):
+    # The attendance storage adapters are sync (packed rows are decoded in Python), so the rows are read in a thread
+    attendance_id = request.POST.get('attendance_date')
+    rows = await sync_to_async(lambda: list(attendance_students_rows(attendance_id)))()
+    return JsonResponse(rows, safe=False)
+
+
+@allow_roles("1")
+@async_csrf_exempt
+async def check_email_exist(request):
+    email = request.POST.get("email")
+    return HttpResponse(await CustomUser.objects.filter(email=email).aexists())
+
+
+@allow_roles("1")
+@async_csrf_exempt
+async def check_username_exist(request):
+    username = request.POST.get("username")
+    return HttpResponse(await CustomUser.objects.filter(username=username).aexists())
@@ -1,16 +1,57 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+from django.core.exceptions import PermissionDenied
+from django.db.models.functions import Lower
 
+from student_management_app.login_guard import clear_failed_logins, count_failed_login, is_unknown_email, login_throttled, remember_unknown_email
 
 
+# Users log in with their email, compared without case (customuser_email_lower_idx). Unknown
+# emails and throttled logins are answered from the cache (login_guard) before the password hash;
+# a throttled login raises PermissionDenied. aauthenticate runs the hash in a worker thread, so
+# async views do not block the event loop while it runs (hashlib releases the GIL).
+
 class EmailBackEnd(ModelBackend):
-    def authenticate(self, username=None, password=None, **kwargs):
-        UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = self.login_user(request, username)
+        if user is None:
+            return None
+        rehash = []
+        valid = check_password(password, user.password, rehash.append)
+        return self.checked(request, username, user, valid, rehash)
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        user = await sync_to_async(self.login_user)(request, username)
+        if user is None:
+            return None
+        rehash = []
+        valid = await sync_to_async(check_password, thread_sensitive=False)(password, user.password, rehash.append)
+        return await sync_to_async(self.checked)(request, username, user, valid, rehash)
+
+    def login_user(self, request, email):
+        # The user of the email, or None without reading the table when the email is known to be unknown
+        if not email:
+            return None
+        if login_throttled(request, email):
+            raise PermissionDenied("Too many failed logins.")
+        if is_unknown_email(email):
+            count_failed_login(request, email)
+            return None
+        user = get_user_model().objects.annotate(email_lower=Lower("email")).filter(email_lower=email.lower()).order_by("id").first()
+        if user is None:
+            remember_unknown_email(email)
+            count_failed_login(request, email)
+        return user
+
+    def checked(self, request, email, user, valid, rehash):
+        if not valid:
+            count_failed_login(request, email)
             return None
-        else:
-            if user.check_password(password):
-                return user
-        return None
\ No newline at end of file
+        if rehash:
+            # Stored with another hasher or a lower cost (PASSWORD_HASH_ITERATIONS), saved with the current one
+            user.set_password(rehash[0])
+            user.save(update_fields=["password"])
+        clear_failed_logins(request, email)
+        return user
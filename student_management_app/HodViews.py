@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage #To upload Profile Picture
 from django.urls import reverse
@@ -7,85 +7,35 @@ from django.views.decorators.csrf import csrf_exempt
 from django.core import serializers
 import json
 
-from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, SessionYearModel, FeedBackStudent, FeedBackStaffs, LeaveReportStudent, LeaveReportStaff, Attendance, AttendanceReport
+from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, SessionYearModel, FeedBackStudent, FeedBackStaffs, LeaveReportStudent, LeaveReportStaff, Attendance, AttendanceReport, BackgroundTask
 from .forms import AddStudentForm, EditStudentForm
+from .profiles import create_staff, create_student, update_profile
+from .attendance import attendance_dates_rows, attendance_students_rows
+from .dashboard import admin_dashboard_context
+from .dashboard_cache import cached_dashboard, dashboard_cache_stats
+from .datatables import Column, datatable_response, format_datetime
+from .db_backends.pool import pool_stats
+from .db_router import read_replica
+from .exports import EXPORTS, EXPORT_FORMATS, EXPORT_FILTERS, ExportError, export_chunks, content_type
+from .attendance_storage import STORAGES
+from .tasks import DONE, TASKS, submit, task_row, export_storage, import_storage
+
+
+@read_replica
+def admin_home(request):
+    # Same data for every HOD, so it is cached once for the role
+    context = cached_dashboard("admin", 0, admin_dashboard_context)
+    return render(request, "hod_template/home_content.html", context)
 
 
-def admin_home(request):
-    all_student_count = Students.objects.all().count()
-    subject_count = Subjects.objects.all().count()
-    course_count = Courses.objects.all().count()
-    staff_count = Staffs.objects.all().count()
-
-    # Total Subjects and students in Each Course
-    course_all = Courses.objects.all()
-    course_name_list = []
-    subject_count_list = []
-    student_count_list_in_course = []
-
-    for course in course_all:
-        subjects = Subjects.objects.filter(course_id=course.id).count()
-        students = Students.objects.filter(course_id=course.id).count()
-        course_name_list.append(course.course_name)
-        subject_count_list.append(subjects)
-        student_count_list_in_course.append(students)
-    
-    subject_all = Subjects.objects.all()
-    subject_list = []
-    student_count_list_in_subject = []
-    for subject in subject_all:
-        course = Courses.objects.get(id=subject.course_id.id)
-        student_count = Students.objects.filter(course_id=course.id).count()
-        subject_list.append(subject.subject_name)
-        student_count_list_in_subject.append(student_count)
-    
-    # For Saffs
-    staff_attendance_present_list=[]
-    staff_attendance_leave_list=[]
-    staff_name_list=[]
-
-    staffs = Staffs.objects.all()
-    for staff in staffs:
-        subject_ids = Subjects.objects.filter(staff_id=staff.admin.id)
-        attendance = Attendance.objects.filter(subject_id__in=subject_ids).count()
-        leaves = LeaveReportStaff.objects.filter(staff_id=staff.id, leave_status=1).count()
-        staff_attendance_present_list.append(attendance)
-        staff_attendance_leave_list.append(leaves)
-        staff_name_list.append(staff.admin.first_name)
-
-    # For Students
-    student_attendance_present_list=[]
-    student_attendance_leave_list=[]
-    student_name_list=[]
-
-    students = Students.objects.all()
-    for student in students:
-        attendance = AttendanceReport.objects.filter(student_id=student.id, status=True).count()
-        absent = AttendanceReport.objects.filter(student_id=student.id, status=False).count()
-        leaves = LeaveReportStudent.objects.filter(student_id=student.id, leave_status=1).count()
-        student_attendance_present_list.append(attendance)
-        student_attendance_leave_list.append(leaves+absent)
-        student_name_list.append(student.admin.first_name)
+def dashboard_cache_stats_view(request):
+    # Hit / miss counters of the dashboard cache
+    return JsonResponse(dashboard_cache_stats())
 
 
-    context={
-        "all_student_count": all_student_count,
-        "subject_count": subject_count,
-        "course_count": course_count,
-        "staff_count": staff_count,
-        "course_name_list": course_name_list,
-        "subject_count_list": subject_count_list,
-        "student_count_list_in_course": student_count_list_in_course,
-        "subject_list": subject_list,
-        "student_count_list_in_subject": student_count_list_in_subject,
-        "staff_attendance_present_list": staff_attendance_present_list,
-        "staff_attendance_leave_list": staff_attendance_leave_list,
-        "staff_name_list": staff_name_list,
-        "student_attendance_present_list": student_attendance_present_list,
-        "student_attendance_leave_list": student_attendance_leave_list,
-        "student_name_list": student_name_list,
-    }
-    return render(request, "hod_template/home_content.html", context)
+def database_pool_stats_view(request):
+    # Connections in use, waits and saturation of the database connection pools of this process
+    return JsonResponse(pool_stats())
 
 
 def add_staff(request):
@@ -105,9 +55,7 @@ def add_staff_save(request):
         address = request.POST.get('address')
 
         try:
-            user = CustomUser.objects.create_user(username=username, password=password, email=email, first_name=first_name, last_name=last_name, user_type=2)
-            user.staffs.address = address
-            user.save()
+            create_staff(username=username, password=password, email=email, first_name=first_name, last_name=last_name, address=address)
             messages.success(request, "Staff Added Successfully!")
             return redirect('add_staff')
         except:
@@ -116,12 +64,44 @@ def add_staff_save(request):
 
 
 
+@read_replica
 def manage_staff(request):
-    staffs = Staffs.objects.all()
-    context = {
-        "staffs": staffs
+    # Rows are loaded page by page from manage_staff_data
+    return render(request, "hod_template/manage_staff_template.html")
+
+
+STAFF_COLUMNS = [
+    Column("id", "admin_id"),
+    Column("first_name", "admin__first_name"),
+    Column("last_name", "admin__last_name"),
+    Column("username", "admin__username"),
+    Column("email", "admin__email"),
+    Column("date_joined", "admin__date_joined", is_datetime=True),
+]
+
+STAFF_SEARCH_FIELDS = ["admin__first_name", "admin__last_name", "admin__username", "admin__email"]
+
+
+def staff_row(staff):
+    return {
+        "id": staff.admin.id,
+        "first_name": staff.admin.first_name,
+        "last_name": staff.admin.last_name,
+        "username": staff.admin.username,
+        "email": staff.admin.email,
+        "address": staff.address,
+        "last_login": format_datetime(staff.admin.last_login),
+        "date_joined": format_datetime(staff.admin.date_joined),
+        "edit_url": reverse("edit_staff", kwargs={"staff_id": staff.admin.id}),
+        "delete_url": reverse("delete_staff", kwargs={"staff_id": staff.admin.id}),
     }
-    return render(request, "hod_template/manage_staff_template.html", context)
+
+
+@read_replica
+def manage_staff_data(request):
+    # DataTables server side data, one page per request
+    staffs = Staffs.objects.select_related("admin")
+    return datatable_response(request, staffs, STAFF_COLUMNS, STAFF_SEARCH_FIELDS, staff_row, key_field="admin_id")
 
 
 def edit_staff(request, staff_id):
@@ -146,18 +126,9 @@ def edit_staff_save(request):
         address = request.POST.get('address')
 
         try:
-            # INSERTING into Customuser Model
-            user = CustomUser.objects.get(id=staff_id)
-            user.first_name = first_name
-            user.last_name = last_name
-            user.email = email
-            user.username = username
-            user.save()
-            
-            # INSERTING into Staff Model
-            staff_model = Staffs.objects.get(admin=staff_id)
-            staff_model.address = address
-            staff_model.save()
+            # Staff and its CustomUser in one query, only changed fields are written
+            staff_model = Staffs.objects.select_related("admin").get(admin=staff_id)
+            update_profile(staff_model.admin, {"first_name": first_name, "last_name": last_name, "email": email, "username": username}, staff_model, {"address": address})
 
             messages.success(request, "Staff Updated Successfully.")
             return redirect('/edit_staff/'+staff_id)
@@ -201,6 +172,7 @@ def add_course_save(request):
             return redirect('add_course')
 
 
+@read_replica
 def manage_course(request):
     courses = Courses.objects.all()
     context = {
@@ -249,6 +221,7 @@ def delete_course(request, course_id):
         return redirect('manage_course')
 
 
+@read_replica
 def manage_session(request):
     session_years = SessionYearModel.objects.all()
     context = {
@@ -361,18 +334,9 @@ def add_student_save(request):
 
 
             try:
-                user = CustomUser.objects.create_user(username=username, password=password, email=email, first_name=first_name, last_name=last_name, user_type=3)
-                user.students.address = address
-
-                course_obj = Courses.objects.get(id=course_id)
-                user.students.course_id = course_obj
-
-                session_year_obj = SessionYearModel.objects.get(id=session_year_id)
-                user.students.session_year_id = session_year_obj
-
-                user.students.gender = gender
-                user.students.profile_pic = profile_pic_url
-                user.save()
+                # Course and Session Year ids were checked by the form choices
+                create_student(course_id=int(course_id), session_year_id=int(session_year_id), address=address, gender=gender, profile_pic=profile_pic_url,
+                               username=username, password=password, email=email, first_name=first_name, last_name=last_name)
                 messages.success(request, "Student Added Successfully!")
                 return redirect('add_student')
             except:
@@ -382,12 +346,42 @@ def add_student_save(request):
             return redirect('add_student')
 
 
+@read_replica
 def manage_student(request):
-    students = Students.objects.all()
-    context = {
-        "students": students
+    # Rows are loaded page by page from manage_student_data
+    return render(request, 'hod_template/manage_student_template.html')
+
+
+STUDENT_COLUMNS = STAFF_COLUMNS
+
+STUDENT_SEARCH_FIELDS = STAFF_SEARCH_FIELDS
+
+
+def student_row(student):
+    return {
+        "id": student.admin.id,
+        "first_name": student.admin.first_name,
+        "last_name": student.admin.last_name,
+        "username": student.admin.username,
+        "email": student.admin.email,
+        "address": student.address,
+        "gender": student.gender,
+        "profile_pic": student.profile_pic.name or "",
+        "session_start_year": str(student.session_year_id.session_start_year),
+        "session_end_year": str(student.session_year_id.session_end_year),
+        "course": student.course_id.course_name,
+        "last_login": format_datetime(student.admin.last_login),
+        "date_joined": format_datetime(student.admin.date_joined),
+        "edit_url": reverse("edit_student", kwargs={"student_id": student.admin.id}),
+        "delete_url": reverse("delete_student", kwargs={"student_id": student.admin.id}),
     }
-    return render(request, 'hod_template/manage_student_template.html', context)
+
+
+@read_replica
+def manage_student_data(request):
+    # DataTables server side data, one page per request
+    students = Students.objects.select_related("admin", "course_id", "session_year_id")
+    return datatable_response(request, students, STUDENT_COLUMNS, STUDENT_SEARCH_FIELDS, student_row, key_field="admin_id")
 
 
 def edit_student(request, student_id):
@@ -445,28 +439,12 @@ def edit_student_save(request):
                 profile_pic_url = None
 
             try:
-                # First Update into Custom User Model
-                user = CustomUser.objects.get(id=student_id)
-                user.first_name = first_name
-                user.last_name = last_name
-                user.email = email
-                user.username = username
-                user.save()
-
-                # Then Update Students Table
-                student_model = Students.objects.get(admin=student_id)
-                student_model.address = address
-
-                course = Courses.objects.get(id=course_id)
-                student_model.course_id = course
-
-                session_year_obj = SessionYearModel.objects.get(id=session_year_id)
-                student_model.session_year_id = session_year_obj
-
-                student_model.gender = gender
+                # Student and its CustomUser in one query, only changed fields are written
+                student_model = Students.objects.select_related("admin").get(admin=student_id)
+                student_values = {"address": address, "course_id_id": int(course_id), "session_year_id_id": int(session_year_id), "gender": gender}
                 if profile_pic_url != None:
-                    student_model.profile_pic = profile_pic_url
-                student_model.save()
+                    student_values["profile_pic"] = profile_pic_url
+                update_profile(student_model.admin, {"first_name": first_name, "last_name": last_name, "email": email, "username": username}, student_model, student_values)
                 # Delete student_id SESSION after the data is updated
                 del request.session['student_id']
 
@@ -524,6 +502,7 @@ def add_subject_save(request):
             return redirect('add_subject')
 
 
+@read_replica
 def manage_subject(request):
     subjects = Subjects.objects.all()
     context = {
@@ -609,6 +588,7 @@ def check_username_exist(request):
 
 
 
+@read_replica
 def student_feedback_message(request):
     feedbacks = FeedBackStudent.objects.all()
     context = {
@@ -632,6 +612,7 @@ def student_feedback_message_reply(request):
         return HttpResponse("False")
 
 
+@read_replica
 def staff_feedback_message(request):
     feedbacks = FeedBackStaffs.objects.all()
     context = {
@@ -655,6 +636,7 @@ def staff_feedback_message_reply(request):
         return HttpResponse("False")
 
 
+@read_replica
 def student_leave_view(request):
     leaves = LeaveReportStudent.objects.all()
     context = {
@@ -676,6 +658,7 @@ def student_leave_reject(request, leave_id):
     return redirect('student_leave_view')
 
 
+@read_replica
 def staff_leave_view(request):
     leaves = LeaveReportStaff.objects.all()
     context = {
@@ -698,6 +681,7 @@ def staff_leave_reject(request, leave_id):
     return redirect('staff_leave_view')
 
 
+@read_replica
 def admin_view_attendance(request):
     subjects = Subjects.objects.all()
     session_years = SessionYearModel.objects.all()
@@ -708,46 +692,23 @@ def admin_view_attendance(request):
     return render(request, "hod_template/admin_view_attendance.html", context)
 
 
+@read_replica
 @csrf_exempt
 def admin_get_attendance_dates(request):
     # Getting Values from Ajax POST 'Fetch Student'
+    # Same rows as the api/v1/attendance/dates/ endpoint, kept for older clients
     subject_id = request.POST.get("subject")
     session_year = request.POST.get("session_year_id")
-
-    # Students enroll to Course, Course has Subjects
-    # Getting all data from subject model based on subject_id
-    subject_model = Subjects.objects.get(id=subject_id)
-
-    session_model = SessionYearModel.objects.get(id=session_year)
-
-    # students = Students.objects.filter(course_id=subject_model.course_id, session_year_id=session_model)
-    attendance = Attendance.objects.filter(subject_id=subject_model, session_year_id=session_model)
-
-    # Only Passing Student Id and Student Name Only
-    list_data = []
-
-    for attendance_single in attendance:
-        data_small={"id":attendance_single.id, "attendance_date":str(attendance_single.attendance_date), "session_year_id":attendance_single.session_year_id.id}
-        list_data.append(data_small)
-
-    return JsonResponse(json.dumps(list_data), content_type="application/json", safe=False)
+    return JsonResponse(list(attendance_dates_rows(subject_id, session_year)), safe=False)
 
 
+@read_replica
 @csrf_exempt
 def admin_get_attendance_student(request):
     # Getting Values from Ajax POST 'Fetch Student'
-    attendance_date = request.POST.get('attendance_date')
-    attendance = Attendance.objects.get(id=attendance_date)
-
-    attendance_data = AttendanceReport.objects.filter(attendance_id=attendance)
-    # Only Passing Student Id and Student Name Only
-    list_data = []
-
-    for student in attendance_data:
-        data_small={"id":student.student_id.admin.id, "name":student.student_id.admin.first_name+" "+student.student_id.admin.last_name, "status":student.status}
-        list_data.append(data_small)
-
-    return JsonResponse(json.dumps(list_data), content_type="application/json", safe=False)
+    # Same rows as the api/v1/attendance/students/ endpoint, kept for older clients
+    attendance_id = request.POST.get('attendance_date')
+    return JsonResponse(list(attendance_students_rows(attendance_id)), safe=False)
 
 
 def admin_profile(request):
@@ -770,11 +731,7 @@ def admin_profile_update(request):
 
         try:
             customuser = CustomUser.objects.get(id=request.user.id)
-            customuser.first_name = first_name
-            customuser.last_name = last_name
-            if password != None and password != "":
-                customuser.set_password(password)
-            customuser.save()
+            update_profile(customuser, {"first_name": first_name, "last_name": last_name}, password=password)
             messages.success(request, "Profile Updated Successfully")
             return redirect('admin_profile')
         except:
@@ -791,4 +748,72 @@ def student_profile(requtest):
     pass
 
 
+def export_data(request, name, file_format):
+    # Streams a whole export (exports.EXPORTS) as CSV or XLSX, filtered by ?session_year=&course=&subject=
+    filters = {field: request.GET.get(field) or None for field in EXPORT_FILTERS}
+    try:
+        chunks = export_chunks(name, file_format, **filters)
+    except ExportError as e:
+        return JsonResponse({"status": "error", "error": str(e)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=content_type(file_format))
+    response["Content-Disposition"] = 'attachment; filename="%s.%s"' % (name, file_format)
+    return response
 
+
+def background_tasks(request):
+    # Queued and finished background tasks, with forms submitting new ones (see tasks.py)
+    context = {
+        "exports": EXPORTS,
+        "export_formats": EXPORT_FORMATS,
+        "storages": STORAGES,
+        "courses": Courses.objects.all(),
+        "subjects": Subjects.objects.all(),
+        "session_years": SessionYearModel.objects.all(),
+    }
+    return render(request, "hod_template/background_tasks_template.html", context)
+
+
+def background_tasks_data(request):
+    # The 50 latest tasks, polled by the background tasks page
+    tasks = BackgroundTask.objects.order_by("-id")[:50]
+    return JsonResponse({"tasks": [task_row(task) for task in tasks]})
+
+
+def download_export(request, task_id):
+    # The file of a finished export task, only for the HOD who queued it
+    task = BackgroundTask.objects.filter(id=task_id, name="export", status=DONE, created_by=request.user).first()
+    file_name = json.loads(task.result).get("file") if task is not None else None
+    storage = export_storage()
+    if not file_name or not storage.exists(file_name):
+        raise Http404("No such export.")
+    return FileResponse(storage.open(file_name, "rb"), as_attachment=True, filename=file_name)
+
+
+def submit_background_task(request):
+    if request.method != "POST":
+        messages.error(request, "Invalid Method!")
+        return redirect('background_tasks')
+    name = request.POST.get("task")
+    if name not in TASKS:
+        messages.error(request, "Unknown Task!")
+        return redirect('background_tasks')
+    params = {param: request.POST.get(param) or None for param in TASKS[name].params}
+    try:
+        task = submit(name, params, user=request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, "%s queued as task %d." % (TASKS[name].label, task.id))
+    return redirect('background_tasks')
+
+
+def import_students_save(request):
+    # The CSV is imported by the import_students background task (see student_import.py)
+    if request.method != "POST" or "students_csv" not in request.FILES:
+        messages.error(request, "Select a CSV file to import.")
+        return redirect('add_student')
+    students_csv = request.FILES['students_csv']
+    filename = import_storage().save(students_csv.name, students_csv)
+    task = submit("import_students", {"file": filename}, user=request.user)
+    messages.success(request, "Student import queued as task %d." % task.id)
+    return redirect('background_tasks')
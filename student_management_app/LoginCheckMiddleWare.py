@@ -1,46 +1,74 @@
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
-from django.shortcuts import render, redirect
+from django.shortcuts import redirect
 from django.urls import reverse
 
 
+# Every role (CustomUser.user_type) may open the views of its modules, plus the shared ones;
+# any other view redirects to the home page of the role. The allow-map is built once, when the
+# middleware is created, with the extra modules of the LOGIN_CHECK_MODULES setting
+# ({user_type: [module names]}). Single views are opened to more roles with @allow_roles and
+# to anonymous users with @login_not_required.
+#
+# Static files are served before the user is looked up, so they never load the session. Media
+# files (uploaded profile pictures) stay behind the login like any other view.
+
+SHARED_MODULES = ("student_management_app.views", "django.views.static")
+ROLE_MODULES = {
+    "1": ("student_management_app.HodViews", "student_management_app.ApiViews"),
+    "2": ("student_management_app.StaffViews", "student_management_app.ApiViews"),
+    "3": ("student_management_app.StudentViews",),
+}
+ROLE_HOMES = {"1": "admin_home", "2": "staff_home", "3": "student_home"}
+
+
+def allow_roles(*user_types):
+    # e.g. @allow_roles("1", "2") on a StudentViews view lets HOD and Staff open it too
+    def decorate(view_func):
+        view_func.login_check_roles = getattr(view_func, "login_check_roles", frozenset()) | {str(user_type) for user_type in user_types}
+        return view_func
+    return decorate
+
+
+def login_not_required(view_func):
+    view_func.login_not_required = True
+    return view_func
+
+
+def role_allow_map():
+    # {user_type: frozenset of module names}
+    modules = {role: set(SHARED_MODULES + role_modules) for role, role_modules in ROLE_MODULES.items()}
+    for role, extra_modules in getattr(settings, "LOGIN_CHECK_MODULES", {}).items():
+        modules.setdefault(str(role), set(SHARED_MODULES)).update(extra_modules)
+    return {role: frozenset(role_modules) for role, role_modules in modules.items()}
+
+
 class LoginCheckMiddleWare(MiddlewareMixin):
-    
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.allowed_modules = role_allow_map()
+        static_url = settings.STATIC_URL
+        self.static_prefix = static_url if static_url and static_url != "/" else None
+        self.urls = {}
+
+    def url(self, name):
+        # Redirect targets are reversed once
+        if name not in self.urls:
+            self.urls[name] = reverse(name)
+        return self.urls[name]
+
     def process_view(self, request, view_func, view_args, view_kwargs):
-        modulename = view_func.__module__
-        # print(modulename)
+        if (self.static_prefix and request.path.startswith(self.static_prefix)) or getattr(view_func, "login_not_required", False):
+            return None
+
         user = request.user
+        if not user.is_authenticated:
+            return redirect(self.url("login"))
 
-        #Check whether the user is logged in or not
-        if user.is_authenticated:
-            if user.user_type == "1":
-                if modulename == "student_management_app.HodViews":
-                    pass
-                elif modulename == "student_management_app.views" or modulename == "django.views.static":
-                    pass
-                else:
-                    return redirect("admin_home")
-            
-            elif user.user_type == "2":
-                if modulename == "student_management_app.StaffViews":
-                    pass
-                elif modulename == "student_management_app.views" or modulename == "django.views.static":
-                    pass
-                else:
-                    return redirect("staff_home")
-            
-            elif user.user_type == "3":
-                if modulename == "student_management_app.StudentViews":
-                    pass
-                elif modulename == "student_management_app.views" or modulename == "django.views.static":
-                    pass
-                else:
-                    return redirect("student_home")
-
-            else:
-                return redirect("login")
-
-        else:
-            if request.path == reverse("login") or request.path == reverse("doLogin"):
-                pass
-            else:
-                return redirect("login")
+        role = str(user.user_type)
+        if role not in self.allowed_modules:
+            return redirect(self.url("login"))
+        if view_func.__module__ in self.allowed_modules[role] or role in getattr(view_func, "login_check_roles", ()):
+            return None
+        return redirect(self.url(ROLE_HOMES.get(role, "login")))
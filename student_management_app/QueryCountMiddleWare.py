@@ -0,0 +1,117 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from student_management_app.db_backends.pool import pool_stats
+
+
+logger = logging.getLogger("student_management_app.metrics")
+
+
+class QueryMetrics:
+    # Installed as a database execute wrapper, counts and times every SQL query of a request
+
+    def __init__(self):
+        self.queries = []
+        self.sql_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.sql_time += duration
+            self.queries.append((context["connection"].alias, sql, duration))
+
+
+def install_execute_wrapper(wrapper, aliases=None):
+    # Installs wrapper on the connections of the current thread, until close() of the returned stack.
+    # The ORM calls of an async view run in the thread of sync_to_async (thread sensitive, one per
+    # request under ASGI), whose connections are not those of the event loop: async middleware
+    # installs and removes the wrapper there with sync_to_async.
+    stack = ExitStack()
+    for connection in [connections[alias] for alias in aliases] if aliases else connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+class QueryCountMiddleWare:
+    # Records view, number of SQL queries, SQL time and wall time of every request.
+    # Sent back as Server-Timing header and logged as one JSON line per request.
+    # Switched off (and removed from the middleware chain) unless QUERY_COUNT_ENABLED is True.
+    # Sync and async: under ASGI the async views are not pushed back into threads.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_COUNT_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, "QUERY_COUNT_THRESHOLD", None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = self.start(request)
+        start = time.perf_counter()
+        with install_execute_wrapper(metrics):
+            response = self.get_response(request)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = self.start(request)
+        start = time.perf_counter()
+        wrappers = await sync_to_async(install_execute_wrapper)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def start(self, request):
+        metrics = QueryMetrics()
+        request.query_metrics = metrics
+        request.view_name = None
+        return metrics
+
+    def record(self, request, response, metrics, wall_time):
+        query_count = len(metrics.queries)
+        response["Server-Timing"] = 'db;dur=%.1f;desc="%d queries", app;dur=%.1f' % (metrics.sql_time * 1000, query_count, wall_time * 1000)
+
+        line = {
+            "view": request.view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": query_count,
+            "sql_ms": round(metrics.sql_time * 1000, 3),
+            "wall_ms": round(wall_time * 1000, 3),
+        }
+        pools = pool_stats()
+        if pools:
+            # Saturation of the connection pools (db_backends) when the request ended
+            line["pool_saturation"] = {alias: stats["saturation"] for alias, stats in pools.items()}
+        logger.info(json.dumps(line))
+
+        if self.threshold is not None and query_count > self.threshold:
+            logger.warning(json.dumps({
+                "view": request.view_name,
+                "path": request.path,
+                "queries": query_count,
+                "threshold": self.threshold,
+                "sql": [{"alias": alias, "sql": sql, "ms": round(duration * 1000, 3)} for alias, sql, duration in metrics.queries],
+            }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = view_func.__module__ + "." + getattr(view_func, "__name__", view_func.__class__.__name__)
@@ -0,0 +1,66 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+from student_management_app.QueryCountMiddleWare import install_execute_wrapper
+from student_management_app.db_router import WRITE_MARKER, replica_alias
+
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class WriteDetector:
+    # Execute wrapper noting whether a request wrote to the database
+
+    def __init__(self):
+        self.wrote = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            self.wrote = True
+        return execute(sql, params, many, context)
+
+
+class ReadYourWritesMiddleWare:
+    # Marks the session of a request that wrote to the primary, so @read_replica views read the
+    # primary for DATABASE_REPLICA_LAG_SECONDS after it (see db_router). Must come after
+    # SessionMiddleware. Removed from the middleware chain when there is no replica. Sync and
+    # async, like QueryCountMiddleWare.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replica_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        writes = WriteDetector()
+        with install_execute_wrapper(writes, [DEFAULT_DB_ALIAS]):
+            response = self.get_response(request)
+        if writes.wrote:
+            self.mark_session(request)
+        return response
+
+    async def __acall__(self, request):
+        writes = WriteDetector()
+        wrappers = await sync_to_async(install_execute_wrapper)(writes, [DEFAULT_DB_ALIAS])
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+        if writes.wrote:
+            # The session and the user are loaded from the database
+            await sync_to_async(self.mark_session)(request)
+        return response
+
+    def mark_session(self, request):
+        # Not after a logout: the marker would start a session for the anonymous user
+        if hasattr(request, "session") and request.user.is_authenticated:
+            request.session[WRITE_MARKER] = time.time()
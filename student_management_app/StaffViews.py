@@ -5,66 +5,21 @@ from django.core.files.storage import FileSystemStorage #To upload Profile Pictu
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.core import serializers
+from django.db import transaction
+from django.utils import timezone
 import json
 
 
 from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, SessionYearModel, Attendance, AttendanceReport, LeaveReportStaff, FeedBackStaffs, StudentResult
+from .attendance_storage import attendance_storage
+from .attendance import student_statuses, students_by_admin, update_attendance_summary, status_delta, status_change_delta, roll_call_rows, attendance_dates_rows, attendance_students_rows
+from .dashboard import staff_dashboard_context
+from .profiles import update_profile
+from .dashboard_cache import cached_dashboard
 
 
 def staff_home(request):
-    # Fetching All Students under Staff
-
-    subjects = Subjects.objects.filter(staff_id=request.user.id)
-    course_id_list = []
-    for subject in subjects:
-        course = Courses.objects.get(id=subject.course_id.id)
-        course_id_list.append(course.id)
-    
-    final_course = []
-    # Removing Duplicate Course Id
-    for course_id in course_id_list:
-        if course_id not in final_course:
-            final_course.append(course_id)
-    
-    students_count = Students.objects.filter(course_id__in=final_course).count()
-    subject_count = subjects.count()
-
-    # Fetch All Attendance Count
-    attendance_count = Attendance.objects.filter(subject_id__in=subjects).count()
-    # Fetch All Approve Leave
-    staff = Staffs.objects.get(admin=request.user.id)
-    leave_count = LeaveReportStaff.objects.filter(staff_id=staff.id, leave_status=1).count()
-
-    #Fetch Attendance Data by Subjects
-    subject_list = []
-    attendance_list = []
-    for subject in subjects:
-        attendance_count1 = Attendance.objects.filter(subject_id=subject.id).count()
-        subject_list.append(subject.subject_name)
-        attendance_list.append(attendance_count1)
-
-    students_attendance = Students.objects.filter(course_id__in=final_course)
-    student_list = []
-    student_list_attendance_present = []
-    student_list_attendance_absent = []
-    for student in students_attendance:
-        attendance_present_count = AttendanceReport.objects.filter(status=True, student_id=student.id).count()
-        attendance_absent_count = AttendanceReport.objects.filter(status=False, student_id=student.id).count()
-        student_list.append(student.admin.first_name+" "+ student.admin.last_name)
-        student_list_attendance_present.append(attendance_present_count)
-        student_list_attendance_absent.append(attendance_absent_count)
-
-    context={
-        "students_count": students_count,
-        "attendance_count": attendance_count,
-        "leave_count": leave_count,
-        "subject_count": subject_count,
-        "subject_list": subject_list,
-        "attendance_list": attendance_list,
-        "student_list": student_list,
-        "attendance_present_list": student_list_attendance_present,
-        "attendance_absent_list": student_list_attendance_absent
-    }
+    context = cached_dashboard("staff", request.user.id, lambda: staff_dashboard_context(request.user.id))
     return render(request, "staff_template/staff_home_template.html", context)
 
 
@@ -138,25 +93,10 @@ def staff_feedback_save(request):
 @csrf_exempt
 def get_students(request):
     # Getting Values from Ajax POST 'Fetch Student'
+    # Same rows as the api/v1/attendance/roll_call/ endpoint, kept for older clients
     subject_id = request.POST.get("subject")
     session_year = request.POST.get("session_year")
-
-    # Students enroll to Course, Course has Subjects
-    # Getting all data from subject model based on subject_id
-    subject_model = Subjects.objects.get(id=subject_id)
-
-    session_model = SessionYearModel.objects.get(id=session_year)
-
-    students = Students.objects.filter(course_id=subject_model.course_id, session_year_id=session_model)
-
-    # Only Passing Student Id and Student Name Only
-    list_data = []
-
-    for student in students:
-        data_small={"id":student.admin.id, "name":student.admin.first_name+" "+student.admin.last_name}
-        list_data.append(data_small)
-
-    return JsonResponse(json.dumps(list_data), content_type="application/json", safe=False)
+    return JsonResponse(list(roll_call_rows(subject_id, session_year)), safe=False)
 
 
 
@@ -174,19 +114,29 @@ def save_attendance_data(request):
     session_year_model = SessionYearModel.objects.get(id=session_year_id)
 
     json_student = json.loads(student_ids)
-    # print(dict_student[0]['id'])
+    try:
+        statuses = student_statuses(json_student)
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"status": "error", "error": "invalid_student_data"}, status=400)
+
+    # Resolve all Students in one query, an unknown id rejects the whole roll call
+    students = students_by_admin(statuses)
+    unknown_ids = sorted(set(statuses) - set(students))
+    if unknown_ids:
+        return JsonResponse({"status": "error", "error": "unknown_students", "student_ids": unknown_ids}, status=400)
 
-    # print(student_ids)
     try:
-        # First Attendance Data is Saved on Attendance Model
-        attendance = Attendance(subject_id=subject_model, attendance_date=attendance_date, session_year_id=session_year_model)
-        attendance.save()
-
-        for stud in json_student:
-            # Attendance of Individual Student saved on AttendanceReport Model
-            student = Students.objects.get(admin=stud['id'])
-            attendance_report = AttendanceReport(student_id=student, attendance_id=attendance, status=stud['status'])
-            attendance_report.save()
+        with transaction.atomic():
+            # First Attendance Data is Saved on Attendance Model
+            attendance = Attendance(subject_id=subject_model, attendance_date=attendance_date, session_year_id=session_year_model)
+            attendance.save()
+
+            # Attendance of all Students saved at once, as AttendanceReport rows or packed (ATTENDANCE_STORAGE)
+            student_statuses_by_id = {students[admin_id]: status for admin_id, status in statuses.items()}
+            attendance_storage().create(attendance, student_statuses_by_id)
+
+            # Keep the Attendance Summary counters in the same transaction
+            update_attendance_summary(attendance, {student_id: status_delta(status) for student_id, status in student_statuses_by_id.items()})
         return HttpResponse("OK")
     except:
         return HttpResponse("Error")
@@ -203,48 +153,32 @@ def staff_update_attendance(request):
     }
     return render(request, "staff_template/update_attendance_template.html", context)
 
+def staff_attendance_matrix(request):
+    # Register grid (students x dates), loaded from api/v1/attendance/matrix/
+    subjects = Subjects.objects.filter(staff_id=request.user.id)
+    session_years = SessionYearModel.objects.all()
+    context = {
+        "subjects": subjects,
+        "session_years": session_years
+    }
+    return render(request, "staff_template/attendance_matrix_template.html", context)
+
+
 @csrf_exempt
 def get_attendance_dates(request):
-    
-
     # Getting Values from Ajax POST 'Fetch Student'
+    # Same rows as the api/v1/attendance/dates/ endpoint, kept for older clients
     subject_id = request.POST.get("subject")
     session_year = request.POST.get("session_year_id")
-
-    # Students enroll to Course, Course has Subjects
-    # Getting all data from subject model based on subject_id
-    subject_model = Subjects.objects.get(id=subject_id)
-
-    session_model = SessionYearModel.objects.get(id=session_year)
-
-    # students = Students.objects.filter(course_id=subject_model.course_id, session_year_id=session_model)
-    attendance = Attendance.objects.filter(subject_id=subject_model, session_year_id=session_model)
-
-    # Only Passing Student Id and Student Name Only
-    list_data = []
-
-    for attendance_single in attendance:
-        data_small={"id":attendance_single.id, "attendance_date":str(attendance_single.attendance_date), "session_year_id":attendance_single.session_year_id.id}
-        list_data.append(data_small)
-
-    return JsonResponse(json.dumps(list_data), content_type="application/json", safe=False)
+    return JsonResponse(list(attendance_dates_rows(subject_id, session_year)), safe=False)
 
 
 @csrf_exempt
 def get_attendance_student(request):
     # Getting Values from Ajax POST 'Fetch Student'
-    attendance_date = request.POST.get('attendance_date')
-    attendance = Attendance.objects.get(id=attendance_date)
-
-    attendance_data = AttendanceReport.objects.filter(attendance_id=attendance)
-    # Only Passing Student Id and Student Name Only
-    list_data = []
-
-    for student in attendance_data:
-        data_small={"id":student.student_id.admin.id, "name":student.student_id.admin.first_name+" "+student.student_id.admin.last_name, "status":student.status}
-        list_data.append(data_small)
-
-    return JsonResponse(json.dumps(list_data), content_type="application/json", safe=False)
+    # Same rows as the api/v1/attendance/students/ endpoint, kept for older clients
+    attendance_id = request.POST.get('attendance_date')
+    return JsonResponse(list(attendance_students_rows(attendance_id)), safe=False)
 
 
 @csrf_exempt
@@ -255,18 +189,43 @@ def update_attendance_data(request):
     attendance = Attendance.objects.get(id=attendance_date)
 
     json_student = json.loads(student_ids)
-
     try:
-        
-        for stud in json_student:
-            # Attendance of Individual Student saved on AttendanceReport Model
-            student = Students.objects.get(admin=stud['id'])
-
-            attendance_report = AttendanceReport.objects.get(student_id=student, attendance_id=attendance)
-            attendance_report.status=stud['status']
+        statuses = student_statuses(json_student)
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({"status": "error", "error": "invalid_student_data"}, status=400)
 
-            attendance_report.save()
-        return HttpResponse("OK")
+    try:
+        with transaction.atomic():
+            # Current status of all posted Students, locked until commit
+            storage = attendance_storage()
+            current = storage.locked_statuses(attendance, statuses)
+
+            unknown_ids = sorted(set(statuses) - set(current))
+            if unknown_ids:
+                return JsonResponse({"status": "error", "error": "unknown_students", "student_ids": unknown_ids}, status=400)
+
+            changes = {}
+            summary_changes = {}
+            for admin_id, (student_id, old_status) in current.items():
+                if old_status != statuses[admin_id]:
+                    changes[student_id] = statuses[admin_id]
+                    summary_changes[student_id] = status_change_delta(old_status, statuses[admin_id])
+
+            # Only changed Students are written
+            if changes:
+                storage.set_statuses(attendance, changes)
+
+            # Keep the Attendance Summary counters in the same transaction
+            update_attendance_summary(attendance, summary_changes)
+
+        marked_present = sum(1 for status in changes.values() if status)
+        return JsonResponse({
+            "status": "OK",
+            "changed": len(changes),
+            "unchanged": len(statuses) - len(changes),
+            "marked_present": marked_present,
+            "marked_absent": len(changes) - marked_present,
+        })
     except:
         return HttpResponse("Error")
 
@@ -293,16 +252,9 @@ def staff_profile_update(request):
         address = request.POST.get('address')
 
         try:
-            customuser = CustomUser.objects.get(id=request.user.id)
-            customuser.first_name = first_name
-            customuser.last_name = last_name
-            if password != None and password != "":
-                customuser.set_password(password)
-            customuser.save()
-
-            staff = Staffs.objects.get(admin=customuser.id)
-            staff.address = address
-            staff.save()
+            # Staff and its CustomUser in one query, only changed fields are written
+            staff = Staffs.objects.select_related("admin").get(admin=request.user.id)
+            update_profile(staff.admin, {"first_name": first_name, "last_name": last_name}, staff, {"address": address}, password=password)
 
             messages.success(request, "Profile Updated Successfully")
             return redirect('staff_profile')
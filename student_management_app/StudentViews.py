@@ -6,38 +6,14 @@ from django.urls import reverse
 import datetime # To Parse input DateTime into Python Date Time Object
 
 from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, Attendance, AttendanceReport, LeaveReportStudent, FeedBackStudent, StudentResult
+from .attendance_storage import attendance_storage
+from .dashboard import student_dashboard_context
+from .profiles import update_profile
+from .dashboard_cache import cached_dashboard
 
 
 def student_home(request):
-    student_obj = Students.objects.get(admin=request.user.id)
-    total_attendance = AttendanceReport.objects.filter(student_id=student_obj).count()
-    attendance_present = AttendanceReport.objects.filter(student_id=student_obj, status=True).count()
-    attendance_absent = AttendanceReport.objects.filter(student_id=student_obj, status=False).count()
-
-    course_obj = Courses.objects.get(id=student_obj.course_id.id)
-    total_subjects = Subjects.objects.filter(course_id=course_obj).count()
-
-    subject_name = []
-    data_present = []
-    data_absent = []
-    subject_data = Subjects.objects.filter(course_id=student_obj.course_id)
-    for subject in subject_data:
-        attendance = Attendance.objects.filter(subject_id=subject.id)
-        attendance_present_count = AttendanceReport.objects.filter(attendance_id__in=attendance, status=True, student_id=student_obj.id).count()
-        attendance_absent_count = AttendanceReport.objects.filter(attendance_id__in=attendance, status=False, student_id=student_obj.id).count()
-        subject_name.append(subject.subject_name)
-        data_present.append(attendance_present_count)
-        data_absent.append(attendance_absent_count)
-    
-    context={
-        "total_attendance": total_attendance,
-        "attendance_present": attendance_present,
-        "attendance_absent": attendance_absent,
-        "total_subjects": total_subjects,
-        "subject_name": subject_name,
-        "data_present": data_present,
-        "data_absent": data_absent
-    }
+    context = cached_dashboard("student", request.user.id, lambda: student_dashboard_context(request.user.id))
     return render(request, "student_template/student_home_template.html", context)
 
 
@@ -76,7 +52,10 @@ def student_view_attendance_post(request):
         # Now Accessing Attendance Data based on the Range of Date Selected and Subject Selected
         attendance = Attendance.objects.filter(attendance_date__range=(start_date_parse, end_date_parse), subject_id=subject_obj)
         # Getting Attendance Report based on the attendance details obtained above
-        attendance_reports = AttendanceReport.objects.filter(attendance_id__in=attendance, student_id=stud_obj)
+        attendance_reports = [
+            {"attendance_date": attendance_date, "status": status}
+            for attendance_date, status in attendance_storage().student_reports(stud_obj.id, id__in=attendance)
+        ]
 
         # for attendance_report in attendance_reports:
         #     print("Date: "+ str(attendance_report.attendance_id.attendance_date), "Status: "+ str(attendance_report.status))
@@ -168,16 +147,9 @@ def student_profile_update(request):
         address = request.POST.get('address')
 
         try:
-            customuser = CustomUser.objects.get(id=request.user.id)
-            customuser.first_name = first_name
-            customuser.last_name = last_name
-            if password != None and password != "":
-                customuser.set_password(password)
-            customuser.save()
-
-            student = Students.objects.get(admin=customuser.id)
-            student.address = address
-            student.save()
+            # Student and its CustomUser in one query, only changed fields are written
+            student = Students.objects.select_related("admin").get(admin=request.user.id)
+            update_profile(student.admin, {"first_name": first_name, "last_name": last_name}, student, {"address": address}, password=password)
             
             messages.success(request, "Profile Updated Successfully")
             return redirect('student_profile')
@@ -2,11 +2,30 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import CustomUser, AdminHOD, Staffs, Courses, Subjects, Students, Attendance, AttendanceReport, LeaveReportStudent, LeaveReportStaff, FeedBackStudent, FeedBackStaffs, NotificationStudent, NotificationStaffs
 
+from .attendance import delete_attendance, delete_attendance_reports
+
 # Register your models here.
 class UserModel(UserAdmin):
     pass
 
 
+class AttendanceAdmin(admin.ModelAdmin):
+    # Deletes go through the attendance helpers so the counters and dashboards follow
+    def delete_model(self, request, obj):
+        delete_attendance(Attendance.objects.filter(id=obj.id))
+
+    def delete_queryset(self, request, queryset):
+        delete_attendance(queryset)
+
+
+class AttendanceReportAdmin(admin.ModelAdmin):
+    def delete_model(self, request, obj):
+        delete_attendance_reports(AttendanceReport.objects.filter(id=obj.id))
+
+    def delete_queryset(self, request, queryset):
+        delete_attendance_reports(queryset)
+
+
 admin.site.register(CustomUser, UserModel)
 
 admin.site.register(AdminHOD)
@@ -14,8 +33,8 @@ admin.site.register(Staffs)
 admin.site.register(Courses)
 admin.site.register(Subjects)
 admin.site.register(Students)
-admin.site.register(Attendance)
-admin.site.register(AttendanceReport)
+admin.site.register(Attendance, AttendanceAdmin)
+admin.site.register(AttendanceReport, AttendanceReportAdmin)
 admin.site.register(LeaveReportStudent)
 admin.site.register(LeaveReportStaff)
 admin.site.register(FeedBackStudent)
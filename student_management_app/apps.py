@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class StudentManagementAppConfig(AppConfig):
     name = 'student_management_app'
+
+    def ready(self):
+        # Connect the cache invalidation signals
+        from . import choices, dashboard_cache
@@ -0,0 +1,195 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from student_management_app.attendance_storage import attendance_storage, report_summary_rows
+from student_management_app.dashboard_cache import attendance_changed, course_staff_user_ids, invalidate_on_commit
+from student_management_app.models import Subjects, Students, Attendance, AttendanceReport, AttendanceSummary
+
+
+# AttendanceSummary keeps per (Student, Subject, Session Year) counters of the stored attendance,
+# so dashboards read one row per student and subject instead of counting every report.
+# Callers must run these inside the same transaction that writes the attendance (see attendance_storage).
+# Attendance and reports must be deleted through delete_attendance and delete_attendance_reports
+# to be taken off the counters.
+
+
+def student_statuses(json_student):
+    # [{"id": admin_id, "status": 0 or 1}, ...] posted by the attendance pages -> {admin_id: status}
+    return {int(stud['id']): bool(int(stud['status'])) for stud in json_student}
+
+
+def students_by_admin(admin_ids):
+    # {admin_id: student_id} for all given CustomUser ids in one query
+    return dict(Students.objects.filter(admin__in=list(admin_ids)).values_list("admin_id", "id"))
+
+
+def update_attendance_summary(attendance, changes):
+    # changes: {student_id: (present_delta, absent_delta)} for a single Attendance
+    changes = {student_id: delta for student_id, delta in changes.items() if delta != (0, 0)}
+    if not changes:
+        return
+
+    # Make sure every counter row exists, then move the counters with one UPDATE per kind of change
+    AttendanceSummary.objects.bulk_create(
+        [AttendanceSummary(student_id_id=student_id, subject_id_id=attendance.subject_id_id, session_year_id_id=attendance.session_year_id_id) for student_id in changes],
+        ignore_conflicts=True,
+    )
+
+    students_by_delta = defaultdict(list)
+    for student_id, delta in changes.items():
+        students_by_delta[delta].append(student_id)
+
+    now = timezone.now()
+    for (present_delta, absent_delta), student_ids in students_by_delta.items():
+        AttendanceSummary.objects.filter(
+            subject_id=attendance.subject_id_id, session_year_id=attendance.session_year_id_id, student_id__in=student_ids
+        ).update(
+            present_count=F("present_count") + present_delta,
+            absent_count=F("absent_count") + absent_delta,
+            total_count=F("total_count") + present_delta + absent_delta,
+            updated_at=now,
+        )
+
+    # Reports written in bulk send no signals, so the dashboards are invalidated here
+    attendance_changed(attendance, changes)
+
+
+def status_delta(status):
+    # Counter change for a newly added report
+    return (1, 0) if status else (0, 1)
+
+
+def status_change_delta(old_status, new_status):
+    # Counter change for a report whose status was switched
+    if bool(old_status) == bool(new_status):
+        return (0, 0)
+    return (1, -1) if new_status else (-1, 1)
+
+
+def subtract_summary_rows(rows):
+    # rows: summary_rows of attendance about to be deleted. One UPDATE per Subject, Session Year
+    # and change, whatever the number of reports.
+    students_by_change = defaultdict(list)
+    for student_id, subject_id, session_year_id, present, absent, total in rows:
+        students_by_change[(subject_id, session_year_id, present, absent)].append(student_id)
+
+    now = timezone.now()
+    for (subject_id, session_year_id, present, absent), student_ids in students_by_change.items():
+        for i in range(0, len(student_ids), 900):
+            AttendanceSummary.objects.filter(subject_id=subject_id, session_year_id=session_year_id, student_id__in=student_ids[i:i+900]).update(
+                present_count=F("present_count") - present,
+                absent_count=F("absent_count") - absent,
+                total_count=F("total_count") - present - absent,
+                updated_at=now,
+            )
+
+
+def student_admin_ids(student_ids):
+    student_ids = list(student_ids)
+    admin_ids = []
+    for i in range(0, len(student_ids), 900):
+        admin_ids.extend(Students.objects.filter(id__in=student_ids[i:i+900]).values_list("admin_id", flat=True))
+    return admin_ids
+
+
+def delete_attendance(attendance):
+    # Deletes a queryset of Attendance with their reports and takes them off the counters.
+    # Nothing listens to the delete of Attendance reports, so Django removes them with one DELETE
+    # instead of loading them one by one.
+    with transaction.atomic():
+        rows = list(attendance_storage().summary_rows(id__in=attendance.values("id")))
+        invalidate_on_commit(
+            admin=True,
+            staff_user_ids=course_staff_user_ids(Subjects.objects.filter(id__in=attendance.values("subject_id")).values("course_id")),
+            student_user_ids=student_admin_ids({row[0] for row in rows}),
+        )
+        subtract_summary_rows(rows)
+        return attendance.delete()
+
+
+def delete_attendance_reports(reports):
+    # Same for a queryset of AttendanceReport
+    with transaction.atomic():
+        rows = list(report_summary_rows(reports))
+        invalidate_on_commit(
+            admin=True,
+            staff_user_ids=course_staff_user_ids(Subjects.objects.filter(id__in=[row[1] for row in rows]).values("course_id")),
+            student_user_ids=student_admin_ids({row[0] for row in rows}),
+        )
+        subtract_summary_rows(rows)
+        return reports.delete()
+
+
+def rebuild_attendance_summary(batch_size=1000, progress=None):
+    # Recompute all counters from the stored attendance. progress(rows_created) is called after every batch.
+    rows = attendance_storage().summary_rows()
+
+    created = 0
+    with transaction.atomic():
+        AttendanceSummary.objects.all().delete()
+        batch = []
+        for student_id, subject_id, session_year_id, present, absent, total in rows:
+            batch.append(AttendanceSummary(student_id_id=student_id, subject_id_id=subject_id, session_year_id_id=session_year_id, present_count=present, absent_count=absent, total_count=total))
+            if len(batch) >= batch_size:
+                AttendanceSummary.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                if progress:
+                    progress(created)
+        AttendanceSummary.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+# Rows of the attendance JSON endpoints, read with values_list (no model instances, no per-row
+# user lookups), and their versions: a cheap aggregate that changes whenever the rows do.
+# Names live on CustomUser, every change to them also saves (and timestamps) the Student.
+
+def roll_call_students(subject_id, session_year_id):
+    return Students.objects.filter(course_id__in=Subjects.objects.filter(id=subject_id).values("course_id"), session_year_id=session_year_id)
+
+
+def roll_call_version(subject_id, session_year_id):
+    return roll_call_students(subject_id, session_year_id).aggregate(count=Count("id"), ids=Sum("id"), updated=Max("updated_at"))
+
+
+def roll_call_rows(subject_id, session_year_id, chunk_size=2000):
+    students = roll_call_students(subject_id, session_year_id).order_by("id").values_list("admin_id", "admin__first_name", "admin__last_name")
+    for admin_id, first_name, last_name in students.iterator(chunk_size=chunk_size):
+        yield {"id": admin_id, "name": first_name+" "+last_name}
+
+
+async def aroll_call_rows(subject_id, session_year_id):
+    # roll_call_rows for async views. Read in one go: aiterator() of Django 4.2 runs values_list
+    # queries in the event loop.
+    students = roll_call_students(subject_id, session_year_id).order_by("id").values_list("admin_id", "admin__first_name", "admin__last_name")
+    async for admin_id, first_name, last_name in students:
+        yield {"id": admin_id, "name": first_name+" "+last_name}
+
+
+def attendance_dates_version(subject_id, session_year_id):
+    return Attendance.objects.filter(subject_id=subject_id, session_year_id=session_year_id).aggregate(count=Count("id"), ids=Sum("id"), updated=Max("updated_at"))
+
+
+def attendance_dates_rows(subject_id, session_year_id):
+    attendance = Attendance.objects.filter(subject_id=subject_id, session_year_id=session_year_id).order_by("id").values_list("id", "attendance_date", "session_year_id")
+    for attendance_id, attendance_date, session_year in attendance:
+        yield {"id": attendance_id, "attendance_date": str(attendance_date), "session_year_id": session_year}
+
+
+async def aattendance_dates_rows(subject_id, session_year_id):
+    attendance = Attendance.objects.filter(subject_id=subject_id, session_year_id=session_year_id).order_by("id").values_list("id", "attendance_date", "session_year_id")
+    async for attendance_id, attendance_date, session_year in attendance:
+        yield {"id": attendance_id, "attendance_date": str(attendance_date), "session_year_id": session_year}
+
+
+def attendance_students_version(attendance_id):
+    return attendance_storage().version(id=attendance_id)
+
+
+def attendance_students_rows(attendance_id):
+    for attendance, student_id, admin_id, username, first_name, last_name, status in attendance_storage().named_reports(id=attendance_id):
+        yield {"id": admin_id, "name": first_name+" "+last_name, "status": status}
@@ -0,0 +1,96 @@
+from array import array
+
+from student_management_app.attendance_storage import attendance_storage
+from student_management_app.models import Attendance
+
+
+# Register grid of a Subject in a Session Year: one row per Student, one column per Attendance
+# date. Built from one query over the Attendance and one pass over the reports of the configured
+# storage; every row is a bytearray with one byte per date, so counting a row is done by
+# bytearray.count instead of Python loops.
+
+ABSENT = 0
+PRESENT = 1
+MISSING = 2  # No report for the Student on that date (e.g. enrolled later)
+
+# bytes.translate table turning a row into a string like "10-1"
+CELL_CHARS = bytes.maketrans(bytes([ABSENT, PRESENT, MISSING]), b"01-")
+
+
+def attendance_matrix_version(subject_id, session_year_id):
+    # Changes whenever a report or a Student name in the matrix does (see attendance.roll_call_version)
+    return attendance_storage().version(subject_id=subject_id, session_year_id=session_year_id)
+
+
+def percentage(present, recorded):
+    return round(100.0 * present / recorded, 1) if recorded else None
+
+
+class AttendanceMatrix:
+
+    def __init__(self, dates, students, rows):
+        self.dates = dates          # [(attendance_id, attendance_date)] in date order
+        self.students = students    # [(admin_id, name)] in row order
+        self.rows = rows            # [bytearray(len(dates))]
+
+    @classmethod
+    def build(cls, subject_id, session_year_id):
+        dates = dict(Attendance.objects.filter(subject_id=subject_id, session_year_id=session_year_id).values_list("id", "attendance_date"))
+        reports = attendance_storage().named_reports(subject_id=subject_id, session_year_id=session_year_id)
+
+        # One pass over the reports, keeping only compact (column, row, status) triples
+        students = {}
+        column_of = array("i")
+        row_of = array("i")
+        statuses = bytearray()
+        for attendance_id, student_id, admin_id, username, first_name, last_name, status in reports:
+            if student_id not in students:
+                students[student_id] = (len(students), admin_id, first_name+" "+last_name)
+            column_of.append(attendance_id)
+            row_of.append(students[student_id][0])
+            statuses.append(PRESENT if status else ABSENT)
+
+        ordered_dates = sorted(dates.items(), key=lambda item: (item[1], item[0]))
+        column_index = {attendance_id: column for column, (attendance_id, date) in enumerate(ordered_dates)}
+        width = len(ordered_dates)
+        rows = [bytearray([MISSING]) * width for i in range(len(students))]
+        # The dates and the reports are two reads, Attendance saved in between has reports but no
+        # column yet: those reports are left out (the matrix version changes, so the next read has them)
+        for attendance_id, row, status in zip(column_of, row_of, statuses):
+            column = column_index.get(attendance_id)
+            if column is not None:
+                rows[row][column] = status
+
+        # Rows sorted by name
+        order = sorted(students.values(), key=lambda student: (student[2], student[1]))
+        return cls(
+            ordered_dates,
+            [(admin_id, name) for index, admin_id, name in order],
+            [rows[index] for index, admin_id, name in order],
+        )
+
+    def row_percentages(self):
+        return [percentage(row.count(PRESENT), len(row) - row.count(MISSING)) for row in self.rows]
+
+    def column_percentages(self):
+        percentages = []
+        for column in zip(*self.rows):
+            column = bytes(column)
+            percentages.append(percentage(column.count(PRESENT), len(column) - column.count(MISSING)))
+        return percentages
+
+    def overall_percentage(self):
+        present = sum(row.count(PRESENT) for row in self.rows)
+        absent = sum(row.count(ABSENT) for row in self.rows)
+        return percentage(present, present + absent)
+
+    def as_json(self):
+        # Cells as one string per student: "1" present, "0" absent, "-" no report
+        return {
+            "dates": [{"id": attendance_id, "date": str(attendance_date)} for attendance_id, attendance_date in self.dates],
+            "students": [{"id": admin_id, "name": name} for admin_id, name in self.students],
+            "cells": [row.translate(CELL_CHARS).decode() for row in self.rows],
+            "student_percentages": self.row_percentages(),
+            "date_percentages": self.column_percentages(),
+            "overall_percentage": self.overall_percentage(),
+        }
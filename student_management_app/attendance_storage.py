@@ -0,0 +1,268 @@
+import sys
+from array import array
+from collections import defaultdict
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from student_management_app.models import Students, Attendance, AttendanceReport, PackedAttendance
+
+
+# Where the status of every Student at every Attendance is stored, chosen with ATTENDANCE_STORAGE:
+#   "rows"   one AttendanceReport row per Student and Attendance (default)
+#   "packed" one PackedAttendance row per Attendance: the roll call as an array of Student ids
+#            and the statuses as a bitmap, about 4.1 bytes per Student instead of a full row
+# Views, the JSON API, the register grid, exports and the summary rebuild only use the adapter
+# returned by attendance_storage(), so they work the same with both. Switch existing data with
+# the convert_attendance_storage command, then change the setting.
+#
+# Reads take Attendance lookups as keyword arguments (e.g. id=..., subject_id=..., session_year_id=...),
+# both storages reach Attendance through their "attendance_id" field. Deleting a Student cascades
+# to its AttendanceReport rows but leaves its id in the packed rows, so packed reads skip ids of
+# Students that no longer exist.
+
+CHUNK_SIZE = 2000
+
+
+def attendance_lookups(lookups):
+    return {"attendance_id__"+name: value for name, value in lookups.items()}
+
+
+def student_names(student_ids, known=None):
+    # {student_id: (admin_id, username, first_name, last_name)}, read in chunks below the SQLite parameter limit
+    names = {} if known is None else known
+    missing = [student_id for student_id in set(student_ids) if student_id not in names]
+    for i in range(0, len(missing), 900):
+        for student_id, admin_id, username, first_name, last_name in Students.objects.filter(id__in=missing[i:i+900]).values_list(
+            "id", "admin_id", "admin__username", "admin__first_name", "admin__last_name",
+        ):
+            names[student_id] = (admin_id, username, first_name, last_name)
+    return names
+
+
+def existing_student_ids(student_ids):
+    # The given ids that still have a Students row, read in chunks below the SQLite parameter limit
+    student_ids = list(student_ids)
+    existing = set()
+    for i in range(0, len(student_ids), 900):
+        existing.update(Students.objects.filter(id__in=student_ids[i:i+900]).values_list("id", flat=True))
+    return existing
+
+
+def report_summary_rows(reports):
+    # (student_id, subject_id, session_year_id, present, absent, total) of a queryset of AttendanceReport
+    return reports.order_by().values_list(
+        "student_id", "attendance_id__subject_id", "attendance_id__session_year_id"
+    ).annotate(
+        present=Count("id", filter=Q(status=True)),
+        absent=Count("id", filter=Q(status=False)),
+        total=Count("id"),
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+class RowStorage:
+    name = "rows"
+
+    def create(self, attendance, statuses):
+        # statuses: {student_id: status} of a new Attendance, in roll call order
+        reports = [AttendanceReport(student_id_id=student_id, attendance_id=attendance, status=status) for student_id, status in statuses.items()]
+        AttendanceReport.objects.bulk_create(reports, batch_size=500)
+
+    def locked_statuses(self, attendance, admin_ids):
+        # {admin_id: (student_id, status)} of the given Students, locked until the end of the transaction
+        reports = AttendanceReport.objects.select_for_update(of=("self",)).filter(
+            attendance_id=attendance, student_id__admin__in=list(admin_ids),
+        ).values_list("student_id__admin_id", "student_id", "status")
+        return {admin_id: (student_id, status) for admin_id, student_id, status in reports}
+
+    def set_statuses(self, attendance, changes):
+        # changes: {student_id: new status}, one UPDATE per status
+        student_ids_by_status = {True: [], False: []}
+        for student_id, status in changes.items():
+            student_ids_by_status[bool(status)].append(student_id)
+        now = timezone.now()
+        for status, student_ids in student_ids_by_status.items():
+            if student_ids:
+                AttendanceReport.objects.filter(attendance_id=attendance, student_id__in=student_ids).update(status=status, updated_at=now)
+
+    def named_reports(self, **lookups):
+        # (attendance_id, student_id, admin_id, username, first_name, last_name, status) in insertion order
+        reports = AttendanceReport.objects.filter(**attendance_lookups(lookups)).order_by("id").values_list(
+            "attendance_id", "student_id", "student_id__admin_id", "student_id__admin__username",
+            "student_id__admin__first_name", "student_id__admin__last_name", "status",
+        )
+        return reports.iterator(chunk_size=CHUNK_SIZE)
+
+    def student_reports(self, student_id, **lookups):
+        # (attendance_date, status) of one Student
+        return AttendanceReport.objects.filter(student_id=student_id, **attendance_lookups(lookups)).order_by("attendance_id").values_list(
+            "attendance_id__attendance_date", "status",
+        )
+
+    def version(self, **lookups):
+        # Changes whenever a report or a Student name does (names live on CustomUser, changing them saves the Student)
+        return AttendanceReport.objects.filter(**attendance_lookups(lookups)).aggregate(
+            count=Count("id"), ids=Sum("id"), updated=Max("updated_at"), students_updated=Max("student_id__updated_at"),
+        )
+
+    def summary_rows(self, **lookups):
+        # (student_id, subject_id, session_year_id, present, absent, total) for AttendanceSummary
+        return report_summary_rows(AttendanceReport.objects.filter(**attendance_lookups(lookups)))
+
+
+def pack_student_ids(student_ids):
+    ids = array("I", student_ids)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def unpack_student_ids(data):
+    ids = array("I")
+    ids.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids
+
+
+def pack_statuses(statuses):
+    bits = bytearray((len(statuses) + 7) // 8)
+    for i, status in enumerate(statuses):
+        if status:
+            bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def unpack_statuses(data, count):
+    data = bytes(data)
+    return [bool(data[i >> 3] >> (i & 7) & 1) for i in range(count)]
+
+
+def packed_fields(statuses):
+    # Field values of a PackedAttendance holding {student_id: status}
+    return {
+        "student_ids": pack_student_ids(statuses.keys()),
+        "statuses": pack_statuses(list(statuses.values())),
+        "student_count": len(statuses),
+        "present_count": sum(1 for status in statuses.values() if status),
+    }
+
+
+def unpacked(student_ids, statuses, student_count):
+    # {student_id: status} in roll call order
+    return dict(zip(unpack_student_ids(student_ids), unpack_statuses(statuses, student_count)))
+
+
+class PackedStorage:
+    name = "packed"
+
+    def create(self, attendance, statuses):
+        PackedAttendance.objects.create(attendance_id=attendance, **packed_fields(statuses))
+
+    def locked_statuses(self, attendance, admin_ids):
+        students = Students.objects.filter(admin__in=list(admin_ids)).values_list("admin_id", "id")
+        packed = PackedAttendance.objects.select_for_update().filter(attendance_id=attendance).values_list("student_ids", "statuses", "student_count").first()
+        statuses = unpacked(*packed) if packed else {}
+        return {admin_id: (student_id, statuses[student_id]) for admin_id, student_id in students if student_id in statuses}
+
+    def set_statuses(self, attendance, changes):
+        # The row is locked by locked_statuses, so read, change and write it back
+        packed = PackedAttendance.objects.values_list("student_ids", "statuses", "student_count").get(attendance_id=attendance)
+        statuses = unpacked(*packed)
+        statuses.update(changes)
+        PackedAttendance.objects.filter(attendance_id=attendance).update(updated_at=timezone.now(), **packed_fields(statuses))
+
+    def packed_rows(self, lookups, *fields):
+        rows = PackedAttendance.objects.filter(**attendance_lookups(lookups)).order_by("attendance_id").values_list(*fields, "student_ids", "statuses", "student_count")
+        for row in rows.iterator(chunk_size=100):
+            yield row[:-3], unpacked(*row[-3:])
+
+    def named_reports(self, **lookups):
+        # Names are read once per batch of Attendance, not per Attendance
+        names = {}
+        rows = self.packed_rows(lookups, "attendance_id")
+        while True:
+            batch = list(islice(rows, 100))
+            if not batch:
+                return
+            student_names(chain.from_iterable(statuses for fields, statuses in batch), names)
+            for (attendance_id,), statuses in batch:
+                for student_id, status in statuses.items():
+                    if student_id in names:
+                        yield (attendance_id, student_id) + names[student_id] + (status,)
+
+    def student_reports(self, student_id, **lookups):
+        for (attendance_date,), statuses in self.packed_rows(lookups, "attendance_id__attendance_date"):
+            if student_id in statuses:
+                yield attendance_date, statuses[student_id]
+
+    def version(self, **lookups):
+        # Students are not joined to the packed rows, their change is followed through the Course of the Subject
+        return PackedAttendance.objects.filter(**attendance_lookups(lookups)).aggregate(
+            count=Count("attendance_id", distinct=True), ids=Sum("attendance_id", distinct=True), updated=Max("updated_at"),
+            students_updated=Max("attendance_id__subject_id__course_id__students__updated_at"),
+        )
+
+    def summary_rows(self, **lookups):
+        # Packed student ids are not foreign keys, reports of deleted Students are left out
+        counters = defaultdict(lambda: [0, 0])
+        for (subject_id, session_year_id), statuses in self.packed_rows(lookups, "attendance_id__subject_id", "attendance_id__session_year_id"):
+            for student_id, status in statuses.items():
+                counters[(student_id, subject_id, session_year_id)][0 if status else 1] += 1
+        student_ids = existing_student_ids({student_id for student_id, subject_id, session_year_id in counters})
+        for (student_id, subject_id, session_year_id), (present, absent) in counters.items():
+            if student_id in student_ids:
+                yield student_id, subject_id, session_year_id, present, absent, present + absent
+
+
+STORAGES = {storage.name: storage for storage in (RowStorage(), PackedStorage())}
+
+
+def attendance_storage(name=None):
+    return STORAGES[name or getattr(settings, "ATTENDANCE_STORAGE", "rows")]
+
+
+def delete_reports(attendance_ids):
+    # Plain DELETE: a queryset delete would load every report to send the delete signals
+    table = connection.ops.quote_name(AttendanceReport._meta.db_table)
+    column = connection.ops.quote_name(AttendanceReport._meta.get_field("attendance_id").column)
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM %s WHERE %s IN (%s)" % (table, column, ", ".join(["%s"] * len(attendance_ids))), list(attendance_ids))
+
+
+def convert_attendance_storage(to, batch_size=500, progress=None):
+    # Moves every Attendance stored the other way to the "to" storage, one transaction per batch
+    # of Attendance. Returns the number of Attendance converted. progress(converted, total) is
+    # called after every batch.
+    converted = 0
+    if to == "packed":
+        attendance_ids = AttendanceReport.objects.order_by("attendance_id").values_list("attendance_id", flat=True).distinct()
+    else:
+        attendance_ids = PackedAttendance.objects.order_by("attendance_id").values_list("attendance_id", flat=True)
+    attendance_ids = list(attendance_ids)
+
+    for i in range(0, len(attendance_ids), batch_size):
+        batch = attendance_ids[i:i+batch_size]
+        with transaction.atomic():
+            if to == "packed":
+                statuses_by_attendance = defaultdict(dict)
+                for attendance_id, student_id, status in AttendanceReport.objects.filter(attendance_id__in=batch).order_by("id").values_list("attendance_id", "student_id", "status"):
+                    statuses_by_attendance[attendance_id][student_id] = status
+                PackedAttendance.objects.bulk_create([
+                    PackedAttendance(attendance_id_id=attendance_id, **packed_fields(statuses)) for attendance_id, statuses in statuses_by_attendance.items()
+                ])
+                delete_reports(batch)
+            else:
+                reports = [
+                    AttendanceReport(attendance_id_id=attendance_id, student_id_id=student_id, status=status)
+                    for attendance_id, student_id, *name, status in STORAGES["packed"].named_reports(id__in=batch)
+                ]
+                AttendanceReport.objects.bulk_create(reports, batch_size=500)
+                PackedAttendance.objects.filter(attendance_id__in=batch).delete()
+        converted += len(batch)
+        if progress:
+            progress(converted, len(attendance_ids))
+    return converted
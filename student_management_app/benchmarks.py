@@ -0,0 +1,668 @@
+import asyncio
+import datetime
+import importlib.util
+import io
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DatabaseError, connection, transaction
+from django.db.models.functions import Lower
+from django.test import Client, RequestFactory, override_settings
+from django.urls import include, path
+
+from student_management_app.QueryCountMiddleWare import QueryMetrics
+from student_management_app.attendance_storage import STORAGES, convert_attendance_storage
+from student_management_app.dashboard_cache import invalidate_dashboards
+from student_management_app.HodViews import STUDENT_SEARCH_FIELDS
+from student_management_app.datatables import prefix_search
+from student_management_app.db_backends.pool import pool_stats
+from student_management_app.db_config import APP_ENGINES, sqlite_pragmas
+from student_management_app.login_guard import failure_keys, login_cache
+from student_management_app.models import CustomUser, Courses, Subjects, Students, SessionYearModel, Attendance, AttendanceReport, PackedAttendance, LeaveReportStudent, LeaveReportStaff
+
+
+# Benchmark scenarios run against the current database through the Django test client.
+# Every scenario is a function (fixtures) -> response, registered with @scenario("name").
+# Use the generate_university command first to get a dataset of the wanted size.
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Fixtures:
+    # Users, clients and ids shared by the scenarios, picked from the Course of the first Student
+
+    def __init__(self):
+        course_id = Students.objects.values_list("course_id", flat=True).order_by("course_id").first()
+        if course_id is None:
+            raise ValueError("No students in the database, run generate_university first.")
+        self.subject = Subjects.objects.filter(course_id=course_id).order_by("id").first()
+        if self.subject is None:
+            raise ValueError("No subjects in the course of the first student, run generate_university first.")
+        self.student = Students.objects.filter(course_id=course_id).order_by("id").first()
+        self.session_year = self.student.session_year_id
+        self.roll_call = list(Students.objects.filter(course_id=course_id, session_year_id=self.session_year).values_list("admin_id", flat=True))
+        self.attendance = Attendance.objects.filter(subject_id=self.subject, session_year_id=self.session_year).order_by("id").first()
+
+        self.hod_client = self.login(CustomUser.objects.filter(user_type="1").order_by("id").first())
+        self.staff_client = self.login(self.subject.staff_id)
+        self.student_client = self.login(self.student.admin)
+
+    def login(self, user):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def dataset(self):
+        return {
+            "courses": Courses.objects.count(),
+            "subjects": Subjects.objects.count(),
+            "students": Students.objects.count(),
+            "session_years": SessionYearModel.objects.count(),
+            "attendance": Attendance.objects.count(),
+            "attendance_reports": AttendanceReport.objects.count(),
+            "packed_attendance": PackedAttendance.objects.count(),
+            "roll_call_size": len(self.roll_call),
+        }
+
+
+# The dashboard scenarios drop the cached dashboard (dashboard_cache) before every request, so they
+# time the queries that build it; the *_cached scenarios time a cache hit.
+
+@scenario("admin_home")
+def admin_home(fixtures):
+    invalidate_dashboards(admin=True)
+    return fixtures.hod_client.get("/admin_home/")
+
+
+@scenario("admin_home_cached")
+def admin_home_cached(fixtures):
+    return fixtures.hod_client.get("/admin_home/")
+
+
+@scenario("manage_student")
+def manage_student(fixtures):
+    return fixtures.hod_client.get("/manage_student/")
+
+
+@scenario("manage_student_data")
+def manage_student_data(fixtures):
+    # A deep page of the DataTables listing, sorted by last name
+    return fixtures.hod_client.get("/manage_student_data/", {"start": 1000, "length": 50, "columns[0][data]": "last_name", "order[0][column]": 0})
+
+
+@scenario("staff_home")
+def staff_home(fixtures):
+    invalidate_dashboards(staff_user_ids=[fixtures.subject.staff_id_id])
+    return fixtures.staff_client.get("/staff_home/")
+
+
+@scenario("staff_home_cached")
+def staff_home_cached(fixtures):
+    return fixtures.staff_client.get("/staff_home/")
+
+
+@scenario("student_home")
+def student_home(fixtures):
+    invalidate_dashboards(student_user_ids=[fixtures.student.admin_id])
+    return fixtures.student_client.get("/student_home/")
+
+
+@scenario("student_home_cached")
+def student_home_cached(fixtures):
+    return fixtures.student_client.get("/student_home/")
+
+
+@scenario("get_students")
+def get_students(fixtures):
+    return fixtures.staff_client.post("/get_students/", {"subject": fixtures.subject.id, "session_year": fixtures.session_year.id})
+
+
+@scenario("api_roll_call")
+def api_roll_call(fixtures):
+    return fixtures.staff_client.get("/api/v1/attendance/roll_call/", {"subject": fixtures.subject.id, "session_year": fixtures.session_year.id})
+
+
+@scenario("api_roll_call_not_modified")
+def api_roll_call_not_modified(fixtures):
+    # Repeat fetch of an unchanged roll call, answered with 304
+    params = {"subject": fixtures.subject.id, "session_year": fixtures.session_year.id}
+    if not hasattr(fixtures, "roll_call_etag"):
+        fixtures.roll_call_etag = fixtures.staff_client.get("/api/v1/attendance/roll_call/", params)["ETag"]
+    return fixtures.staff_client.get("/api/v1/attendance/roll_call/", params, HTTP_IF_NONE_MATCH=fixtures.roll_call_etag)
+
+
+@scenario("api_attendance_students")
+def api_attendance_students(fixtures):
+    return fixtures.staff_client.get("/api/v1/attendance/students/", {"attendance": fixtures.attendance.id})
+
+
+@scenario("attendance_matrix")
+def attendance_matrix(fixtures):
+    return fixtures.staff_client.get("/api/v1/attendance/matrix/", {"subject": fixtures.subject.id, "session_year": fixtures.session_year.id})
+
+
+@scenario("save_attendance_data")
+def save_attendance_data(fixtures):
+    # Rolled back afterwards so repeated runs measure the same data
+    student_data = [{"id": admin_id, "status": i % 2} for i, admin_id in enumerate(fixtures.roll_call)]
+    with transaction.atomic():
+        response = fixtures.staff_client.post("/save_attendance_data/", {
+            "student_ids": json.dumps(student_data),
+            "subject_id": fixtures.subject.id,
+            "attendance_date": "2030-01-01",
+            "session_year_id": fixtures.session_year.id,
+        })
+        transaction.set_rollback(True)
+    return response
+
+
+@scenario("update_attendance_data")
+def update_attendance_data(fixtures):
+    # Marks the whole roll call of the first lecture present, rolled back afterwards
+    student_data = [{"id": admin_id, "status": 1} for admin_id in fixtures.roll_call]
+    with transaction.atomic():
+        response = fixtures.staff_client.post("/update_attendance_data/", {
+            "student_ids": json.dumps(student_data),
+            "attendance_date": fixtures.attendance.id,
+        })
+        transaction.set_rollback(True)
+    return response
+
+
+# Hot path queries whose plans are shown by run_benchmarks --explain, registered with @explain("name").
+# Each is a function (fixtures) -> QuerySet.
+
+EXPLAINS = {}
+
+
+def explain(name):
+    def register(func):
+        EXPLAINS[name] = func
+        return func
+    return register
+
+
+@explain("attendance_report_by_student_status")
+def attendance_report_by_student_status(fixtures):
+    return AttendanceReport.objects.filter(student_id=fixtures.student, status=True)
+
+
+@explain("attendance_report_by_attendance")
+def attendance_report_by_attendance(fixtures):
+    return AttendanceReport.objects.filter(attendance_id=fixtures.attendance)
+
+
+@explain("attendance_by_subject_session")
+def attendance_by_subject_session(fixtures):
+    return Attendance.objects.filter(subject_id=fixtures.subject, session_year_id=fixtures.session_year).order_by("attendance_date")
+
+
+@explain("subjects_by_staff")
+def subjects_by_staff(fixtures):
+    return Subjects.objects.filter(staff_id=fixtures.subject.staff_id)
+
+
+@explain("students_by_course_session")
+def students_by_course_session(fixtures):
+    return Students.objects.filter(course_id=fixtures.subject.course_id, session_year_id=fixtures.session_year)
+
+
+@explain("approved_student_leaves")
+def approved_student_leaves(fixtures):
+    return LeaveReportStudent.objects.filter(student_id=fixtures.student, leave_status=1)
+
+
+@explain("approved_staff_leaves")
+def approved_staff_leaves(fixtures):
+    return LeaveReportStaff.objects.filter(staff_id__admin=fixtures.subject.staff_id, leave_status=1)
+
+
+@explain("user_by_email")
+def user_by_email(fixtures):
+    # The login lookup of EmailBackEnd
+    return CustomUser.objects.annotate(email_lower=Lower("email")).filter(email_lower=fixtures.student.admin.email.lower())
+
+
+@explain("student_listing_search")
+def student_listing_search(fixtures):
+    # The search box of manage_student, on a prefix of the Student's username
+    aliases, condition = prefix_search(STUDENT_SEARCH_FIELDS, fixtures.student.admin.username[:6])
+    return Students.objects.alias(**aliases).filter(condition)
+
+
+def explain_plans(names=None):
+    fixtures = Fixtures()
+    return {
+        "database": connection.vendor,
+        "dataset": fixtures.dataset(),
+        "explain": {name: EXPLAINS[name](fixtures).explain() for name in names or EXPLAINS},
+    }
+
+
+def run_scenario(func, fixtures, repeat=20, warmup=2):
+    for i in range(warmup):
+        func(fixtures)
+
+    timings = []
+    sql_timings = []
+    query_counts = []
+    for i in range(repeat):
+        metrics = QueryMetrics()
+        with connection.execute_wrapper(metrics):
+            start = time.perf_counter()
+            response = func(fixtures)
+            timings.append((time.perf_counter() - start) * 1000)
+        sql_timings.append(metrics.sql_time * 1000)
+        query_counts.append(len(metrics.queries))
+
+    return {
+        "status": response.status_code,
+        "runs": repeat,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "sql_p50_ms": round(percentile(sql_timings, 50), 3),
+        "queries": max(query_counts),
+    }
+
+
+def run_benchmarks(names=None, repeat=20, warmup=2):
+    fixtures = Fixtures()
+    results = {}
+    for name in names or SCENARIOS:
+        results[name] = run_scenario(SCENARIOS[name], fixtures, repeat=repeat, warmup=warmup)
+    return {
+        "database": connection.vendor,
+        "dataset": fixtures.dataset(),
+        "scenarios": results,
+    }
+
+
+# Attendance storages (attendance_storage) compared on the same data: the attendance is converted
+# to every storage in turn inside a transaction that is rolled back at the end.
+
+STORAGE_SCENARIOS = ("get_students", "api_attendance_students", "attendance_matrix", "save_attendance_data", "update_attendance_data")
+
+
+def table_bytes(model):
+    # Bytes used by a table and its indexes, None where the database cannot tell
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == "sqlite":
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table])
+            elif connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            else:
+                return None
+        except DatabaseError:
+            # SQLite built without the dbstat table
+            return None
+        return cursor.fetchone()[0] or 0
+
+
+def compare_attendance_storage(names=None, repeat=20, warmup=2):
+    fixtures = Fixtures()
+    if fixtures.attendance is None:
+        raise ValueError("No attendance in the course of the first student, run generate_university first.")
+    results = {}
+    with transaction.atomic():
+        for storage in STORAGES:
+            convert_attendance_storage(storage)
+            with override_settings(ATTENDANCE_STORAGE=storage):
+                results[storage] = {
+                    "bytes": {model.__name__: table_bytes(model) for model in (AttendanceReport, PackedAttendance)},
+                    "scenarios": {name: run_scenario(SCENARIOS[name], fixtures, repeat=repeat, warmup=warmup) for name in names or STORAGE_SCENARIOS},
+                }
+        transaction.set_rollback(True)
+    return {
+        "database": connection.vendor,
+        "dataset": fixtures.dataset(),
+        "storages": results,
+    }
+
+
+# Logins per second through /doLogin/, one login at a time, so a request uses one core:
+# "per_cpu_second" divides by the CPU time of this process instead of the wall time. A Student
+# gets a known password (hashed with each PASSWORD_HASH_ITERATIONS given) in a transaction that
+# is rolled back at the end. The failure limits are lifted while it runs.
+
+LOGIN_SCENARIOS = {
+    "valid": lambda email: (email, "benchmark-password"),
+    "wrong_password": lambda email: (email, "wrong-password"),
+    "unknown_email": lambda email: ("unknown-" + email, "benchmark-password"),
+}
+
+
+def run_logins(email, credentials, repeat=20, warmup=2):
+    email, password = credentials(email)
+    for i in range(warmup):
+        Client().post("/doLogin/", {"email": email, "password": password})
+
+    timings = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(repeat):
+        login_start = time.perf_counter()
+        response = Client().post("/doLogin/", {"email": email, "password": password})
+        timings.append((time.perf_counter() - login_start) * 1000)
+    elapsed = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+    return {
+        "status": response.status_code,
+        "redirect": response.get("Location"),
+        "runs": repeat,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "per_second": round(repeat / elapsed, 2),
+        "per_cpu_second": round(repeat / cpu_time, 2) if cpu_time else None,
+    }
+
+
+def benchmark_logins(names=None, iterations=None, repeat=20, warmup=2):
+    student = Students.objects.select_related("admin").order_by("id").first()
+    if student is None:
+        raise ValueError("No students in the database, run generate_university first.")
+    user = student.admin
+    results = {}
+    unlimited = {"LOGIN_FAILURE_LIMIT": float("inf"), "LOGIN_EMAIL_FAILURE_LIMIT": float("inf")}
+    with transaction.atomic(), override_settings(**unlimited):
+        for cost in iterations or [None]:
+            with override_settings(PASSWORD_HASH_ITERATIONS=cost):
+                user.set_password("benchmark-password")
+                user.save(update_fields=["password"])
+                results[str(cost or "default")] = {
+                    name: run_logins(user.email, LOGIN_SCENARIOS[name], repeat=repeat, warmup=warmup) for name in names or LOGIN_SCENARIOS
+                }
+        transaction.set_rollback(True)
+    # The failures counted by the runs (the test client logs in from 127.0.0.1)
+    request = RequestFactory().post("/doLogin/")
+    for credentials in LOGIN_SCENARIOS.values():
+        login_cache().delete_many(list(failure_keys(request, credentials(user.email)[0])))
+    return {
+        "database": connection.vendor,
+        "cpu_count": os.cpu_count(),
+        "iterations": results,
+    }
+
+
+# The AJAX endpoints of AsyncViews under concurrent clients, through Django's WSGI handler (sync
+# views, a pool of wsgi_threads threads as with "gunicorn --threads") and ASGI handler (async
+# views, one event loop as with uvicorn). The handlers are called in process, the way a server
+# calls them, without the network. Every client sends its requests one after the other and all
+# clients start at once.
+
+CONCURRENCY_SCENARIOS = {
+    "get_students": ("staff", "/get_students/", lambda fixtures: {"subject": fixtures.subject.id, "session_year": fixtures.session_year.id}),
+    "get_attendance_dates": ("staff", "/get_attendance_dates/", lambda fixtures: {"subject": fixtures.subject.id, "session_year_id": fixtures.session_year.id}),
+    "get_attendance_student": ("staff", "/get_attendance_student/", lambda fixtures: {"attendance_date": fixtures.attendance.id}),
+    "check_email_exist": ("hod", "/check_email_exist/", lambda fixtures: {"email": fixtures.student.admin.email}),
+    "check_username_exist": ("hod", "/check_username_exist/", lambda fixtures: {"username": fixtures.student.admin.username}),
+}
+
+
+def app_urlconf(async_views):
+    # A copy of the app URLs built with ASYNC_VIEWS on or off, to use as ROOT_URLCONF
+    with override_settings(ASYNC_VIEWS=async_views):
+        spec = importlib.util.find_spec("student_management_app.urls")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    urlconf = types.ModuleType("benchmark_urls_%s" % ("async" if async_views else "sync"))
+    urlconf.urlpatterns = [path("", include(module))]
+    return urlconf
+
+
+def concurrency_result(timings, statuses, elapsed):
+    return {
+        "requests": len(timings),
+        "errors": sum(1 for status in statuses if status != 200),
+        "per_second": round(len(timings) / elapsed, 2),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+    }
+
+
+def wsgi_environ(cookie, path_info, body):
+    # A form POST as a WSGI server hands it to the handler
+    return {
+        "REQUEST_METHOD": "POST", "PATH_INFO": path_info, "SCRIPT_NAME": "", "QUERY_STRING": "",
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "REMOTE_ADDR": "127.0.0.1",
+        "CONTENT_TYPE": "application/x-www-form-urlencoded", "CONTENT_LENGTH": str(len(body)), "HTTP_COOKIE": cookie,
+        "wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+    }
+
+
+def run_wsgi_clients(cookie, path_info, body, clients, requests_per_client, threads):
+    handler = WSGIHandler()
+    timings = []
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    def run_client(i):
+        for r in range(requests_per_client):
+            # The first request of a client waits from the start for a free thread
+            start = started if r == 0 else time.perf_counter()
+            result = handler(wsgi_environ(cookie, path_info, body), start_response)
+            b"".join(result)
+            # Sends request_finished, which closes the database connection
+            result.close()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run_client, range(clients)))
+    return concurrency_result(timings, statuses, time.perf_counter() - started)
+
+
+def run_asgi_clients(cookie, path_info, body, clients, requests_per_client):
+    handler = ASGIHandler()
+    timings = []
+    statuses = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path_info, "raw_path": path_info.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"cookie", cookie.encode()), (b"content-type", b"application/x-www-form-urlencoded"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def run_client(i):
+        for r in range(requests_per_client):
+            start = time.perf_counter()
+            await handler(dict(scope), receive, send)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    async def run_clients():
+        await asyncio.gather(*[run_client(i) for i in range(clients)])
+
+    start = time.perf_counter()
+    asyncio.run(run_clients())
+    return concurrency_result(timings, statuses, time.perf_counter() - start)
+
+
+def session_cookie(client):
+    return "%s=%s" % (settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+
+def compare_concurrency(names=None, clients=500, requests_per_client=2, wsgi_threads=8):
+    fixtures = Fixtures()
+    if fixtures.attendance is None:
+        raise ValueError("No attendance in the course of the first student, run generate_university first.")
+    cookies = {role: session_cookie(client) for role, client in (("staff", fixtures.staff_client), ("hod", fixtures.hod_client))}
+    # The sessions are read by other threads
+    connection.close()
+    results = {}
+    for name in names or CONCURRENCY_SCENARIOS:
+        role, path_info, data = CONCURRENCY_SCENARIOS[name]
+        body = urlencode(data(fixtures)).encode()
+        results[name] = {}
+        with override_settings(ROOT_URLCONF=app_urlconf(False)):
+            results[name]["wsgi"] = run_wsgi_clients(cookies[role], path_info, body, clients, requests_per_client, wsgi_threads)
+        with override_settings(ROOT_URLCONF=app_urlconf(True)):
+            results[name]["asgi"] = run_asgi_clients(cookies[role], path_info, body, clients, requests_per_client)
+    return {
+        "database": connection.vendor,
+        "dataset": fixtures.dataset(),
+        "clients": clients,
+        "requests_per_client": requests_per_client,
+        "wsgi_threads": wsgi_threads,
+        "scenarios": results,
+    }
+
+
+# Request latency with and without the connection pool (db_backends): every request closes its
+# connection at the end, as Django does with CONN_MAX_AGE = 0, so without the pool each one
+# connects again. Needs a pooled engine (DATABASE_POOL_SIZE); the pool is switched off for the
+# first run by setting its SIZE to 0.
+
+POOL_SCENARIOS = ("admin_home", "staff_home", "student_home", "get_students", "api_roll_call")
+
+
+def closing_connection(func):
+    def run(fixtures):
+        response = func(fixtures)
+        connection.close()
+        return response
+    return run
+
+
+def compare_connection_pool(names=None, repeat=20, warmup=2):
+    pool_config = connection.settings_dict.get("POOL")
+    if not pool_config:
+        raise ValueError("The database has no connection pool, set DATABASE_POOL_SIZE.")
+    fixtures = Fixtures()
+    connection.close()
+    results = {}
+    size = pool_config["SIZE"]
+    try:
+        for pooled in (False, True):
+            pool_config["SIZE"] = size if pooled else 0
+            results["pool" if pooled else "no_pool"] = {
+                name: run_scenario(closing_connection(SCENARIOS[name]), fixtures, repeat=repeat, warmup=warmup) for name in names or POOL_SCENARIOS
+            }
+    finally:
+        pool_config["SIZE"] = size
+    return {
+        "database": connection.vendor,
+        "dataset": fixtures.dataset(),
+        "pool": pool_stats().get(connection.alias),
+        "scenarios": results,
+    }
+
+
+# Attendance saves per second from concurrent writers on SQLite, with the default settings and
+# with the tuning mode (DATABASE_SQLITE_TUNING, see db_config). The threads post
+# save_attendance_data through the WSGI handler, as the threads of "gunicorn --threads" would,
+# each save for its own date. Every run writes to its own copy of the database file, so the
+# dataset is left as it was and both runs start from the same data. A save that fails, e.g. with
+# "database is locked", answers "Error" and is counted as an error.
+
+def copy_sqlite_database(source, target, journal_mode):
+    # The backup API also copies what is still in the WAL file. The journal mode is set before the
+    # writers connect: changing it needs the only connection to the file.
+    with closing(sqlite3.connect(source)) as source_db, closing(sqlite3.connect(target)) as target_db:
+        source_db.backup(target_db)
+        target_db.execute("PRAGMA journal_mode = %s" % journal_mode)
+
+
+def run_attendance_writers(cookie, bodies, threads):
+    handler = WSGIHandler()
+    timings = []
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    def save(body):
+        start = time.perf_counter()
+        result = handler(wsgi_environ(cookie, "/save_attendance_data/", body), start_response)
+        content = b"".join(result)
+        result.close()
+        timings.append((time.perf_counter() - start) * 1000)
+        # The view answers a failed save with "Error" and status 200
+        statuses.append(200 if content == b"OK" else 500)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(save, bodies))
+    return concurrency_result(timings, statuses, time.perf_counter() - start)
+
+
+def compare_sqlite_tuning(writers=8, saves_per_writer=10):
+    if connection.vendor != "sqlite" or connection.is_in_memory_db():
+        raise ValueError("The write concurrency benchmark needs a SQLite database file.")
+    fixtures = Fixtures()
+    cookie = session_cookie(fixtures.staff_client)
+    student_data = json.dumps([{"id": admin_id, "status": i % 2} for i, admin_id in enumerate(fixtures.roll_call)])
+    bodies = [urlencode({
+        "student_ids": student_data,
+        "subject_id": fixtures.subject.id,
+        "attendance_date": datetime.date(2030, 1, 1) + datetime.timedelta(days=i),
+        "session_year_id": fixtures.session_year.id,
+    }).encode() for i in range(writers * saves_per_writer)]
+    runs = {
+        "default": {},
+        "tuned": connection.settings_dict.get("PRAGMAS") or sqlite_pragmas({}),
+    }
+
+    # The writer threads open their connections from these settings
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict[key] for key in ("ENGINE", "NAME", "POOL", "PRAGMAS") if key in settings_dict}
+    dataset = fixtures.dataset()
+    connection.close()
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        for run, pragmas in runs.items():
+            name = os.path.join(directory, "%s.sqlite3" % run)
+            copy_sqlite_database(saved["NAME"], name, pragmas.get("journal_mode", "DELETE"))
+            settings_dict.update(ENGINE=APP_ENGINES["sqlite"], NAME=name, POOL=None, PRAGMAS=pragmas)
+            results[run] = run_attendance_writers(cookie, bodies, writers)
+    finally:
+        for key in ("POOL", "PRAGMAS"):
+            settings_dict.pop(key, None)
+        settings_dict.update(saved)
+        shutil.rmtree(directory)
+    return {
+        "database": connection.vendor,
+        "dataset": dataset,
+        "writers": writers,
+        "saves_per_writer": saves_per_writer,
+        "pragmas": runs,
+        "scenarios": {"save_attendance_data": results},
+    }
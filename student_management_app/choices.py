@@ -0,0 +1,65 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from student_management_app.models import Courses, SessionYearModel
+
+
+# Choice lists of the student forms, cached under a version number.
+# Saving or deleting a Course / Session Year moves the version, so every process
+# sharing the cache builds the list again on its next use.
+
+CHOICES_TIMEOUT = 60 * 60 * 24
+
+
+def choices_version(name):
+    key = "choices:%s:version" % name
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a lost version key never brings back an old list
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def cached_choices(name, build):
+    key = "choices:%s:%s" % (name, choices_version(name))
+    choices = cache.get(key)
+    if choices is None:
+        choices = build()
+        cache.set(key, choices, CHOICES_TIMEOUT)
+    return choices
+
+
+def invalidate_choices(name):
+    key = "choices:%s:version" % name
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def course_choices():
+    return cached_choices("courses", lambda: list(Courses.objects.values_list("id", "course_name")))
+
+
+def session_year_choices():
+    def build():
+        session_years = SessionYearModel.objects.values_list("id", "session_start_year", "session_end_year")
+        return [(session_year_id, str(start)+" to "+str(end)) for session_year_id, start, end in session_years]
+    return cached_choices("session_years", build)
+
+
+@receiver(post_save, sender=Courses)
+@receiver(post_delete, sender=Courses)
+def invalidate_course_choices(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_choices("courses"))
+
+
+@receiver(post_save, sender=SessionYearModel)
+@receiver(post_delete, sender=SessionYearModel)
+def invalidate_session_year_choices(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate_choices("session_years"))
@@ -0,0 +1,174 @@
+from django.db.models import Count, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+
+from student_management_app.models import Staffs, Courses, Subjects, Students, Attendance, AttendanceSummary, LeaveReportStudent, LeaveReportStaff
+
+
+# Dashboard data is built from a fixed number of grouped queries (one per table),
+# so the number of queries does not grow with the number of courses, staffs or students.
+# Attendance counts are read from the AttendanceSummary counters, not from AttendanceReport.
+
+
+def attendance_totals_by_student(student_ids=None):
+    # {student_id: (present, absent)} summed over all Subjects and Session Years
+    summaries = AttendanceSummary.objects.order_by()
+    if student_ids is not None:
+        summaries = summaries.filter(student_id__in=student_ids)
+    return {
+        student_id: (present, absent)
+        for student_id, present, absent in summaries.values_list("student_id").annotate(
+            present=Sum("present_count"),
+            absent=Sum("absent_count"),
+        )
+    }
+
+
+def admin_dashboard_context():
+    # Subjects and Students grouped by Course
+    subject_count_by_course = dict(Subjects.objects.order_by().values_list("course_id").annotate(count=Count("id")))
+    student_count_by_course = dict(Students.objects.order_by().values_list("course_id").annotate(count=Count("id")))
+
+    all_student_count = sum(student_count_by_course.values())
+    subject_count = sum(subject_count_by_course.values())
+
+    # Total Subjects and students in Each Course
+    course_name_list = []
+    subject_count_list = []
+    student_count_list_in_course = []
+    for course_id, course_name in Courses.objects.values_list("id", "course_name"):
+        course_name_list.append(course_name)
+        subject_count_list.append(subject_count_by_course.get(course_id, 0))
+        student_count_list_in_course.append(student_count_by_course.get(course_id, 0))
+    course_count = len(course_name_list)
+
+    # Students in the Course of Each Subject
+    subject_list = []
+    student_count_list_in_subject = []
+    for subject_name, course_id in Subjects.objects.values_list("subject_name", "course_id"):
+        subject_list.append(subject_name)
+        student_count_list_in_subject.append(student_count_by_course.get(course_id, 0))
+
+    # For Staffs
+    attendance_by_staff_user = dict(Attendance.objects.order_by().values_list("subject_id__staff_id").annotate(count=Count("id")))
+    approved_leaves_by_staff = dict(
+        LeaveReportStaff.objects.order_by().values_list("staff_id").annotate(count=Count("id", filter=Q(leave_status=1)))
+    )
+
+    staff_attendance_present_list = []
+    staff_attendance_leave_list = []
+    staff_name_list = []
+    for staff_id, admin_id, first_name in Staffs.objects.order_by("id").values_list("id", "admin_id", "admin__first_name"):
+        staff_attendance_present_list.append(attendance_by_staff_user.get(admin_id, 0))
+        staff_attendance_leave_list.append(approved_leaves_by_staff.get(staff_id, 0))
+        staff_name_list.append(first_name)
+    staff_count = len(staff_name_list)
+
+    # For Students
+    attendance_by_student = attendance_totals_by_student()
+    approved_leaves_by_student = dict(
+        LeaveReportStudent.objects.order_by().values_list("student_id").annotate(count=Count("id", filter=Q(leave_status=1)))
+    )
+
+    student_attendance_present_list = []
+    student_attendance_leave_list = []
+    student_name_list = []
+    for student_id, first_name in Students.objects.order_by("id").values_list("id", "admin__first_name"):
+        present, absent = attendance_by_student.get(student_id, (0, 0))
+        student_attendance_present_list.append(present)
+        student_attendance_leave_list.append(approved_leaves_by_student.get(student_id, 0) + absent)
+        student_name_list.append(first_name)
+
+    return {
+        "all_student_count": all_student_count,
+        "subject_count": subject_count,
+        "course_count": course_count,
+        "staff_count": staff_count,
+        "course_name_list": course_name_list,
+        "subject_count_list": subject_count_list,
+        "student_count_list_in_course": student_count_list_in_course,
+        "subject_list": subject_list,
+        "student_count_list_in_subject": student_count_list_in_subject,
+        "staff_attendance_present_list": staff_attendance_present_list,
+        "staff_attendance_leave_list": staff_attendance_leave_list,
+        "staff_name_list": staff_name_list,
+        "student_attendance_present_list": student_attendance_present_list,
+        "student_attendance_leave_list": student_attendance_leave_list,
+        "student_name_list": student_name_list,
+    }
+
+
+def staff_dashboard_context(staff_user_id):
+    # Subjects of the Staff with their number of Attendance (lectures taken)
+    subject_list = []
+    attendance_list = []
+    course_ids = {}
+    subjects = Subjects.objects.filter(staff_id=staff_user_id).order_by("id").values_list("id", "subject_name", "course_id").annotate(count=Count("attendance"))
+    for subject_id, subject_name, course_id, attendance_count in subjects:
+        subject_list.append(subject_name)
+        attendance_list.append(attendance_count)
+        course_ids[course_id] = True
+
+    # Fetch All Approve Leave
+    leave_count = LeaveReportStaff.objects.filter(staff_id__admin=staff_user_id, leave_status=1).count()
+
+    # Students of the Courses taught, with Present/Absent counts from the Attendance Summary counters
+    student_list = []
+    student_list_attendance_present = []
+    student_list_attendance_absent = []
+    students = Students.objects.filter(course_id__in=list(course_ids)).order_by("id").values_list("id", "admin__first_name", "admin__last_name").annotate(
+        present=Coalesce(Sum("attendancesummary__present_count"), 0),
+        absent=Coalesce(Sum("attendancesummary__absent_count"), 0),
+    )
+    for student_id, first_name, last_name, present, absent in students:
+        student_list.append(first_name+" "+last_name)
+        student_list_attendance_present.append(present)
+        student_list_attendance_absent.append(absent)
+
+    return {
+        "students_count": len(student_list),
+        "attendance_count": sum(attendance_list),
+        "leave_count": leave_count,
+        "subject_count": len(subject_list),
+        "subject_list": subject_list,
+        "attendance_list": attendance_list,
+        "student_list": student_list,
+        "attendance_present_list": student_list_attendance_present,
+        "attendance_absent_list": student_list_attendance_absent
+    }
+
+
+def student_attendance_by_subject(student_user_id):
+    # [(subject_id, subject_name, present, absent)] for every Subject of the Student's Course, in one query:
+    # the Subjects are joined to the Attendance Summary rows of that Student only, summed over Session Years
+    student = Students.objects.filter(admin=student_user_id)
+    return list(
+        Subjects.objects.filter(course_id__in=student.values("course_id")).order_by("id").annotate(
+            summary=FilteredRelation("attendancesummary", condition=Q(attendancesummary__student_id__in=student.values("id"))),
+        ).values_list("id", "subject_name").annotate(
+            present=Coalesce(Sum("summary__present_count"), 0),
+            absent=Coalesce(Sum("summary__absent_count"), 0),
+        )
+    )
+
+
+def student_dashboard_context(student_user_id):
+    subject_name = []
+    data_present = []
+    data_absent = []
+    for subject_id, name, present, absent in student_attendance_by_subject(student_user_id):
+        subject_name.append(name)
+        data_present.append(present)
+        data_absent.append(absent)
+
+    # The totals cover all of the Student's attendance, also of Subjects of an earlier Course
+    totals = attendance_totals_by_student(Students.objects.filter(admin=student_user_id).values("id"))
+    attendance_present, attendance_absent = next(iter(totals.values()), (0, 0))
+    return {
+        "total_attendance": attendance_present + attendance_absent,
+        "attendance_present": attendance_present,
+        "attendance_absent": attendance_absent,
+        "total_subjects": len(subject_name),
+        "subject_name": subject_name,
+        "data_present": data_present,
+        "data_absent": data_absent
+    }
@@ -0,0 +1,235 @@
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from student_management_app.db_router import use_primary
+from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, SessionYearModel, Attendance, AttendanceReport, AttendanceSummary, LeaveReportStudent, LeaveReportStaff
+
+
+# Dashboard contexts cached per role and user ("admin" is shared by every HOD, so its user is 0).
+# Every cached dashboard has a generation key next to its data: invalidating a dashboard deletes
+# the generation, and data stored under another generation is treated as a miss. A context built
+# from data read before an invalidation can therefore never be served after it.
+#
+# Only get_many / set / delete_many / incr / add are used, so any Django cache backend works
+# (locmem, file, Redis, Memcached). Use a shared backend when running several processes,
+# locmem only invalidates the process that made the change.
+
+DASHBOARD_ROLES = ("admin", "staff", "student")
+
+
+def dashboard_cache():
+    return caches[getattr(settings, "DASHBOARD_CACHE_ALIAS", "default")]
+
+
+def generation_key(role, user_id):
+    return "dashboard:generation:%s:%s" % (role, user_id)
+
+
+def data_key(role, user_id):
+    return "dashboard:data:%s:%s" % (role, user_id)
+
+
+def stats_key(role, outcome):
+    return "dashboard:stats:%s:%s" % (role, outcome)
+
+
+def cached_dashboard(role, user_id, build):
+    cache = dashboard_cache()
+    keys = [generation_key(role, user_id), data_key(role, user_id)]
+    values = cache.get_many(keys)
+
+    generation = values.get(keys[0])
+    cached = values.get(keys[1])
+    if generation is not None and cached is not None and cached[0] == generation:
+        count_lookup(cache, role, "hits")
+        return cached[1]
+
+    count_lookup(cache, role, "misses")
+    invalidated = generation is None
+    if invalidated:
+        cache.add(keys[0], uuid.uuid4().hex, None)
+        generation = cache.get(keys[0])
+    # Right after an invalidation the read replica may not have the change yet (db_router)
+    with use_primary() if invalidated else nullcontext():
+        context = build()
+    cache.set(keys[1], (generation, context), getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300))
+    return context
+
+
+def count_lookup(cache, role, outcome):
+    key = stats_key(role, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def dashboard_cache_stats():
+    # {role: {"hits": .., "misses": .., "hit_ratio": ..}} counted since the cache was last cleared
+    cache = dashboard_cache()
+    counts = cache.get_many([stats_key(role, outcome) for role in DASHBOARD_ROLES for outcome in ("hits", "misses")])
+    stats = {}
+    for role in DASHBOARD_ROLES:
+        hits = counts.get(stats_key(role, "hits"), 0)
+        misses = counts.get(stats_key(role, "misses"), 0)
+        stats[role] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
+
+
+def invalidate_dashboards(admin=False, staff_user_ids=(), student_user_ids=()):
+    keys = [generation_key("staff", user_id) for user_id in set(staff_user_ids) if user_id is not None]
+    keys += [generation_key("student", user_id) for user_id in set(student_user_ids) if user_id is not None]
+    if admin:
+        keys.append(generation_key("admin", 0))
+    if keys:
+        dashboard_cache().delete_many(keys)
+
+
+def invalidate_on_commit(admin=False, staff_user_ids=(), student_user_ids=()):
+    # Ids are resolved by the caller while the rows still exist, the cache is only touched after commit
+    staff_user_ids = list(staff_user_ids)
+    student_user_ids = list(student_user_ids)
+    transaction.on_commit(lambda: invalidate_dashboards(admin, staff_user_ids, student_user_ids))
+
+
+def course_staff_user_ids(course_ids):
+    return Subjects.objects.filter(course_id__in=course_ids).values_list("staff_id", flat=True).distinct()
+
+
+def attendance_changed(attendance, student_ids):
+    # Reports of one Attendance were written in bulk (no model signals), for the given Students
+    invalidate_on_commit(
+        admin=True,
+        staff_user_ids=course_staff_user_ids(Subjects.objects.filter(id=attendance.subject_id_id).values("course_id")),
+        student_user_ids=Students.objects.filter(id__in=list(student_ids)).values_list("admin_id", flat=True),
+    )
+
+
+@receiver(post_init, sender=Students)
+@receiver(post_init, sender=Subjects)
+def remember_loaded_values(sender, instance, **kwargs):
+    # Values as loaded, so a save moving a Student or Subject also invalidates the old owners.
+    # Read from __dict__ so deferred fields are not loaded.
+    instance._dashboard_course_id = instance.__dict__.get("course_id_id")
+    if sender is Subjects:
+        instance._dashboard_staff_id = instance.__dict__.get("staff_id_id")
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_loaded_names(sender, instance, **kwargs):
+    instance._dashboard_names = (instance.__dict__.get("first_name"), instance.__dict__.get("last_name"))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_names(sender, instance, created=False, update_fields=None, **kwargs):
+    # The admin dashboard lists staff and student first names, the staff dashboard student names.
+    # New users change no dashboard until their Staffs or Students row is created.
+    if created or (update_fields is not None and not {"first_name", "last_name"}.intersection(update_fields)):
+        return
+    names = (instance.first_name, instance.last_name)
+    if names == getattr(instance, "_dashboard_names", None):
+        return
+    instance._dashboard_names = names
+    if str(instance.user_type) == "3":
+        invalidate_on_commit(
+            admin=True,
+            staff_user_ids=course_staff_user_ids(Students.objects.filter(admin=instance).values("course_id")),
+            student_user_ids=[instance.id],
+        )
+    elif str(instance.user_type) == "2":
+        invalidate_on_commit(admin=True, staff_user_ids=[instance.id])
+
+
+# Attendance and reports are deleted through attendance.delete_attendance and delete_attendance_reports,
+# which invalidate once per delete. A delete receiver here would make Django load and signal every
+# report of a deleted Attendance.
+
+@receiver(post_save, sender=Attendance)
+def invalidate_attendance(sender, instance, **kwargs):
+    invalidate_on_commit(admin=True, staff_user_ids=Subjects.objects.filter(id=instance.subject_id_id).values_list("staff_id", flat=True))
+
+
+@receiver(pre_delete, sender=SessionYearModel)
+def invalidate_session_year(sender, instance, **kwargs):
+    # Its Attendance and counters go with it, read their owners before the cascade
+    invalidate_on_commit(
+        admin=True,
+        staff_user_ids=Subjects.objects.filter(attendance__session_year_id=instance).values_list("staff_id", flat=True).distinct(),
+        student_user_ids=AttendanceSummary.objects.filter(session_year_id=instance).values_list("student_id__admin_id", flat=True).distinct(),
+    )
+
+
+@receiver(post_save, sender=AttendanceReport)
+def invalidate_attendance_report(sender, instance, **kwargs):
+    invalidate_on_commit(
+        admin=True,
+        staff_user_ids=course_staff_user_ids(Students.objects.filter(id=instance.student_id_id).values("course_id")),
+        student_user_ids=Students.objects.filter(id=instance.student_id_id).values_list("admin_id", flat=True),
+    )
+
+
+@receiver(post_save, sender=LeaveReportStudent)
+@receiver(post_delete, sender=LeaveReportStudent)
+def invalidate_student_leave(sender, instance, **kwargs):
+    # Leaves only appear on the admin dashboard
+    invalidate_on_commit(admin=True)
+
+
+@receiver(post_save, sender=LeaveReportStaff)
+@receiver(post_delete, sender=LeaveReportStaff)
+def invalidate_staff_leave(sender, instance, **kwargs):
+    invalidate_on_commit(admin=True, staff_user_ids=Staffs.objects.filter(id=instance.staff_id_id).values_list("admin_id", flat=True))
+
+
+@receiver(post_save, sender=Students)
+@receiver(post_delete, sender=Students)
+def invalidate_student(sender, instance, created=False, **kwargs):
+    # Profile updates also save Students (see profiles.py), only a new, moved or deleted Student changes a dashboard.
+    # Renames are followed on CustomUser (invalidate_user_names).
+    old_course_id = getattr(instance, "_dashboard_course_id", None)
+    if kwargs["signal"] is post_save and not created and old_course_id == instance.course_id_id:
+        return
+    invalidate_on_commit(
+        admin=True,
+        staff_user_ids=course_staff_user_ids([old_course_id, instance.course_id_id]),
+        student_user_ids=[instance.admin_id],
+    )
+    instance._dashboard_course_id = instance.course_id_id
+
+
+@receiver(post_save, sender=Subjects)
+@receiver(post_delete, sender=Subjects)
+def invalidate_subject(sender, instance, **kwargs):
+    course_ids = [getattr(instance, "_dashboard_course_id", None), instance.course_id_id]
+    invalidate_on_commit(
+        admin=True,
+        staff_user_ids=[getattr(instance, "_dashboard_staff_id", None), instance.staff_id_id],
+        student_user_ids=Students.objects.filter(course_id__in=course_ids).values_list("admin_id", flat=True),
+    )
+    instance._dashboard_course_id = instance.course_id_id
+    instance._dashboard_staff_id = instance.staff_id_id
+
+
+@receiver(post_save, sender=Courses)
+@receiver(post_delete, sender=Courses)
+def invalidate_course(sender, instance, **kwargs):
+    invalidate_on_commit(admin=True)
+
+
+@receiver(post_save, sender=Staffs)
+@receiver(post_delete, sender=Staffs)
+def invalidate_staff(sender, instance, created=False, **kwargs):
+    # Like Students, Staffs are saved by profile updates, renames are followed on CustomUser
+    if kwargs["signal"] is post_save and not created:
+        return
+    invalidate_on_commit(admin=True, staff_user_ids=[instance.admin_id])
@@ -0,0 +1,135 @@
+import base64
+import json
+import sys
+
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# Server side processing for DataTables (https://datatables.net/manual/server-side).
+# Pages are read with keyset pagination when the client sends back the "cursor" of the
+# previous page, and with OFFSET otherwise (first page, jumping to a page).
+
+
+class Column:
+    # A sortable column: "field" is the ORM path used for ordering and keyset filtering
+    def __init__(self, name, field, is_datetime=False):
+        self.name = name
+        self.field = field
+        self.is_datetime = is_datetime
+
+    def dump(self, value):
+        return value.isoformat() if self.is_datetime else value
+
+    def load(self, value):
+        return parse_datetime(value) if self.is_datetime else value
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != 4:
+        return None
+    return values
+
+
+def get_int(params, name, default, minimum=0, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def prefix_search(search_fields, search):
+    # Case insensitive prefix match on Lower(field), served by a Lower(field) index of each searched
+    # field (see CustomUser.Meta.indexes). LIKE cannot use such an index on SQLite, so the prefix is
+    # also given as the range [prefix, next prefix) and LIKE only checks the rows of that range.
+    prefix = search.lower()
+    aliases = {}
+    condition = Q()
+    for number, field in enumerate(search_fields):
+        name = "search_%d" % number
+        aliases[name] = Lower(field)
+        match = Q(**{name + "__gte": prefix, name + "__startswith": prefix})
+        if ord(prefix[-1]) < sys.maxunicode:
+            match &= Q(**{name + "__lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)})
+        condition |= match
+    return aliases, condition
+
+
+def datatable_response(request, queryset, columns, search_fields, row, key_field="id", max_length=100):
+    # columns: the sortable Columns (the first one is the default), key_field: unique field used as tie breaker
+    params = request.GET if request.method == "GET" else request.POST
+    draw = get_int(params, "draw", 0)
+    start = get_int(params, "start", 0)
+    length = get_int(params, "length", 10, minimum=1, maximum=max_length)
+
+    records_total = queryset.count()
+
+    search = params.get("search[value]", "").strip()
+    if search:
+        aliases, condition = prefix_search(search_fields, search)
+        queryset = queryset.alias(**aliases).filter(condition)
+        records_filtered = queryset.count()
+    else:
+        records_filtered = records_total
+
+    # Sorting on one column, always followed by the key field so the order is total
+    order_column = params.get("columns[%d][data]" % get_int(params, "order[0][column]", 0), "")
+    column = next((column for column in columns if column.name == order_column), columns[0])
+    descending = params.get("order[0][dir]") == "desc"
+    prefix = "-" if descending else ""
+    if column.field == key_field:
+        queryset = queryset.order_by(prefix + key_field)
+    else:
+        queryset = queryset.order_by(prefix + column.field, prefix + key_field)
+
+    # Keyset pagination from the cursor of the previous page, if it was made for the same order
+    cursor = decode_cursor(params.get("cursor", ""))
+    if cursor is not None and cursor[:2] == [column.name, descending]:
+        value, key = column.load(cursor[2]), cursor[3]
+        lookup = "__lt" if descending else "__gt"
+        if column.field == key_field:
+            queryset = queryset.filter(**{key_field + lookup: key})
+        else:
+            queryset = queryset.filter(Q(**{column.field + lookup: value}) | Q(**{column.field: value, key_field + lookup: key}))
+        page = list(queryset[:length])
+    else:
+        page = list(queryset[start:start + length])
+
+    next_cursor = None
+    if page:
+        last = page[-1]
+        next_cursor = encode_cursor([column.name, descending, column.dump(resolve(last, column.field)), resolve(last, key_field)])
+
+    return JsonResponse({
+        "draw": draw,
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": [row(obj) for obj in page],
+        "cursor": next_cursor,
+    })
+
+
+def resolve(obj, field):
+    # Follows an ORM path like "admin__last_name" on a model instance
+    for part in field.split("__"):
+        obj = getattr(obj, part)
+    return obj
+
+
+def format_datetime(value):
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M") if value else ""
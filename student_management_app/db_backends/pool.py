@@ -0,0 +1,154 @@
+import threading
+import time
+
+from django.db import OperationalError
+
+
+# In-process connection pool of the db_backends engines (DATABASE_POOL_SIZE, see db_config).
+# Closing a connection, which Django does at the end of every request with CONN_MAX_AGE = 0,
+# rolls it back and gives it back to the pool of its alias; opening one takes an idle connection,
+# tested first with CONN_HEALTH_CHECKS, or connects while fewer than SIZE are in use. Past SIZE
+# a request waits up to TIMEOUT seconds, then fails with OperationalError.
+#
+# pool_stats() reports per alias the connections in use and their peak, the waits and timeouts,
+# and the saturation (in use / size): near 1 the pool, or the database, is the bottleneck.
+
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+
+def close_quietly(raw_connection):
+    try:
+        raw_connection.close()
+    except Exception:
+        pass
+
+
+def is_usable(raw_connection):
+    try:
+        cursor = raw_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class ConnectionPool:
+
+    def __init__(self, size, timeout=10.0):
+        self.size = size
+        self.timeout = timeout
+        self.idle = []
+        self.condition = threading.Condition()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.created = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def acquire(self, connect, health_checks=False):
+        # A raw connection: an idle one, or a new one made by connect()
+        with self.condition:
+            if not self.idle and self.in_use >= self.size:
+                self.waits += 1
+                start = time.monotonic()
+                available = self.condition.wait_for(lambda: self.idle or self.in_use < self.size, self.timeout)
+                self.wait_seconds += time.monotonic() - start
+                if not available:
+                    self.timeouts += 1
+                    raise OperationalError("No database connection free in the pool after %s seconds (%d in use)." % (self.timeout, self.in_use))
+            raw_connection = self.idle.pop() if self.idle else None
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+        try:
+            if raw_connection is not None and health_checks and not is_usable(raw_connection):
+                close_quietly(raw_connection)
+                raw_connection = None
+            if raw_connection is None:
+                raw_connection = connect()
+                with self.condition:
+                    self.created += 1
+        except Exception:
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        return raw_connection
+
+    def release(self, raw_connection):
+        # Whatever the request left open is rolled back; a connection that cannot is dropped
+        try:
+            raw_connection.rollback()
+        except Exception:
+            close_quietly(raw_connection)
+            raw_connection = None
+        with self.condition:
+            self.in_use -= 1
+            if raw_connection is not None:
+                self.idle.append(raw_connection)
+            self.condition.notify()
+
+    def close_idle(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for raw_connection in idle:
+            close_quietly(raw_connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "peak_in_use": self.peak_in_use,
+                "saturation": round(self.in_use / self.size, 3),
+                "peak_saturation": round(self.peak_in_use / self.size, 3),
+                "created": self.created,
+                "waits": self.waits,
+                "wait_ms": round(self.wait_seconds * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+
+
+def connection_pool(alias, config):
+    # The pool of a database alias, None when its POOL SIZE is 0 (or missing)
+    size = (config or {}).get("SIZE", 0)
+    if not size:
+        return None
+    with POOLS_LOCK:
+        if alias not in POOLS:
+            POOLS[alias] = ConnectionPool(size, config.get("TIMEOUT", 10.0))
+        return POOLS[alias]
+
+
+def pool_stats():
+    with POOLS_LOCK:
+        pools = dict(POOLS)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class PooledConnectionMixin:
+    # Mixed into the DatabaseWrapper of a Django backend, see db_backends/*/base.py
+
+    def connection_pool(self):
+        return connection_pool(self.alias, self.settings_dict.get("POOL"))
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        pool = self.connection_pool()
+        if pool is None:
+            return connect(conn_params)
+        return pool.acquire(lambda: connect(conn_params), self.settings_dict.get("CONN_HEALTH_CHECKS", False))
+
+    def _close(self):
+        pool = self.connection_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.release(self.connection)
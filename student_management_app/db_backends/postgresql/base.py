@@ -0,0 +1,7 @@
+from django.db.backends.postgresql import base
+
+from student_management_app.db_backends.pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,18 @@
+from django.db.backends.sqlite3 import base
+
+from student_management_app.db_backends.pool import PooledConnectionMixin
+
+
+class TunedDatabaseWrapper(base.DatabaseWrapper):
+    # SQLite tuning mode: the PRAGMAS of the settings (see db_config) run on every new connection.
+    # Pooled connections keep them, so they run once per connection of the pool.
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get("PRAGMAS", {}).items():
+            conn.execute("PRAGMA %s = %s" % (name, value))
+        return conn
+
+
+class DatabaseWrapper(PooledConnectionMixin, TunedDatabaseWrapper):
+    pass
@@ -0,0 +1,98 @@
+# DATABASES["default"] built from environment variables (read by settings.py, so nothing here may
+# import models). Without any variable set it is the SQLite file of the project, as before.
+#
+#   DATABASE_ENGINE          sqlite (default) or postgresql
+#   DATABASE_NAME            database name, or the file of SQLite
+#   DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT
+#   DATABASE_CONN_MAX_AGE    seconds a connection is kept between requests (default 0 for SQLite,
+#                            60 for the others; "none" keeps it forever)
+#   DATABASE_HEALTH_CHECKS   1/0, test a kept connection before a request reuses it
+#                            (default: on when connections are kept)
+#   DATABASE_POOL_SIZE       connections of the in-process pool (db_backends), 0 = no pool (default)
+#   DATABASE_POOL_TIMEOUT    seconds a request waits for a free pooled connection (default 10)
+#   DATABASE_SQLITE_TUNING   1/0, SQLite tuning mode (db_backends.sqlite3): every new connection
+#                            sets WAL journal, synchronous=NORMAL, a busy timeout, mmap and a
+#                            larger page cache, so concurrent writers wait instead of failing
+#                            with "database is locked" and readers no longer block on writers
+#   DATABASE_SQLITE_BUSY_TIMEOUT       ms a writer waits for the lock (default 30000; without
+#                                      the tuning mode 5000, the default of Python)
+#   DATABASE_SQLITE_MMAP_SIZE          bytes of the file read through mmap (default 256 MiB)
+#   DATABASE_SQLITE_CACHE_SIZE         page cache, negative in KiB as in SQLite (default -65536, 64 MiB)
+#   DATABASE_SQLITE_TEMP_STORE_MEMORY  1/0, temporary tables and indexes in memory (default 0)
+#
+# A read replica (db_router) is added as DATABASES["replica"] when DATABASE_REPLICA_HOST (or
+# DATABASE_REPLICA_NAME, e.g. for a copied SQLite file) is set; DATABASE_REPLICA_NAME, _USER,
+# _PASSWORD and _PORT default to those of the primary.
+
+ENGINES = {
+    "sqlite": "django.db.backends.sqlite3",
+    "postgresql": "django.db.backends.postgresql",
+}
+# Engines of db_backends, used for the pool and the SQLite tuning mode
+APP_ENGINES = {
+    "sqlite": "student_management_app.db_backends.sqlite3",
+    "postgresql": "student_management_app.db_backends.postgresql",
+}
+
+
+def env_flag(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def database_settings(env, default_name):
+    engine = env.get("DATABASE_ENGINE", "sqlite")
+    if engine not in ENGINES:
+        raise ValueError("DATABASE_ENGINE must be one of %s, not %s." % (", ".join(ENGINES), engine))
+
+    conn_max_age = env.get("DATABASE_CONN_MAX_AGE", "0" if engine == "sqlite" else "60")
+    conn_max_age = None if conn_max_age.lower() == "none" else int(conn_max_age)
+    health_checks = env.get("DATABASE_HEALTH_CHECKS")
+    pool_size = int(env.get("DATABASE_POOL_SIZE", "0"))
+    sqlite_tuning = engine == "sqlite" and env_flag(env.get("DATABASE_SQLITE_TUNING", "0"))
+
+    database = {
+        "ENGINE": APP_ENGINES[engine] if pool_size or sqlite_tuning else ENGINES[engine],
+        "NAME": env.get("DATABASE_NAME", default_name if engine == "sqlite" else "crm_university"),
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": env_flag(health_checks) if health_checks is not None else conn_max_age != 0,
+    }
+    if engine != "sqlite":
+        database.update({
+            "USER": env.get("DATABASE_USER", ""),
+            "PASSWORD": env.get("DATABASE_PASSWORD", ""),
+            "HOST": env.get("DATABASE_HOST", "localhost"),
+            "PORT": env.get("DATABASE_PORT", ""),
+        })
+    if pool_size:
+        database["POOL"] = {"SIZE": pool_size, "TIMEOUT": float(env.get("DATABASE_POOL_TIMEOUT", "10"))}
+    if sqlite_tuning:
+        database["PRAGMAS"] = sqlite_pragmas(env)
+    return database
+
+
+def sqlite_pragmas(env):
+    # PRAGMAs of the SQLite tuning mode, in the order they are run
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(env.get("DATABASE_SQLITE_BUSY_TIMEOUT", "30000")),
+        "mmap_size": int(env.get("DATABASE_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(env.get("DATABASE_SQLITE_CACHE_SIZE", "-65536")),
+    }
+    if env_flag(env.get("DATABASE_SQLITE_TEMP_STORE_MEMORY", "0")):
+        pragmas["temp_store"] = "MEMORY"
+    return pragmas
+
+
+def replica_database_settings(env, primary):
+    # The settings of the read replica, None when there is none
+    if not env.get("DATABASE_REPLICA_HOST") and not env.get("DATABASE_REPLICA_NAME"):
+        return None
+    replica = dict(primary)
+    for field in ("NAME", "USER", "PASSWORD", "HOST", "PORT"):
+        value = env.get("DATABASE_REPLICA_" + field)
+        if value is not None:
+            replica[field] = value
+    # Tests read the primary's test database through it
+    replica["TEST"] = {"MIRROR": "default"}
+    return replica
@@ -0,0 +1,80 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Reads of the views decorated with @read_replica go to the read replica (DATABASE_REPLICA, set
+# from DATABASE_REPLICA_* environment variables by db_config), everything else to the primary.
+# A user who wrote to the primary (ReadYourWritesMiddleWare marks their session) reads the
+# primary for DATABASE_REPLICA_LAG_SECONDS, so a staff member sees the attendance they just saved
+# even if the replica is behind. Without a replica the router and the decorator do nothing.
+
+WRITE_MARKER = "db_write_at"
+
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, "DATABASE_REPLICA", None)
+    return alias if alias in settings.DATABASES else None
+
+
+def wrote_recently(request):
+    session = getattr(request, "session", None)
+    written_at = session.get(WRITE_MARKER) if session is not None else None
+    return written_at is not None and time.time() - written_at < getattr(settings, "DATABASE_REPLICA_LAG_SECONDS", 5)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    token = replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def use_primary():
+    return use_replica(False)
+
+
+def read_replica(view_func):
+    # The view only reads: its queries may run on the replica. Responses streamed after the
+    # view returns read the primary.
+    @wraps(view_func)
+    def wrapper_view(request, *args, **kwargs):
+        if replica_alias() is None or wrote_recently(request):
+            return view_func(request, *args, **kwargs)
+        with use_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper_view
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        # Reads inside a transaction stay with its writes
+        if alias is None or not replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from the replica
+        return DEFAULT_DB_ALIAS if replica_alias() is not None else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its tables from the primary
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,246 @@
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+
+from student_management_app.attendance_storage import attendance_storage
+from student_management_app.models import Subjects, Attendance, StudentResult, LeaveReportStudent, LeaveReportStaff
+
+
+# Data exports for registrars, written row by row so memory does not grow with the export size.
+# Every export is registered with @export(name, header, filters, status_labels): a function
+# taking the filter condition (a Q) and returning the rows lazily, usually a values_list queryset
+# read with iterator(chunk_size=...). "filters" maps the accepted filter names (session_year,
+# course, subject) to functions id -> Q, and "status_labels" turns the status in the last
+# column into text.
+
+EXPORTS = {}
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_FILTERS = ("session_year", "course", "subject")
+CHUNK_SIZE = 2000
+
+LEAVE_STATUS = {0: "Pending", 1: "Approved", 2: "Rejected"}
+# Text starting with one of these is run as a formula by Excel and LibreOffice
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Export:
+    def __init__(self, name, header, filters, status_labels, rows):
+        self.name = name
+        self.header = header
+        self.filters = filters
+        self.status_labels = status_labels
+        self.rows = rows
+
+    def condition(self, **filters):
+        condition = Q()
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in self.filters:
+                raise ExportError("The %s export cannot be filtered by %s." % (self.name, name))
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ExportError("The %s filter must be an id." % name)
+            condition &= self.filters[name](value)
+        return condition
+
+
+def export(name, header, filters, status_labels):
+    def register(func):
+        EXPORTS[name] = Export(name, header, filters, status_labels, func)
+        return func
+    return register
+
+
+@export("attendance", header=("Student Id", "Username", "First Name", "Last Name", "Course", "Subject", "Session Start", "Session End", "Date", "Status"), filters={
+    "session_year": lambda value: Q(session_year_id=value),
+    "course": lambda value: Q(subject_id__course_id=value),
+    "subject": lambda value: Q(subject_id=value),
+}, status_labels={True: "Present", False: "Absent"})
+def attendance_rows(condition):
+    # One row per Student, Subject and Attendance date. The lectures are read once, the reports
+    # come from the configured attendance storage.
+    attendance = Attendance.objects.filter(condition)
+    lectures = {attendance_id: lecture for attendance_id, *lecture in attendance.values_list(
+        "id", "subject_id__course_id__course_name", "subject_id__subject_name",
+        "session_year_id__session_start_year", "session_year_id__session_end_year", "attendance_date",
+    ).iterator(chunk_size=CHUNK_SIZE)}
+    for attendance_id, student_id, admin_id, username, first_name, last_name, status in attendance_storage().named_reports(id__in=attendance.values("id")):
+        yield (student_id, username, first_name, last_name, *lectures[attendance_id], status)
+
+
+@export("results", header=("Student Id", "Username", "First Name", "Last Name", "Course", "Subject", "Exam Marks", "Assignment Marks"), filters={
+    "session_year": lambda value: Q(student_id__session_year_id=value),
+    "course": lambda value: Q(subject_id__course_id=value),
+    "subject": lambda value: Q(subject_id=value),
+}, status_labels={})
+def result_rows(condition):
+    return StudentResult.objects.filter(condition).order_by("id").values_list(
+        "student_id", "student_id__admin__username", "student_id__admin__first_name", "student_id__admin__last_name",
+        "subject_id__course_id__course_name", "subject_id__subject_name", "subject_exam_marks", "subject_assignment_marks",
+    )
+
+
+@export("student_leaves", header=("Student Id", "Username", "First Name", "Last Name", "Course", "Leave Date", "Message", "Status"), filters={
+    "session_year": lambda value: Q(student_id__session_year_id=value),
+    "course": lambda value: Q(student_id__course_id=value),
+    "subject": lambda value: Q(student_id__course_id__in=Subjects.objects.filter(id=value).values("course_id")),
+}, status_labels=LEAVE_STATUS)
+def student_leave_rows(condition):
+    return LeaveReportStudent.objects.filter(condition).order_by("id").values_list(
+        "student_id", "student_id__admin__username", "student_id__admin__first_name", "student_id__admin__last_name",
+        "student_id__course_id__course_name", "leave_date", "leave_message", "leave_status",
+    )
+
+
+@export("staff_leaves", header=("Staff Id", "Username", "First Name", "Last Name", "Leave Date", "Message", "Status"), filters={
+    # Staffs teaching in the Course / the Subject
+    "course": lambda value: Q(staff_id__admin__in=Subjects.objects.filter(course_id=value).values("staff_id")),
+    "subject": lambda value: Q(staff_id__admin__in=Subjects.objects.filter(id=value).values("staff_id")),
+}, status_labels=LEAVE_STATUS)
+def staff_leave_rows(condition):
+    return LeaveReportStaff.objects.filter(condition).order_by("id").values_list(
+        "staff_id", "staff_id__admin__username", "staff_id__admin__first_name", "staff_id__admin__last_name",
+        "leave_date", "leave_message", "leave_status",
+    )
+
+
+def export_rows(name, progress=None, **filters):
+    # Header row, then the data rows with statuses as text. progress(rows_read) is called every CHUNK_SIZE rows.
+    definition = EXPORTS[name]
+    yield definition.header
+    labels = definition.status_labels
+    rows = definition.rows(definition.condition(**filters))
+    if hasattr(rows, "iterator"):
+        rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    for i, row in enumerate(rows, 1):
+        if labels:
+            row = row[:-1] + (labels.get(row[-1], row[-1]),)
+        yield row
+        if progress and i % CHUNK_SIZE == 0:
+            progress(i)
+
+
+def spreadsheet_text(value):
+    # User entered text (names, addresses, leave messages) is kept as text by a leading quote
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    # File-like object handing back what is written to it, for csv.writer
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows, rows_per_chunk=500):
+    writer = csv.writer(Echo())
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([spreadsheet_text(value) for value in row]))
+        if len(chunk) >= rows_per_chunk:
+            yield "".join(chunk).encode()
+            chunk = []
+    yield "".join(chunk).encode()
+
+
+class ChunkBuffer:
+    # Unseekable file for zipfile: collects written bytes until they are taken
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_FILES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool) or value is None:
+        value = "" if value is None else str(value)
+    if isinstance(value, (int, float)):
+        return '<c><v>%r</v></c>' % value
+    return '<c t="inlineStr"><is><t>%s</t></is></c>' % escape(spreadsheet_text(str(value)))
+
+
+def xlsx_chunks(rows, rows_per_chunk=500):
+    # A minimal single sheet workbook (inline strings, no styles) written with zipfile to an
+    # unseekable buffer, so the archive is sent while it is being written
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_FILES.items():
+            archive.writestr(name, content)
+        yield buffer.take()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            for i, row in enumerate(rows, 1):
+                sheet.write(("<row>" + "".join(xlsx_cell(value) for value in row) + "</row>").encode())
+                if i % rows_per_chunk == 0:
+                    yield buffer.take()
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.take()
+
+
+def export_chunks(name, file_format, progress=None, **filters):
+    # Bytes of an export in the given format, produced lazily
+    if name not in EXPORTS:
+        raise ExportError("Unknown export %s, choose from %s." % (name, ", ".join(EXPORTS)))
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError("Unknown format %s, choose from %s." % (file_format, ", ".join(EXPORT_FORMATS)))
+    # Checked before the first chunk is asked for, so a bad filter is not reported mid-stream
+    EXPORTS[name].condition(**filters)
+    rows = export_rows(name, progress, **filters)
+    return csv_chunks(rows) if file_format == "csv" else xlsx_chunks(rows)
+
+
+def content_type(file_format):
+    if file_format == "csv":
+        return "text/csv"
+    return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
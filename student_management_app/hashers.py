@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+# Django's PBKDF2 hasher with the cost set by PASSWORD_HASH_ITERATIONS (None: Django's default).
+# The algorithm name is unchanged, so existing hashes keep working, and a hash made with a lower
+# cost is saved again with this one at its next login. Hashes are never saved with a lower cost.
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_HASH_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
+
+    def must_update(self, encoded):
+        return self.decode(encoded)["iterations"] < self.iterations
+
+
+def init_hasher_process():
+    # Initializer of the spawned processes hashing imported passwords (student_import), which do
+    # not inherit the app registry. Lives here because this module imports no models.
+    import django
+    django.setup()
@@ -0,0 +1,61 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+# Helpers of the versioned JSON API (ApiViews). Responses are real JSON arrays, streamed in
+# chunks so large cohorts are never held in memory as one string, and carry an ETag computed
+# from a cheap version query: a client sending it back in If-None-Match gets a 304 and the
+# rows are not read at all.
+
+API_VERSION = "v1"
+
+
+def json_etag(*version):
+    digest = hashlib.sha1(json.dumps([API_VERSION, version], cls=DjangoJSONEncoder, sort_keys=True).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def stream_json_array(rows, chunk_size=500):
+    # Yields "[", then the rows in chunks of comma separated objects, then "]"
+    encoder = DjangoJSONEncoder()
+    yield "["
+    chunk = []
+    separator = ""
+    for row in rows:
+        chunk.append(encoder.encode(row))
+        if len(chunk) >= chunk_size:
+            yield separator + ",".join(chunk)
+            separator = ","
+            chunk = []
+    if chunk:
+        yield separator + ",".join(chunk)
+    yield "]"
+
+
+def json_array_response(request, version, rows):
+    # version: anything JSON serializable that changes with the rows; rows: iterable of dicts, read lazily
+    etag = json_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = StreamingHttpResponse(stream_json_array(rows), content_type="application/json")
+    response["ETag"] = etag
+    # Cached by the browser, but always revalidated
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def int_params(params, *names):
+    # Required integer parameters, None if one is missing or not a number
+    try:
+        return [int(params[name]) for name in names]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def invalid_parameters(*names):
+    return JsonResponse({"status": "error", "error": "invalid_parameters", "required": list(names)}, status=400)
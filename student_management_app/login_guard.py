@@ -0,0 +1,83 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Cheap answers before the password hash of a login (EmailBackEnd):
+# - emails without a user are remembered for LOGIN_UNKNOWN_EMAIL_TIMEOUT seconds, so repeated
+#   attempts with them read the cache instead of the users table. profiles.py and the student
+#   import forget the emails of the users they create or change.
+# - failed logins are counted over LOGIN_FAILURE_WINDOW seconds per email and client address and
+#   per email; past LOGIN_FAILURE_LIMIT (email from one address) or LOGIN_EMAIL_FAILURE_LIMIT
+#   (email from all addresses, a much higher ceiling against guessing spread over many addresses)
+#   the login is refused without checking the password. Wrong passwords typed from one address
+#   therefore do not lock the user out everywhere else. Nothing is counted per address alone: a
+#   campus NAT or a proxy puts many users behind one address, and its failures would lock them all out.
+#
+# Use a cache shared by all workers (see CACHES in settings.py) for the limits to hold across them.
+
+def login_cache():
+    return caches[getattr(settings, "LOGIN_CACHE_ALIAS", "default")]
+
+
+def email_hash(email):
+    return hashlib.sha256((email or "").strip().lower().encode()).hexdigest()
+
+
+def unknown_email_key(email):
+    return "login:unknown:%s" % email_hash(email)
+
+
+def is_unknown_email(email):
+    return login_cache().get(unknown_email_key(email)) is not None
+
+
+def remember_unknown_email(email):
+    login_cache().set(unknown_email_key(email), 1, getattr(settings, "LOGIN_UNKNOWN_EMAIL_TIMEOUT", 60))
+
+
+def forget_unknown_emails(emails):
+    keys = [unknown_email_key(email) for email in emails if email]
+    if keys:
+        login_cache().delete_many(keys)
+
+
+def client_address(request):
+    return request.META.get("REMOTE_ADDR", "") if request is not None else ""
+
+
+def email_address_failure_key(request, email):
+    return "login:failures:email-address:%s:%s" % (email_hash(email), client_address(request))
+
+
+def failure_keys(request, email):
+    # {key: limit}
+    return {
+        email_address_failure_key(request, email): getattr(settings, "LOGIN_FAILURE_LIMIT", 10),
+        "login:failures:email:%s" % email_hash(email): getattr(settings, "LOGIN_EMAIL_FAILURE_LIMIT", 1000),
+    }
+
+
+def login_throttled(request, email):
+    keys = failure_keys(request, email)
+    counts = login_cache().get_many(keys)
+    return any(counts.get(key, 0) >= limit for key, limit in keys.items())
+
+
+def count_failed_login(request, email):
+    cache = login_cache()
+    window = getattr(settings, "LOGIN_FAILURE_WINDOW", 300)
+    for key in failure_keys(request, email):
+        # The window starts with the first failure
+        if not cache.add(key, 1, window):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Expired between add and incr
+                cache.add(key, 1, window)
+
+
+def clear_failed_logins(request, email):
+    # After a successful login; the email ceiling keeps its count
+    login_cache().delete(email_address_failure_key(request, email))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from student_management_app.attendance_storage import STORAGES, convert_attendance_storage
+
+
+class Command(BaseCommand):
+    help = "Move the existing attendance to another storage (see ATTENDANCE_STORAGE), then change the setting"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", required=True, choices=sorted(STORAGES))
+        parser.add_argument("--batch-size", type=int, default=500, help="Attendance converted per transaction")
+
+    def handle(self, *args, **options):
+        converted = convert_attendance_storage(options["to"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Converted %d attendance to the %s storage." % (converted, options["to"])))
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from student_management_app.exports import EXPORTS, EXPORT_FORMATS, ExportError, export_chunks
+
+
+class Command(BaseCommand):
+    help = "Write an export (attendance, results, student_leaves, staff_leaves) as CSV or XLSX, e.g. for nightly dumps"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=list(EXPORTS))
+        parser.add_argument("--format", default="csv", choices=EXPORT_FORMATS)
+        parser.add_argument("--session-year", type=int)
+        parser.add_argument("--course", type=int)
+        parser.add_argument("--subject", type=int)
+        parser.add_argument("--output", help="File to write, standard output if not given")
+
+    def handle(self, *args, **options):
+        try:
+            chunks = export_chunks(options["name"], options["format"], session_year=options["session_year"], course=options["course"], subject=options["subject"])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        size = 0
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS("Wrote %d bytes to %s in %.1fs" % (size, options["output"], time.perf_counter() - started)))
@@ -0,0 +1,164 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from student_management_app.attendance import rebuild_attendance_summary
+from student_management_app.models import CustomUser, AdminHOD, Staffs, Courses, Subjects, Students, SessionYearModel, Attendance, AttendanceReport, LeaveReportStudent, LeaveReportStaff, FeedBackStudent, FeedBackStaffs, StudentResult
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic university (courses, subjects, staffs, students, attendance, leaves, feedback, results) with bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="gen", help="Prefix of generated usernames and names")
+        parser.add_argument("--courses", type=int, default=10)
+        parser.add_argument("--subjects-per-course", type=int, default=5)
+        parser.add_argument("--staffs", type=int, default=20)
+        parser.add_argument("--students", type=int, default=2000)
+        parser.add_argument("--session-years", type=int, default=1)
+        parser.add_argument("--lectures", type=int, default=100, help="Attendance dates per subject and session year")
+        parser.add_argument("--leaves-per-person", type=int, default=2)
+        parser.add_argument("--feedback-per-person", type=int, default=1)
+        parser.add_argument("--password", default="password", help="Password of every generated user")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["courses"] < 1 or options["subjects_per_course"] < 1 or options["staffs"] < 1 or options["session_years"] < 1:
+            raise CommandError("--courses, --subjects-per-course, --staffs and --session-years must be at least 1.")
+        prefix = options["prefix"]
+        if CustomUser.objects.filter(username__startswith=prefix+"-").exists():
+            raise CommandError("Users with prefix '%s' already exist, use another --prefix." % prefix)
+
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            # Every user gets the same password, hashed once
+            password = make_password(options["password"])
+
+            session_years = self.generate_session_years(options["session_years"])
+            courses = self.bulk_create(Courses, [Courses(course_name="%s Course %d" % (prefix, c)) for c in range(options["courses"])], course_name__startswith=prefix+" Course ")
+
+            hod_user = self.create_users(prefix+"-hod", 1, 1, password)[0]
+            AdminHOD.objects.bulk_create([AdminHOD(admin_id=hod_user)])
+
+            staff_users = self.create_users(prefix+"-staff", options["staffs"], 2, password)
+            staffs = self.bulk_create(Staffs, [Staffs(admin_id=user_id, address="") for user_id in staff_users], admin__username__startswith=prefix+"-staff-")
+
+            subjects = self.bulk_create(Subjects, [
+                Subjects(subject_name="%s Subject %d.%d" % (prefix, c, s), course_id_id=course_id, staff_id_id=staff_users[(c * options["subjects_per_course"] + s) % len(staff_users)])
+                for c, course_id in enumerate(courses) for s in range(options["subjects_per_course"])
+            ], subject_name__startswith=prefix+" Subject ")
+
+            student_users = self.create_users(prefix+"-student", options["students"], 3, password)
+            students = self.bulk_create(Students, [
+                Students(admin_id=user_id, gender=self.random.choice(("Male", "Female")), profile_pic="", address="", course_id_id=courses[i % len(courses)], session_year_id_id=session_years[i // len(courses) % len(session_years)])
+                for i, user_id in enumerate(student_users)
+            ], admin__username__startswith=prefix+"-student-")
+
+            report_count = self.generate_attendance(session_years, subjects, options["lectures"])
+            self.generate_activity(staffs, students, subjects, options["leaves_per_person"], options["feedback_per_person"], prefix)
+            summary_count = rebuild_attendance_summary(batch_size=self.batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Generated %d courses, %d subjects, %d staffs, %d students, %d attendance reports (%d summary rows) in %.1fs. HOD login: %s@example.com"
+            % (len(courses), len(subjects), len(staffs), len(students), report_count, summary_count, time.perf_counter() - started, prefix+"-hod-0")
+        ))
+
+    def bulk_create(self, model, objs, **lookup):
+        # bulk_create does not return ids on every database, so read them back in insertion order
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        return list(model.objects.filter(**lookup).order_by("id").values_list("id", flat=True))
+
+    def create_users(self, username_prefix, count, user_type, password):
+        users = [
+            CustomUser(username="%s-%d" % (username_prefix, i), email="%s-%d@example.com" % (username_prefix, i), first_name=username_prefix.split("-")[-1].title(), last_name=str(i), user_type=str(user_type), password=password)
+            for i in range(count)
+        ]
+        return self.bulk_create(CustomUser, users, username__startswith=username_prefix+"-")
+
+    def generate_session_years(self, count):
+        session_years = []
+        for i in range(count):
+            start_year = 2020 + i
+            session_years.append(SessionYearModel(session_start_year=datetime.date(start_year, 9, 1), session_end_year=datetime.date(start_year+1, 6, 30)))
+        SessionYearModel.objects.bulk_create(session_years)
+        return list(SessionYearModel.objects.order_by("-id").values_list("id", flat=True)[:count])[::-1]
+
+    def generate_attendance(self, session_years, subjects, lectures):
+        # One Attendance per lecture, one AttendanceReport per Student of the Course in that Session Year
+        subject_course = dict(Subjects.objects.filter(id__in=subjects).values_list("id", "course_id"))
+        attendance = []
+        for session_year_index, session_year_id in enumerate(session_years):
+            first_day = datetime.date(2020 + session_year_index, 9, 1)
+            for subject_id in subjects:
+                for lecture in range(lectures):
+                    attendance.append(Attendance(subject_id_id=subject_id, session_year_id_id=session_year_id, attendance_date=first_day + datetime.timedelta(days=lecture * 7 // 2)))
+        Attendance.objects.bulk_create(attendance, batch_size=self.batch_size)
+
+        students_by_group = {}
+        for student_id, course_id, session_year_id in Students.objects.filter(course_id__in=set(subject_course.values()), session_year_id__in=session_years).values_list("id", "course_id", "session_year_id"):
+            students_by_group.setdefault((course_id, session_year_id), []).append(student_id)
+
+        # Reports are the bulk of the data, so they skip model instances and go through executemany
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        report_count = 0
+        batch = []
+        attendance_rows = list(Attendance.objects.filter(subject_id__in=subjects).order_by("id").values_list("id", "subject_id", "session_year_id"))
+        for attendance_id, subject_id, session_year_id in attendance_rows:
+            for student_id in students_by_group.get((subject_course[subject_id], session_year_id), ()):
+                batch.append((student_id, attendance_id, self.random.random() < 0.85, now, now))
+            if len(batch) >= self.batch_size:
+                self.insert_rows(AttendanceReport, ("student_id", "attendance_id", "status", "created_at", "updated_at"), batch)
+                report_count += len(batch)
+                batch = []
+        self.insert_rows(AttendanceReport, ("student_id", "attendance_id", "status", "created_at", "updated_at"), batch)
+        return report_count + len(batch)
+
+    def insert_rows(self, model, field_names, rows):
+        if not rows:
+            return
+        columns = [model._meta.get_field(name).column for name in field_names]
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+            connection.ops.quote_name(model._meta.db_table),
+            ", ".join(connection.ops.quote_name(column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def generate_activity(self, staffs, students, subjects, leaves_per_person, feedback_per_person, prefix):
+        leave_date = "2020-10-%02d"
+        LeaveReportStaff.objects.bulk_create([
+            LeaveReportStaff(staff_id_id=staff_id, leave_date=leave_date % (i+1), leave_message="Leave", leave_status=self.random.randint(0, 2))
+            for staff_id in staffs for i in range(leaves_per_person)
+        ], batch_size=self.batch_size)
+        LeaveReportStudent.objects.bulk_create([
+            LeaveReportStudent(student_id_id=student_id, leave_date=leave_date % (i+1), leave_message="Leave", leave_status=self.random.randint(0, 2))
+            for student_id in students for i in range(leaves_per_person)
+        ], batch_size=self.batch_size)
+        FeedBackStaffs.objects.bulk_create([
+            FeedBackStaffs(staff_id_id=staff_id, feedback="Feedback", feedback_reply="")
+            for staff_id in staffs for i in range(feedback_per_person)
+        ], batch_size=self.batch_size)
+        FeedBackStudent.objects.bulk_create([
+            FeedBackStudent(student_id_id=student_id, feedback="Feedback", feedback_reply="")
+            for student_id in students for i in range(feedback_per_person)
+        ], batch_size=self.batch_size)
+
+        # A Result for every Student in every Subject of the Course
+        subjects_by_course = {}
+        for subject_id, course_id in Subjects.objects.filter(id__in=subjects).values_list("id", "course_id"):
+            subjects_by_course.setdefault(course_id, []).append(subject_id)
+        results = []
+        for student_id, course_id in Students.objects.filter(admin__username__startswith=prefix+"-student-").values_list("id", "course_id").iterator():
+            for subject_id in subjects_by_course.get(course_id, ()):
+                results.append(StudentResult(student_id_id=student_id, subject_id_id=subject_id, subject_exam_marks=self.random.randint(0, 100), subject_assignment_marks=self.random.randint(0, 100)))
+        StudentResult.objects.bulk_create(results, batch_size=self.batch_size)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from student_management_app.student_import import IMPORT_FIELDS, BATCH_SIZE, import_students
+
+
+class Command(BaseCommand):
+    help = "Enroll students from a CSV file with the columns %s, all or none" % ", ".join(IMPORT_FIELDS)
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--processes", type=int, help="Password hashing processes (default: IMPORT_HASH_PROCESSES or the number of CPUs)")
+
+    def handle(self, *args, **options):
+        with open(options["path"], "rb") as f:
+            data = f.read()
+        try:
+            result = import_students(data, batch_size=options["batch_size"], processes=options["processes"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for error in result["errors"]:
+            self.stderr.write("Line %d: %s" % (error["line"], "; ".join("%s: %s" % (field, " ".join(messages)) for field, messages in error["errors"].items())))
+        if result["errors"]:
+            raise CommandError("%d invalid lines, no student was imported." % len(result["errors"]))
+        self.stdout.write(self.style.SUCCESS("Imported %d students." % result["created"]))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from student_management_app.attendance import rebuild_attendance_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the AttendanceSummary counters from the stored attendance"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = rebuild_attendance_summary(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Rebuilt %d attendance summary rows." % created))
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from student_management_app.benchmarks import SCENARIOS, EXPLAINS, LOGIN_SCENARIOS, CONCURRENCY_SCENARIOS, run_benchmarks, explain_plans, compare_attendance_storage, benchmark_logins, compare_concurrency, compare_connection_pool, compare_sqlite_tuning
+
+
+class Command(BaseCommand):
+    help = "Run the view benchmarks against the current database and print p50/p95 latency and query counts as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=sorted(set(SCENARIOS) | set(EXPLAINS) | set(LOGIN_SCENARIOS) | set(CONCURRENCY_SCENARIOS)), help="Scenario (or hot path query with --explain) to run, can be repeated (default: all)")
+        parser.add_argument("--explain", action="store_true", help="Print the EXPLAIN plans of the hot path queries instead of timing the views")
+        parser.add_argument("--storage", action="store_true", help="Compare the attendance storages (table sizes and the attendance scenarios) instead of timing the views once")
+        parser.add_argument("--logins", action="store_true", help="Measure logins per second (valid, wrong_password, unknown_email) instead of timing the views")
+        parser.add_argument("--iterations", type=int, action="append", help="PBKDF2 cost of the --logins password, can be repeated to compare (default: PASSWORD_HASH_ITERATIONS)")
+        parser.add_argument("--concurrency", action="store_true", help="Compare requests per second of the AJAX endpoints under WSGI (sync views) and ASGI (async views) with concurrent clients")
+        parser.add_argument("--clients", type=int, default=500, help="Concurrent clients of --concurrency")
+        parser.add_argument("--requests-per-client", type=int, default=2)
+        parser.add_argument("--wsgi-threads", type=int, default=8, help="Threads serving the WSGI side of --concurrency")
+        parser.add_argument("--pool", action="store_true", help="Compare request latency with and without the database connection pool (needs DATABASE_POOL_SIZE)")
+        parser.add_argument("--write-concurrency", action="store_true", help="Compare attendance saves per second from concurrent writers on SQLite without and with the tuning mode (DATABASE_SQLITE_TUNING)")
+        parser.add_argument("--writers", type=int, default=8, help="Threads saving attendance in --write-concurrency")
+        parser.add_argument("--saves-per-writer", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--label", default="", help="Label stored with the results, e.g. a commit id")
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1.")
+        registry = EXPLAINS if options["explain"] else LOGIN_SCENARIOS if options["logins"] else CONCURRENCY_SCENARIOS if options["concurrency"] else SCENARIOS
+        unknown = [name for name in options["scenario"] or [] if name not in registry]
+        if unknown:
+            raise CommandError("Unknown %s: %s" % ("hot path query" if options["explain"] else "scenario", ", ".join(unknown)))
+        try:
+            if options["explain"]:
+                report = explain_plans(options["scenario"])
+            elif options["write_concurrency"]:
+                report = compare_sqlite_tuning(options["writers"], options["saves_per_writer"])
+            elif options["pool"]:
+                report = compare_connection_pool(options["scenario"], repeat=options["repeat"], warmup=options["warmup"])
+            elif options["concurrency"]:
+                report = compare_concurrency(options["scenario"], options["clients"], options["requests_per_client"], options["wsgi_threads"])
+            elif options["logins"]:
+                report = benchmark_logins(options["scenario"], options["iterations"], repeat=options["repeat"], warmup=options["warmup"])
+            elif options["storage"]:
+                report = compare_attendance_storage(options["scenario"], repeat=options["repeat"], warmup=options["warmup"])
+            else:
+                report = run_benchmarks(options["scenario"], repeat=options["repeat"], warmup=options["warmup"])
+        except ValueError as error:
+            raise CommandError(str(error))
+        report["label"] = options["label"]
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS("Benchmark report written to %s" % options["output"]))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,35 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from student_management_app.tasks import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run the queued background tasks (exports, summary rebuilds, imports) until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=2, help="Tasks run at the same time; start several workers for more processes")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when no task is runnable")
+        parser.add_argument("--once", action="store_true", help="Exit once no task is runnable instead of waiting for new ones")
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads must be at least 1.")
+        stop = threading.Event()
+        worker = lambda: run_worker(stop, poll_interval=options["poll_interval"], once=options["once"])
+        if options["threads"] == 1:
+            # In this thread, e.g. for tests and cron jobs with --once
+            ran = worker()
+        else:
+            with ThreadPoolExecutor(max_workers=options["threads"], thread_name_prefix="task-worker") as pool:
+                futures = [pool.submit(worker) for i in range(options["threads"])]
+                try:
+                    ran = sum(future.result() for future in futures)
+                except KeyboardInterrupt:
+                    # Running tasks finish, no new one is claimed
+                    self.stdout.write("Stopping after the running tasks.")
+                    stop.set()
+                    ran = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS("Ran %d tasks." % ran))
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:47
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def backfill_attendance_summary(apps, schema_editor):
+    # Counters of the attendance stored before this migration, as rebuild_attendance_summary computes them
+    AttendanceReport = apps.get_model('student_management_app', 'AttendanceReport')
+    AttendanceSummary = apps.get_model('student_management_app', 'AttendanceSummary')
+    rows = AttendanceReport.objects.order_by().values_list(
+        'student_id', 'attendance_id__subject_id', 'attendance_id__session_year_id'
+    ).annotate(
+        present=Count('id', filter=Q(status=True)),
+        absent=Count('id', filter=Q(status=False)),
+        total=Count('id'),
+    )
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(student_id_id=student_id, subject_id_id=subject_id, session_year_id_id=session_year_id, present_count=present, absent_count=absent, total_count=total)
+        for student_id, subject_id, session_year_id, present, absent, total in rows.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_management_app', '0006_alter_customuser_first_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('present_count', models.IntegerField(default=0)),
+                ('absent_count', models.IntegerField(default=0)),
+                ('total_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session_year_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='student_management_app.sessionyearmodel')),
+                ('student_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='student_management_app.students')),
+                ('subject_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='student_management_app.subjects')),
+            ],
+            options={
+                'unique_together': {('student_id', 'subject_id', 'session_year_id')},
+            },
+        ),
+        migrations.RunPython(backfill_attendance_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:57
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def remove_duplicate_attendance_reports(apps, schema_editor):
+    # Keep the newest report of every (attendance, student) pair so the unique constraint can be added,
+    # then recount the AttendanceSummary counters if any report was removed
+    AttendanceReport = apps.get_model('student_management_app', 'AttendanceReport')
+    AttendanceSummary = apps.get_model('student_management_app', 'AttendanceSummary')
+    duplicates = list(AttendanceReport.objects.order_by().values('attendance_id', 'student_id').annotate(count=Count('id'), keep_id=Max('id')).filter(count__gt=1))
+    for duplicate in duplicates:
+        AttendanceReport.objects.filter(attendance_id=duplicate['attendance_id'], student_id=duplicate['student_id']).exclude(id=duplicate['keep_id']).delete()
+    if not duplicates:
+        return
+
+    rows = AttendanceReport.objects.order_by().values_list(
+        'student_id', 'attendance_id__subject_id', 'attendance_id__session_year_id'
+    ).annotate(
+        present=Count('id', filter=Q(status=True)),
+        absent=Count('id', filter=Q(status=False)),
+        total=Count('id'),
+    )
+    AttendanceSummary.objects.all().delete()
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(student_id_id=student_id, subject_id_id=subject_id, session_year_id_id=session_year_id, present_count=present, absent_count=absent, total_count=total)
+        for student_id, subject_id, session_year_id, present, absent, total in rows.iterator(chunk_size=2000)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_management_app', '0008_customuser_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['subject_id', 'session_year_id', 'attendance_date'], name='attendance_subject_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancereport',
+            index=models.Index(fields=['student_id', 'status'], name='attendancereport_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leavereportstaff',
+            index=models.Index(fields=['staff_id', 'leave_status'], name='leavestaff_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leavereportstudent',
+            index=models.Index(fields=['student_id', 'leave_status'], name='leavestudent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='students',
+            index=models.Index(fields=['course_id', 'session_year_id'], name='students_course_session_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_attendance_reports, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendancereport',
+            constraint=models.UniqueConstraint(fields=('attendance_id', 'student_id'), name='attendancereport_unique_student'),
+        ),
+    ]
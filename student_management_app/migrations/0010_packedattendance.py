@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_management_app', '0009_attendance_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedAttendance',
+            fields=[
+                ('attendance_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='student_management_app.attendance')),
+                ('student_ids', models.BinaryField()),
+                ('statuses', models.BinaryField()),
+                ('student_count', models.IntegerField(default=0)),
+                ('present_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:22
+
+from django.db import migrations
+import student_management_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_management_app', '0011_backgroundtask'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', student_management_app.models.CustomUserManager()),
+            ],
+        ),
+    ]
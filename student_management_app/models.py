@@ -1,7 +1,7 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models.signals import post_save#ma'lumotni bazaga saqlash
-from django.dispatch import receiver#ma'lumotni qabul qilish tekshirilgan holatda
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 
 
@@ -13,10 +13,35 @@ class SessionYearModel(models.Model): #sessiyalar vaqtini yillar asosida belgila
 
 
 
+class CustomUserManager(UserManager):
+    # createsuperuser makes HOD users, so their AdminHOD row is created with them
+    # (the other roles are created with their data by profiles.py)
+    def create_superuser(self, username, email=None, password=None, **extra_fields):
+        with transaction.atomic():
+            user = super().create_superuser(username, email, password, **extra_fields)
+            AdminHOD.objects.create(admin=user)
+        return user
+
+
 # Overriding the Default Django Auth User and adding One More Field (user_type)
 class CustomUser(AbstractUser):
     user_type_data = ((1, "HOD"), (2, "Staff"), (3, "Student"))
     user_type = models.CharField(default=1, choices=user_type_data, max_length=10)
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        # Used by the sorting of the manage student/staff listings
+        indexes = [
+            models.Index(fields=["first_name"], name="customuser_first_name_idx"),
+            models.Index(fields=["last_name"], name="customuser_last_name_idx"),
+            models.Index(fields=["email"], name="customuser_email_idx"),
+            # Login lookups (EmailBackEnd) compare emails without case, the listings search
+            # (datatables.prefix_search) matches these lowercased names and email
+            models.Index(Lower("email"), name="customuser_email_lower_idx"),
+            models.Index(Lower("first_name"), name="customuser_first_lower_idx"),
+            models.Index(Lower("last_name"), name="customuser_last_lower_idx"),
+            models.Index(Lower("username"), name="customuser_user_lower_idx"),
+        ]
 
 
 
@@ -73,6 +98,11 @@ class Students(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course_id", "session_year_id"], name="students_course_session_idx"),
+        ]
+
 
 class Attendance(models.Model):
     # Subject Attendance
@@ -84,6 +114,11 @@ class Attendance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["subject_id", "session_year_id", "attendance_date"], name="attendance_subject_session_idx"),
+        ]
+
 
 class AttendanceReport(models.Model):
     # Individual Student Attendance
@@ -95,6 +130,44 @@ class AttendanceReport(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["student_id", "status"], name="attendancereport_student_idx"),
+        ]
+        constraints = [
+            # One report per Student per Attendance, also serves lookups by attendance_id
+            models.UniqueConstraint(fields=["attendance_id", "student_id"], name="attendancereport_unique_student"),
+        ]
+
+
+class PackedAttendance(models.Model):
+    # All Attendance Reports of one Attendance in a single row (ATTENDANCE_STORAGE = "packed"), see attendance_storage
+    attendance_id = models.OneToOneField(Attendance, on_delete=models.CASCADE, primary_key=True)
+    student_ids = models.BinaryField()  # Student ids as little endian uint32, in roll call order
+    statuses = models.BinaryField()  # Bit i is the status of student_ids[i]
+    student_count = models.IntegerField(default=0)
+    present_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = models.Manager()
+
+
+class AttendanceSummary(models.Model):
+    # Present/Absent counters of a Student per Subject and Session Year, kept in step with AttendanceReport
+    id = models.AutoField(primary_key=True)
+    student_id = models.ForeignKey(Students, on_delete=models.CASCADE)
+    subject_id = models.ForeignKey(Subjects, on_delete=models.CASCADE)
+    session_year_id = models.ForeignKey(SessionYearModel, on_delete=models.CASCADE)
+    present_count = models.IntegerField(default=0)
+    absent_count = models.IntegerField(default=0)
+    total_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = models.Manager()
+
+    class Meta:
+        unique_together = (("student_id", "subject_id", "session_year_id"),)
+
 
 class LeaveReportStudent(models.Model):
     id = models.AutoField(primary_key=True)
@@ -106,6 +179,11 @@ class LeaveReportStudent(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["student_id", "leave_status"], name="leavestudent_status_idx"),
+        ]
+
 
 class LeaveReportStaff(models.Model):
     id = models.AutoField(primary_key=True)
@@ -117,6 +195,11 @@ class LeaveReportStaff(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["staff_id", "leave_status"], name="leavestaff_status_idx"),
+        ]
+
 
 class FeedBackStudent(models.Model):
     id = models.AutoField(primary_key=True)
@@ -168,32 +251,30 @@ class StudentResult(models.Model):
     objects = models.Manager()
 
 
-#Creating Django Signals
-
-# It's like trigger in database. It will run only when Data is Added in CustomUser model
-
-@receiver(post_save, sender=CustomUser)
-# Now Creating a Function which will automatically insert data in HOD, Staff or Student
-def create_user_profile(sender, instance, created, **kwargs):
-    # if Created is true (Means Data Inserted)
-    if created:
-        # Check the user_type and insert the data in respective tables
-        if instance.user_type == 1:
-            AdminHOD.objects.create(admin=instance)
-        if instance.user_type == 2:
-            Staffs.objects.create(admin=instance)
-        if instance.user_type == 3:
-            Students.objects.create(admin=instance, course_id=Courses.objects.get(id=1), session_year_id=SessionYearModel.objects.get(id=1), address="", profile_pic="", gender="")
-    
-
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    if instance.user_type == 1:
-        instance.adminhod.save()
-    if instance.user_type == 2:
-        instance.staffs.save()
-    if instance.user_type == 3:
-        instance.students.save()
-    
-
+class BackgroundTask(models.Model):
+    # Work queued by the HOD pages and run by the run_task_worker command (see tasks.py)
+    # status: 0 Pending, 1 Running, 2 Done, 3 Failed
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    params = models.TextField(default="{}")  # JSON keyword arguments of the task
+    status = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(null=True, blank=True)
+    message = models.TextField(default="", blank=True)
+    result = models.TextField(default="", blank=True)  # JSON returned by the task
+    error = models.TextField(default="", blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=255, default="", blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            # Claiming the next runnable task
+            models.Index(fields=["status", "run_after"], name="task_status_run_after_idx"),
+        ]
@@ -0,0 +1,62 @@
+from django.db import transaction
+
+from student_management_app.login_guard import forget_unknown_emails
+from student_management_app.models import CustomUser, AdminHOD, Staffs, Students
+
+
+# Every CustomUser has one role row (AdminHOD, Staffs or Students), created here together with
+# the user and its real data. There are no CustomUser signals, so saving a user (e.g. the
+# last_login update of every login) writes the user row only, and profile updates save only
+# the fields that changed.
+
+NAME_FIELDS = {"username", "first_name", "last_name"}
+
+
+def create_profile_user(user_type, role_model, role_fields, password=None, **user_fields):
+    with transaction.atomic():
+        user = CustomUser.objects.create_user(password=password, user_type=str(user_type), **user_fields)
+        role_model.objects.create(admin=user, **role_fields)
+        # The email may have been tried at the login before the user existed
+        transaction.on_commit(lambda: forget_unknown_emails([user.email]))
+    return user
+
+
+def create_hod(password=None, **user_fields):
+    return create_profile_user(1, AdminHOD, {}, password, **user_fields)
+
+
+def create_staff(address="", password=None, **user_fields):
+    return create_profile_user(2, Staffs, {"address": address}, password, **user_fields)
+
+
+def create_student(course_id, session_year_id, address="", gender="", profile_pic="", password=None, **user_fields):
+    # course_id and session_year_id are ids
+    return create_profile_user(3, Students, {
+        "course_id_id": course_id, "session_year_id_id": session_year_id, "address": address, "gender": gender, "profile_pic": profile_pic,
+    }, password, **user_fields)
+
+
+def set_changed(instance, values):
+    # Sets the given field values, returns the names of those that changed
+    changed = [name for name, value in values.items() if getattr(instance, name) != value]
+    for name in changed:
+        setattr(instance, name, values[name])
+    return changed
+
+
+def update_profile(user, user_values, role=None, role_values=None, password=None):
+    # Writes the user and its role row only if one of their fields changed. A name change also
+    # touches the role row: the JSON API versions follow names through Students.updated_at.
+    user_changed = set_changed(user, user_values)
+    if password:
+        user.set_password(password)
+        user_changed.append("password")
+    if user_changed:
+        user.save(update_fields=user_changed)
+    if "email" in user_changed:
+        transaction.on_commit(lambda: forget_unknown_emails([user.email]))
+
+    role_changed = set_changed(role, role_values or {}) if role is not None else []
+    if role is not None and (role_changed or NAME_FIELDS.intersection(user_changed)):
+        role.save(update_fields=role_changed + ["updated_at"])
+    return user_changed + role_changed
@@ -0,0 +1,125 @@
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from student_management_app.dashboard_cache import course_staff_user_ids, invalidate_on_commit
+from student_management_app.forms import AddStudentForm
+from student_management_app.hashers import init_hasher_process
+from student_management_app.login_guard import forget_unknown_emails
+from student_management_app.models import CustomUser, Students
+
+
+# Bulk enrollment from a CSV file with one student per line and the fields of AddStudentForm as
+# header: username, email, password, first_name, last_name, address, gender, course_id,
+# session_year_id. Every line is validated before anything is written; if one is invalid no
+# student is created and the errors are reported per line. Passwords are hashed in a spawned process
+# pool, then users and students are inserted with bulk_create in batches (no per-row signals).
+
+IMPORT_FIELDS = ("username", "email", "password", "first_name", "last_name", "address", "gender", "course_id", "session_year_id")
+BATCH_SIZE = 1000
+
+
+def read_csv(data):
+    # data: bytes or text of the whole file
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(data))
+    missing = [field for field in IMPORT_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError("Missing columns: %s." % ", ".join(missing))
+    return list(reader)
+
+
+def existing_values(field, values):
+    # Values already taken by a user, compared without case, read in chunks below the SQLite parameter limit
+    values = sorted({value.lower() for value in values})
+    taken = set()
+    for i in range(0, len(values), 900):
+        taken.update(CustomUser.objects.annotate(value=Lower(field)).filter(value__in=values[i:i+900]).values_list("value", flat=True))
+    return taken
+
+
+def validate_rows(rows):
+    # Returns (cleaned rows, errors), errors being [{"line": .., "errors": {field: [messages]}}]
+    # with the line numbers of the file (the header is line 1)
+    cleaned = []
+    errors = []
+    seen = {"username": {}, "email": {}}
+    for line, row in enumerate(rows, 2):
+        form = AddStudentForm(row)
+        row_errors = {} if form.is_valid() else {field: list(messages) for field, messages in form.errors.items()}
+        for field, lines in seen.items():
+            value = (row.get(field) or "").lower()
+            if value in lines:
+                row_errors.setdefault(field, []).append("Same %s as line %d." % (field, lines[value]))
+            else:
+                lines[value] = line
+        if row_errors:
+            errors.append({"line": line, "errors": row_errors})
+        else:
+            cleaned.append((line, form.cleaned_data))
+
+    for field in seen:
+        taken = existing_values(field, [data[field] for line, data in cleaned])
+        for line, data in cleaned:
+            if data[field].lower() in taken:
+                errors.append({"line": line, "errors": {field: ["A user with this %s already exists." % field]}})
+    errors.sort(key=lambda error: error["line"])
+    failed = {error["line"] for error in errors}
+    return [data for line, data in cleaned if line not in failed], errors
+
+
+def hash_passwords(passwords, processes=None):
+    # Every password gets its own salt. Small lists are hashed here, a pool costs more than it saves.
+    processes = processes or getattr(settings, "IMPORT_HASH_PROCESSES", None) or os.cpu_count() or 1
+    if processes == 1 or len(passwords) < 2 * processes:
+        return [make_password(password) for password in passwords]
+    # Spawned, not forked: this runs on task worker threads, and a fork of a threaded process with
+    # open database connections can deadlock or share the connections with the children
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"), initializer=init_hasher_process) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (processes * 4))))
+
+
+def create_students(rows, batch_size=BATCH_SIZE, processes=None, progress=None):
+    # rows: cleaned rows of validate_rows. Returns the number of students created.
+    # progress(done, total, message) is called after hashing and after every batch.
+    passwords = hash_passwords([row["password"] for row in rows], processes)
+    if progress:
+        progress(0, len(rows), "Passwords hashed")
+
+    with transaction.atomic():
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i+batch_size]
+            CustomUser.objects.bulk_create([
+                CustomUser(username=row["username"], email=row["email"], password=password, first_name=row["first_name"], last_name=row["last_name"], user_type="3")
+                for row, password in zip(batch, passwords[i:i+batch_size])
+            ])
+            # bulk_create does not return ids on every database, so read them back
+            user_ids = dict(CustomUser.objects.filter(username__in=[row["username"] for row in batch]).values_list("username", "id"))
+            Students.objects.bulk_create([
+                Students(admin_id=user_ids[row["username"]], address=row["address"], gender=row["gender"], profile_pic="", course_id_id=row["course_id"], session_year_id_id=row["session_year_id"])
+                for row in batch
+            ])
+            if progress:
+                progress(i + len(batch), len(rows), "%d students created" % (i + len(batch)))
+
+        # bulk_create sends no signals, so the dashboards are invalidated here
+        course_ids = {row["course_id"] for row in rows}
+        invalidate_on_commit(admin=True, staff_user_ids=course_staff_user_ids(list(course_ids)))
+        transaction.on_commit(lambda: forget_unknown_emails([row["email"] for row in rows]))
+    return len(rows)
+
+
+def import_students(data, batch_size=BATCH_SIZE, processes=None, progress=None):
+    # Returns {"created": .., "errors": [...]}, nothing is created when there are errors
+    rows, errors = validate_rows(read_csv(data))
+    if errors:
+        return {"created": 0, "errors": errors}
+    return {"created": create_students(rows, batch_size, processes, progress), "errors": []}
@@ -0,0 +1,270 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from student_management_app.attendance import rebuild_attendance_summary
+from student_management_app.attendance_storage import STORAGES, convert_attendance_storage
+from student_management_app.exports import EXPORTS, EXPORT_FILTERS, EXPORT_FORMATS, export_chunks
+from student_management_app.models import BackgroundTask
+from student_management_app.student_import import import_students
+
+
+# Background tasks for work too long for a request (exports, counter rebuilds, imports), queued
+# in the BackgroundTask table and run by "manage.py run_task_worker", no broker needed.
+# Every task is registered with @task(name, label, params): a function (progress, **params)
+# returning something JSON serializable. "params" are the POST fields the HOD page submits.
+#
+# A worker claims a task with a conditional UPDATE, so several workers (threads or processes)
+# never run the same task. Exceptions are retried with an exponential delay up to max_attempts,
+# except ValueError and TypeError (bad parameters), which fail the task at once. A task whose
+# worker stopped reporting for TASK_STALE_SECONDS is claimed again.
+#
+# On SQLite a long read of one worker thread (e.g. an export) blocks the writes of the others,
+# so progress writes are skipped when the database is locked and status writes are retried.
+
+PENDING = 0
+RUNNING = 1
+DONE = 2
+FAILED = 3
+TASK_STATUS = {PENDING: "Pending", RUNNING: "Running", DONE: "Done", FAILED: "Failed"}
+
+TASKS = {}
+
+
+class TaskError(ValueError):
+    pass
+
+
+class Task:
+    def __init__(self, name, label, params, max_attempts, check, func):
+        self.name = name
+        self.label = label
+        self.params = params
+        self.max_attempts = max_attempts
+        self.check = check
+        self.func = func
+
+
+def task(name, label, params=(), max_attempts=3, check=None):
+    # check(**params) is run when the task is submitted and raises ValueError for bad parameters
+    def register(func):
+        TASKS[name] = Task(name, label, params, max_attempts, check, func)
+        return func
+    return register
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=getattr(settings, "TASK_RETRY_DELAY", 10) * 2 ** (attempts - 1))
+
+
+def write_task(task_id, tries=30, **fields):
+    for i in range(tries):
+        try:
+            return BackgroundTask.objects.filter(id=task_id).update(**fields)
+        except OperationalError:
+            if i == tries - 1:
+                raise
+            time.sleep(1)
+
+
+def submit(name, params=None, user=None):
+    params = params or {}
+    if name not in TASKS:
+        raise TaskError("Unknown task %s, choose from %s." % (name, ", ".join(TASKS)))
+    definition = TASKS[name]
+    if definition.check:
+        definition.check(**params)
+    return BackgroundTask.objects.create(
+        name=name, params=json.dumps(params, cls=DjangoJSONEncoder), max_attempts=definition.max_attempts, created_by=user,
+    )
+
+
+class Progress:
+    # Handed to every task: progress(done, total=None, message=None) records how far it got.
+    # Writes are limited to one per "every" seconds, and double as the heartbeat of the worker.
+
+    def __init__(self, task_id, every=1.0):
+        self.task_id = task_id
+        self.every = every
+        self.written_at = None
+
+    def __call__(self, done, total=None, message=None):
+        now = timezone.now()
+        if self.written_at is not None and (now - self.written_at).total_seconds() < self.every:
+            return
+        self.written_at = now
+        fields = {"progress": done, "heartbeat_at": now, "updated_at": now}
+        if total is not None:
+            fields["total"] = total
+        if message is not None:
+            fields["message"] = message
+        try:
+            BackgroundTask.objects.filter(id=self.task_id).update(**fields)
+        except OperationalError:
+            # Locked by another worker, the next call writes it
+            self.written_at = None
+
+
+def claim_task(worker):
+    # The oldest runnable task, or None. Several candidates are tried in case another worker wins one.
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, "TASK_STALE_SECONDS", 600))
+    candidates = BackgroundTask.objects.filter(
+        Q(status=PENDING, run_after__lte=now) | Q(status=RUNNING, heartbeat_at__lt=stale)
+    ).order_by("run_after", "id").values_list("id", "status", "heartbeat_at")[:10]
+    for task_id, status, heartbeat_at in candidates:
+        claimed = BackgroundTask.objects.filter(id=task_id, status=status, heartbeat_at=heartbeat_at).update(
+            status=RUNNING, worker=worker, heartbeat_at=now, attempts=F("attempts") + 1, updated_at=now,
+        )
+        if claimed:
+            return BackgroundTask.objects.get(id=task_id)
+    return None
+
+
+def run_task(background_task):
+    definition = TASKS.get(background_task.name)
+    try:
+        if definition is None:
+            raise TaskError("Unknown task %s." % background_task.name)
+        if background_task.attempts > background_task.max_attempts:
+            raise TaskError("The worker running the task stopped.")
+        result = definition.func(Progress(background_task.id), **json.loads(background_task.params))
+    except Exception as e:
+        now = timezone.now()
+        fields = {"error": traceback.format_exc(), "updated_at": now}
+        if isinstance(e, (TypeError, ValueError)) or background_task.attempts >= background_task.max_attempts:
+            fields.update(status=FAILED, message=str(e))
+        else:
+            fields.update(status=PENDING, run_after=now + retry_delay(background_task.attempts), message="Retrying: %s" % e)
+        write_task(background_task.id, **fields)
+        return False
+
+    write_task(background_task.id, status=DONE, result=json.dumps(result, cls=DjangoJSONEncoder), error="", message="", updated_at=timezone.now())
+    return True
+
+
+def worker_name():
+    return "%s:%d:%s" % (socket.gethostname(), os.getpid(), threading.current_thread().name)
+
+
+def run_worker(stop=None, poll_interval=1.0, once=False):
+    # Runs tasks until stop (a threading.Event) is set, or until none is runnable with once=True.
+    # Returns the number of tasks run.
+    stop = stop or threading.Event()
+    worker = worker_name()
+    ran = 0
+    try:
+        while not stop.is_set():
+            background_task = claim_task(worker)
+            if background_task is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run_task(background_task)
+            ran += 1
+    finally:
+        # Every thread has its own connection
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+    return ran
+
+
+def task_row(background_task):
+    return {
+        "id": background_task.id,
+        "name": background_task.name,
+        "label": TASKS[background_task.name].label if background_task.name in TASKS else background_task.name,
+        "status": background_task.status,
+        "status_label": TASK_STATUS[background_task.status],
+        "progress": background_task.progress,
+        "total": background_task.total,
+        "message": background_task.message,
+        "result": json.loads(background_task.result) if background_task.result else None,
+        "attempts": background_task.attempts,
+        "created_at": background_task.created_at,
+    }
+
+
+# Tasks
+
+def check_export(name=None, file_format="csv", **filters):
+    if name not in EXPORTS:
+        raise TaskError("Unknown export %s, choose from %s." % (name, ", ".join(EXPORTS)))
+    if file_format not in EXPORT_FORMATS:
+        raise TaskError("Unknown format %s, choose from %s." % (file_format, ", ".join(EXPORT_FORMATS)))
+    EXPORTS[name].condition(**filters)
+
+
+def private_storage(directory):
+    # Files of the tasks under PRIVATE_FILES_ROOT, never served as media
+    return FileSystemStorage(location=os.path.join(settings.PRIVATE_FILES_ROOT, directory))
+
+
+def export_storage():
+    return private_storage("exports")
+
+
+@task("export", "Export", params=("name", "file_format") + EXPORT_FILTERS, check=check_export)
+def export_task(progress, name=None, file_format="csv", **filters):
+    # The result holds the URL of the download_export view, which only serves the file to the HOD who queued it
+    file_name = "%s-%d.%s" % (name, progress.task_id, file_format)
+    storage = export_storage()
+    os.makedirs(storage.location, exist_ok=True)
+    size = 0
+    with open(storage.path(file_name), "wb") as f:
+        for chunk in export_chunks(name, file_format, progress=lambda rows: progress(rows, message="%d rows written" % rows), **filters):
+            f.write(chunk)
+            size += len(chunk)
+    return {"file": file_name, "url": reverse("download_export", args=[progress.task_id]), "bytes": size}
+
+
+@task("rebuild_attendance_summary", "Rebuild attendance summary")
+def rebuild_attendance_summary_task(progress):
+    created = rebuild_attendance_summary(progress=lambda rows: progress(rows, message="%d summary rows written" % rows))
+    return {"rows": created}
+
+
+def check_conversion(to=None):
+    if to not in STORAGES:
+        raise TaskError("Unknown attendance storage %s, choose from %s." % (to, ", ".join(STORAGES)))
+
+
+@task("convert_attendance_storage", "Convert attendance storage", params=("to",), check=check_conversion)
+def convert_attendance_storage_task(progress, to=None):
+    converted = convert_attendance_storage(to, progress=lambda done, total: progress(done, total, "%d of %d attendance converted" % (done, total)))
+    return {"converted": converted}
+
+
+def import_storage():
+    # Uploaded CSV files waiting for the import_students task, they hold plaintext passwords
+    return private_storage("imports")
+
+
+def check_import(file=None):
+    if not file or not import_storage().exists(file):
+        raise TaskError("Upload the CSV file of the students to import.")
+
+
+@task("import_students", "Import students", max_attempts=1, check=check_import)
+def import_students_task(progress, file=None):
+    # The file is removed whatever happens, so a failed import is not retried; the result lists the first 100 errors
+    storage = import_storage()
+    try:
+        with storage.open(file, "rb") as f:
+            result = import_students(f.read(), progress=progress)
+    finally:
+        storage.delete(file)
+    return {"created": result["created"], "error_count": len(result["errors"]), "errors": result["errors"][:100]}
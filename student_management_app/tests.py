@@ -1,3 +1,1342 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.apps import apps
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.utils import load_backend
+from django.core.cache import cache, caches
+from django.core.exceptions import PermissionDenied
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+from django.views.static import serve
+
+from student_management_app.EmailBackEnd import EmailBackEnd
+from student_management_app.QueryCountMiddleWare import QueryCountMiddleWare
+from student_management_app.LoginCheckMiddleWare import LoginCheckMiddleWare, allow_roles
+from student_management_app.models import CustomUser, Staffs, Courses, Subjects, Students, SessionYearModel, Attendance, AttendanceReport, AttendanceSummary, PackedAttendance, BackgroundTask, LeaveReportStudent, LeaveReportStaff
+from student_management_app.attendance import delete_attendance, delete_attendance_reports, rebuild_attendance_summary
+from student_management_app.attendance_matrix import AttendanceMatrix
+from student_management_app.attendance_storage import attendance_storage, pack_statuses, unpack_statuses, pack_student_ids, unpack_student_ids
+from student_management_app.benchmarks import SCENARIOS, EXPLAINS, app_urlconf, run_benchmarks, explain_plans
+from student_management_app.dashboard import admin_dashboard_context, staff_dashboard_context, student_dashboard_context
+from student_management_app.dashboard_cache import dashboard_cache_stats
+from student_management_app.db_backends.pool import POOLS
+from student_management_app.db_config import database_settings, replica_database_settings
+from student_management_app.datatables import prefix_search
+from student_management_app.db_router import WRITE_MARKER, ReplicaRouter, read_replica, replica_reads, use_replica
+from student_management_app.forms import AddStudentForm, EditStudentForm
+from student_management_app.HodViews import STUDENT_SEARCH_FIELDS
+from student_management_app.profiles import create_hod, create_staff, create_student, update_profile
+from student_management_app.student_import import import_students
+from student_management_app.tasks import TASKS, DONE, FAILED, PENDING, RUNNING, claim_task, submit, task
+
+
+# Helpers for building a small university inside a test
+
+def make_session_year():
+    return SessionYearModel.objects.create(session_start_year=datetime.date(2020, 9, 1), session_end_year=datetime.date(2021, 6, 30))
+
+
+def make_user(username, user_type):
+    create = {1: create_hod, 2: create_staff}[user_type]
+    return create(username=username, email=username+"@example.com", first_name=username, last_name="Test")
+
+
+def make_student(username, course, session_year):
+    user = create_student(course.id, session_year.id, username=username, email=username+"@example.com", first_name=username, last_name="Test")
+    return Students.objects.get(admin=user)
+
+
+def build_university(session_year, courses=2, students_per_course=3, lectures=2, prefix="u"):
+    # Every Course gets one Staff, one Subject and a few Students with Attendance, Leaves
+    for c in range(courses):
+        course = Courses.objects.create(course_name="%s-course-%d" % (prefix, c))
+        staff_user = make_user("%s-staff-%d" % (prefix, c), 2)
+        subject = Subjects.objects.create(subject_name="%s-subject-%d" % (prefix, c), course_id=course, staff_id=staff_user)
+        LeaveReportStaff.objects.create(staff_id=staff_user.staffs, leave_date="2020-10-01", leave_message="", leave_status=1)
+        LeaveReportStaff.objects.create(staff_id=staff_user.staffs, leave_date="2020-10-02", leave_message="", leave_status=2)
+
+        students = [make_student("%s-student-%d-%d" % (prefix, c, s), course, session_year) for s in range(students_per_course)]
+        for s, student in enumerate(students):
+            LeaveReportStudent.objects.create(student_id=student, leave_date="2020-10-01", leave_message="", leave_status=s % 3)
+
+        for day in range(lectures):
+            attendance = Attendance.objects.create(subject_id=subject, attendance_date=datetime.date(2020, 10, 1+day), session_year_id=session_year)
+            for s, student in enumerate(students):
+                AttendanceReport.objects.create(student_id=student, attendance_id=attendance, status=(s+day) % 2 == 0)
+    rebuild_attendance_summary()
+
+
+def naive_admin_dashboard_context():
+    # Per row counting, as admin_home used to do it
+    context = {
+        "all_student_count": Students.objects.count(),
+        "subject_count": Subjects.objects.count(),
+        "course_count": Courses.objects.count(),
+        "staff_count": Staffs.objects.count(),
+        "course_name_list": [], "subject_count_list": [], "student_count_list_in_course": [],
+        "subject_list": [], "student_count_list_in_subject": [],
+        "staff_attendance_present_list": [], "staff_attendance_leave_list": [], "staff_name_list": [],
+        "student_attendance_present_list": [], "student_attendance_leave_list": [], "student_name_list": [],
+    }
+    for course in Courses.objects.all():
+        context["course_name_list"].append(course.course_name)
+        context["subject_count_list"].append(Subjects.objects.filter(course_id=course.id).count())
+        context["student_count_list_in_course"].append(Students.objects.filter(course_id=course.id).count())
+    for subject in Subjects.objects.all():
+        context["subject_list"].append(subject.subject_name)
+        context["student_count_list_in_subject"].append(Students.objects.filter(course_id=subject.course_id.id).count())
+    for staff in Staffs.objects.all():
+        subject_ids = Subjects.objects.filter(staff_id=staff.admin.id)
+        context["staff_attendance_present_list"].append(Attendance.objects.filter(subject_id__in=subject_ids).count())
+        context["staff_attendance_leave_list"].append(LeaveReportStaff.objects.filter(staff_id=staff.id, leave_status=1).count())
+        context["staff_name_list"].append(staff.admin.first_name)
+    for student in Students.objects.all():
+        absent = AttendanceReport.objects.filter(student_id=student.id, status=False).count()
+        leaves = LeaveReportStudent.objects.filter(student_id=student.id, leave_status=1).count()
+        context["student_attendance_present_list"].append(AttendanceReport.objects.filter(student_id=student.id, status=True).count())
+        context["student_attendance_leave_list"].append(leaves+absent)
+        context["student_name_list"].append(student.admin.first_name)
+    return context
+
+
+def naive_staff_dashboard_context(staff_user):
+    # Per row counting, as staff_home used to do it
+    subjects = Subjects.objects.filter(staff_id=staff_user.id)
+    course_ids = []
+    for subject in subjects:
+        if subject.course_id.id not in course_ids:
+            course_ids.append(subject.course_id.id)
+    students = Students.objects.filter(course_id__in=course_ids)
+    return {
+        "students_count": students.count(),
+        "attendance_count": Attendance.objects.filter(subject_id__in=subjects).count(),
+        "leave_count": LeaveReportStaff.objects.filter(staff_id=staff_user.staffs.id, leave_status=1).count(),
+        "subject_count": subjects.count(),
+        "subject_list": [subject.subject_name for subject in subjects],
+        "attendance_list": [Attendance.objects.filter(subject_id=subject.id).count() for subject in subjects],
+        "student_list": [student.admin.first_name+" "+student.admin.last_name for student in students],
+        "attendance_present_list": [AttendanceReport.objects.filter(student_id=student.id, status=True).count() for student in students],
+        "attendance_absent_list": [AttendanceReport.objects.filter(student_id=student.id, status=False).count() for student in students],
+    }
+
+
+def naive_student_dashboard_context(student):
+    # Per Subject counting, as student_home used to do it
+    subjects = Subjects.objects.filter(course_id=student.course_id)
+    reports = AttendanceReport.objects.filter(student_id=student)
+    return {
+        "total_attendance": reports.count(),
+        "attendance_present": reports.filter(status=True).count(),
+        "attendance_absent": reports.filter(status=False).count(),
+        "total_subjects": subjects.count(),
+        "subject_name": [subject.subject_name for subject in subjects],
+        "data_present": [reports.filter(attendance_id__subject_id=subject, status=True).count() for subject in subjects],
+        "data_absent": [reports.filter(attendance_id__subject_id=subject, status=False).count() for subject in subjects],
+    }
+
+
+class UniversityTestCase(TestCase):
+
+    def setUp(self):
+        # Course 1 is the model default of Students.course_id
+        Courses.objects.create(id=1, course_name="Default")
+        self.session_year = make_session_year()
+        # Cached choices and dashboards outlive the rolled back test data
+        cache.clear()
+
+    def count_queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            func(*args, **kwargs)
+        return len(queries)
+
+
+class AdminDashboardTest(UniversityTestCase):
+
+    def test_matches_per_row_counting(self):
+        build_university(self.session_year)
+        make_user("idle-staff", 2)
+        self.assertEqual(admin_dashboard_context(), naive_admin_dashboard_context())
+
+    def test_query_count_is_constant(self):
+        build_university(self.session_year, courses=1, students_per_course=1, prefix="small")
+        small = self.count_queries(admin_dashboard_context)
+        build_university(self.session_year, courses=4, students_per_course=5, prefix="large")
+        self.assertEqual(self.count_queries(admin_dashboard_context), small)
+
+    def test_admin_home_renders(self):
+        build_university(self.session_year)
+        self.client.force_login(make_user("hod", 1))
+        response = self.client.get("/admin_home/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["student_name_list"], naive_admin_dashboard_context()["student_name_list"])
+
+
+class StaffDashboardTest(UniversityTestCase):
+
+    def build_staff(self, prefix, courses, students_per_course, lectures):
+        # One Staff teaching two Subjects in each of the Courses
+        build_university(self.session_year, courses=courses, students_per_course=students_per_course, lectures=lectures, prefix=prefix)
+        staff_user = make_user(prefix+"-teacher", 2)
+        for course in Courses.objects.filter(course_name__startswith=prefix+"-"):
+            for i in range(2):
+                Subjects.objects.create(subject_name="%s-extra-%d" % (course.course_name, i), course_id=course, staff_id=staff_user)
+        Subjects.objects.filter(course_id__course_name__startswith=prefix+"-").exclude(staff_id=staff_user).update(staff_id=staff_user)
+        LeaveReportStaff.objects.create(staff_id=staff_user.staffs, leave_date="2020-10-01", leave_message="", leave_status=1)
+        return staff_user
+
+    def test_matches_per_row_counting(self):
+        staff_user = self.build_staff("s", courses=2, students_per_course=3, lectures=2)
+        make_user("idle-staff", 2)
+        self.assertEqual(staff_dashboard_context(staff_user.id), naive_staff_dashboard_context(staff_user))
+
+    def test_query_count_is_pinned(self):
+        small = self.build_staff("small", courses=1, students_per_course=1, lectures=1)
+        large = self.build_staff("large", courses=3, students_per_course=6, lectures=3)
+        self.assertEqual(self.count_queries(staff_dashboard_context, small.id), 3)
+        self.assertEqual(self.count_queries(staff_dashboard_context, large.id), 3)
+
+    def test_staff_without_subjects(self):
+        staff_user = make_user("idle-staff", 2)
+        self.assertEqual(staff_dashboard_context(staff_user.id), naive_staff_dashboard_context(staff_user))
+
+
+class StudentDashboardTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_university(self.session_year, courses=2, students_per_course=3, lectures=3)
+        # A second Subject, and a second Session Year of attendance, in the first Course
+        self.student = Students.objects.filter(course_id__course_name="u-course-0").order_by("id").first()
+        subject = Subjects.objects.create(subject_name="u-subject-extra", course_id=self.student.course_id, staff_id=make_user("extra-staff", 2))
+        attendance = Attendance.objects.create(subject_id=subject, attendance_date="2021-10-01", session_year_id=make_session_year())
+        AttendanceReport.objects.create(student_id=self.student, attendance_id=attendance, status=True)
+        Subjects.objects.create(subject_name="u-subject-empty", course_id=self.student.course_id, staff_id=subject.staff_id)
+        rebuild_attendance_summary()
+
+    def test_matches_per_subject_counting(self):
+        for student in Students.objects.all():
+            self.assertEqual(student_dashboard_context(student.admin_id), naive_student_dashboard_context(student))
+
+    def test_totals_keep_attendance_of_an_earlier_course(self):
+        self.student.course_id = Courses.objects.get(course_name="u-course-1")
+        self.student.save()
+        context = student_dashboard_context(self.student.admin_id)
+        self.assertEqual(context, naive_student_dashboard_context(self.student))
+        self.assertEqual(context["total_attendance"], AttendanceReport.objects.filter(student_id=self.student).count())
+        self.assertEqual(sum(context["data_present"]) + sum(context["data_absent"]), 0)
+
+    def test_query_count(self):
+        # The Subjects with their counters, then the totals
+        self.assertEqual(self.count_queries(student_dashboard_context, self.student.admin_id), 2)
+
+
+def summary_rows():
+    return sorted(AttendanceSummary.objects.values_list("student_id", "subject_id", "session_year_id", "present_count", "absent_count", "total_count"))
+
+
+class StaffAttendanceTestCase(UniversityTestCase):
+    students_per_course = 3
+
+    def setUp(self):
+        super().setUp()
+        build_university(self.session_year, courses=1, students_per_course=self.students_per_course, lectures=0)
+        self.subject = Subjects.objects.get()
+        self.students = list(Students.objects.filter(course_id=self.subject.course_id).order_by("id"))
+        self.client.force_login(self.subject.staff_id)
+
+    def save_attendance(self, statuses, date="2020-11-02"):
+        student_data = [{"id": student.admin_id, "status": status} for student, status in zip(self.students, statuses)]
+        return self.client.post("/save_attendance_data/", {"student_ids": json.dumps(student_data), "subject_id": self.subject.id, "attendance_date": date, "session_year_id": self.session_year.id})
+
+    def update_attendance(self, attendance, statuses):
+        student_data = [{"id": student.admin_id, "status": status} for student, status in zip(self.students, statuses)]
+        return self.client.post("/update_attendance_data/", {"student_ids": json.dumps(student_data), "attendance_date": attendance.id})
+
+
+class AttendanceSummaryTest(StaffAttendanceTestCase):
+
+    def test_counters_follow_save_and_update(self):
+        self.save_attendance([1, 0, 1])
+        self.save_attendance([1, 1, 0], date="2020-11-03")
+        self.assertEqual([row[3:] for row in summary_rows()], [(2, 0, 2), (1, 1, 2), (1, 1, 2)])
+
+        self.update_attendance(Attendance.objects.get(attendance_date="2020-11-03"), [0, 1, 1])
+        self.assertEqual([row[3:] for row in summary_rows()], [(1, 1, 2), (1, 1, 2), (2, 0, 2)])
+
+        incremental = summary_rows()
+        call_command("rebuild_attendance_summary", stdout=io.StringIO())
+        self.assertEqual(summary_rows(), incremental)
+
+    def test_deletes_are_taken_off(self):
+        self.save_attendance([1, 0, 1])
+        self.save_attendance([1, 1, 0], date="2020-11-03")
+        delete_attendance(Attendance.objects.filter(attendance_date="2020-11-03"))
+        self.assertEqual([row[3:] for row in summary_rows()], [(1, 0, 1), (0, 1, 1), (1, 0, 1)])
+
+        delete_attendance_reports(AttendanceReport.objects.filter(student_id=self.students[0]))
+        self.assertEqual([row[3:] for row in summary_rows()], [(0, 0, 0), (0, 1, 1), (1, 0, 1)])
+
+    def test_migration_backfills_counters(self):
+        self.save_attendance([1, 0, 1])
+        counters = summary_rows()
+        AttendanceSummary.objects.all().delete()
+        importlib.import_module("student_management_app.migrations.0007_attendancesummary").backfill_attendance_summary(apps, None)
+        self.assertEqual(summary_rows(), counters)
+
+    def test_dashboards_read_counters(self):
+        self.save_attendance([1, 0, 1])
+        self.assertEqual(naive_admin_dashboard_context(), admin_dashboard_context())
+
+        response = self.client.get("/staff_home/")
+        self.assertEqual(response.context["attendance_present_list"], [1, 0, 1])
+        self.assertEqual(response.context["attendance_absent_list"], [0, 1, 0])
+
+        self.client.force_login(self.students[1].admin)
+        response = self.client.get("/student_home/")
+        self.assertEqual((response.context["total_attendance"], response.context["attendance_present"], response.context["attendance_absent"]), (1, 0, 1))
+        self.assertEqual((response.context["data_present"], response.context["data_absent"]), ([0], [1]))
+
+
+class DeleteAttendanceTest(StaffAttendanceTestCase):
+    students_per_course = 20
+
+    def test_queries_do_not_grow_with_reports(self):
+        # Nothing listens to report deletes, so the reports go in one DELETE
+        self.save_attendance([1, 0, 1])
+        self.save_attendance([1, 0] * 10, date="2020-11-03")
+        with CaptureQueriesContext(connection) as three_reports:
+            delete_attendance(Attendance.objects.filter(attendance_date="2020-11-02"))
+        with CaptureQueriesContext(connection) as twenty_reports:
+            delete_attendance(Attendance.objects.filter(attendance_date="2020-11-03"))
+        self.assertEqual(len(twenty_reports), len(three_reports))
+        self.assertFalse(AttendanceReport.objects.exists())
+        self.assertEqual({row[3:] for row in summary_rows()}, {(0, 0, 0)})
+
+
+class SaveAttendanceDataTest(StaffAttendanceTestCase):
+    students_per_course = 30
+
+    def test_saves_all_reports(self):
+        response = self.save_attendance([1, 0] * 15)
+        self.assertEqual(response.content, b"OK")
+        reports = AttendanceReport.objects.filter(attendance_id__attendance_date="2020-11-02").order_by("student_id")
+        self.assertEqual([report.status for report in reports], [True, False] * 15)
+
+    def test_unknown_student_rejects_whole_roll_call(self):
+        student_data = [{"id": self.students[0].admin_id, "status": 1}, {"id": 999999, "status": 0}]
+        response = self.client.post("/save_attendance_data/", {"student_ids": json.dumps(student_data), "subject_id": self.subject.id, "attendance_date": "2020-11-02", "session_year_id": self.session_year.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"status": "error", "error": "unknown_students", "student_ids": [999999]})
+        self.assertFalse(Attendance.objects.exists())
+        self.assertFalse(AttendanceSummary.objects.exists())
+
+    def test_query_count_is_flat(self):
+        # Roll call of 3 students and of 30 students costs the same number of queries
+        self.students, all_students = self.students[:3], self.students
+        small = self.count_queries(self.save_attendance, [1, 0, 1])
+        self.students = all_students
+        self.assertEqual(self.count_queries(self.save_attendance, [1, 0, 1] * 10, date="2020-11-03"), small)
+
+
+class UpdateAttendanceDataTest(StaffAttendanceTestCase):
+    students_per_course = 30
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0] * 15)
+        self.attendance = Attendance.objects.get()
+
+    def test_returns_diff_summary(self):
+        response = self.update_attendance(self.attendance, [0, 1, 0, 1] + [1, 0] * 13)
+        self.assertEqual(response.json(), {"status": "OK", "changed": 4, "unchanged": 26, "marked_present": 2, "marked_absent": 2})
+        self.assertEqual(AttendanceReport.objects.filter(status=True).count(), 15)
+        self.assertEqual([row[3:] for row in summary_rows()[:4]], [(0, 1, 1), (1, 0, 1), (0, 1, 1), (1, 0, 1)])
+
+    def test_query_count_is_flat(self):
+        # Every update below switches students both ways
+        self.students, all_students = self.students[:3], self.students
+        small = self.count_queries(self.update_attendance, self.attendance, [0, 1, 1])
+        self.students = all_students
+        self.assertEqual(self.count_queries(self.update_attendance, self.attendance, [1, 0, 0] * 10), small)
+        self.assertEqual(AttendanceReport.objects.filter(status=True).count(), 10)
+
+
+class QueryCountMiddleWareTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(make_user("hod", 1))
+
+    @override_settings(QUERY_COUNT_ENABLED=True, QUERY_COUNT_THRESHOLD=None)
+    def test_reports_queries_and_view(self):
+        with self.assertLogs("student_management_app.metrics", "INFO") as logs:
+            response = self.client.get("/admin_home/")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "student_management_app.HodViews.admin_home")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertEqual(len(logs.records), 1)
+
+    @override_settings(QUERY_COUNT_ENABLED=True, QUERY_COUNT_THRESHOLD=1)
+    def test_logs_queries_over_threshold(self):
+        with self.assertLogs("student_management_app.metrics", "WARNING") as logs:
+            self.client.get("/admin_home/")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(len(record["sql"]), record["queries"])
+
+    @override_settings(QUERY_COUNT_ENABLED=True, QUERY_COUNT_THRESHOLD=0)
+    def test_counts_queries_of_async_views(self):
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(QueryCountMiddleWare(get_response)))
+
+        self.async_client.force_login(make_user("async-hod", 1))
+        with override_settings(ROOT_URLCONF=app_urlconf(True)), self.assertLogs("student_management_app.metrics", "WARNING") as logs:
+            async_to_sync(self.async_client.post)("/check_email_exist/", {"email": "nobody@example.com"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "student_management_app.AsyncViews.check_email_exist")
+        # The query of the view, run by the async ORM
+        self.assertTrue(any('"email" = ' in query["sql"] for query in record["sql"]))
+
+    def test_disabled_by_default(self):
+        response = self.client.get("/admin_home/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class BenchmarkCommandsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_and_run_benchmarks(self):
+        call_command("generate_university", courses=2, subjects_per_course=2, staffs=2, students=6, lectures=3, stdout=io.StringIO())
+        self.assertEqual(Students.objects.count(), 6)
+        self.assertEqual(AttendanceReport.objects.count(), 2 * 2 * 3 * 3)
+        self.assertEqual(sum(row[5] for row in summary_rows()), AttendanceReport.objects.count())
+
+        report = run_benchmarks(repeat=1, warmup=0)
+        self.assertEqual(set(report["scenarios"]), set(SCENARIOS))
+        for name, result in report["scenarios"].items():
+            self.assertEqual(result["status"], 304 if name.endswith("_not_modified") else 200, name)
+            self.assertGreater(result["queries"], 0, name)
+        # Building a dashboard runs its queries on top of those of a cache hit
+        for name in ("admin_home", "staff_home", "student_home"):
+            self.assertGreater(report["scenarios"][name]["queries"], report["scenarios"][name + "_cached"]["queries"], name)
+        self.assertEqual(Attendance.objects.count(), 2 * 2 * 3)
+
+        plans = explain_plans()["explain"]
+        self.assertEqual(set(plans), set(EXPLAINS))
+        self.assertIn("attendance_subject_session_idx", plans["attendance_by_subject_session"])
+
+    def test_write_concurrency_needs_a_database_file(self):
+        # The test database is in memory
+        with self.assertRaises(CommandError):
+            call_command("run_benchmarks", write_concurrency=True, stdout=io.StringIO())
+
+    def test_report_is_unique_per_attendance_and_student(self):
+        call_command("generate_university", courses=1, subjects_per_course=1, staffs=1, students=1, lectures=1, stdout=io.StringIO())
+        report = AttendanceReport.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AttendanceReport.objects.create(student_id=report.student_id, attendance_id=report.attendance_id, status=True)
+
+
+class ManageStudentDataTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_university(self.session_year, courses=2, students_per_course=6, lectures=0)
+        self.client.force_login(make_user("hod", 1))
+
+    def get_page(self, **params):
+        query = {"draw": 1, "start": 0, "length": 5, "columns[0][data]": "id", "columns[1][data]": "last_name", "columns[2][data]": "username", "order[0][column]": 2, "order[0][dir]": "desc"}
+        query.update(params)
+        return self.client.get("/manage_student_data/", query).json()
+
+    def test_keyset_pages_match_offset_pages(self):
+        first = self.get_page()
+        self.assertEqual((first["recordsTotal"], first["recordsFiltered"]), (12, 12))
+        usernames = sorted(Students.objects.values_list("admin__username", flat=True), reverse=True)
+        self.assertEqual([row["username"] for row in first["data"]], usernames[:5])
+
+        by_cursor = self.get_page(start=5, cursor=first["cursor"])
+        by_offset = self.get_page(start=5)
+        self.assertEqual(by_cursor["data"], by_offset["data"])
+        self.assertEqual([row["username"] for row in by_cursor["data"]], usernames[5:10])
+
+        # A cursor made for another order is ignored
+        self.assertEqual(self.get_page(start=5, cursor=first["cursor"], **{"order[0][dir]": "asc"})["data"], self.get_page(start=5, **{"order[0][dir]": "asc"})["data"])
+
+    def test_search(self):
+        page = self.get_page(**{"search[value]": "U-STUDENT-1"})
+        self.assertEqual(page["recordsFiltered"], 6)
+        self.assertTrue(all(row["username"].startswith("u-student-1") for row in page["data"]))
+
+    def test_search_reads_the_lower_indexes(self):
+        aliases, condition = prefix_search(STUDENT_SEARCH_FIELDS, "U-Student-1")
+        students = Students.objects.alias(**aliases).filter(condition)
+        self.assertEqual(students.count(), 6)
+        plan = students.explain()
+        for index in ("customuser_first_lower_idx", "customuser_last_lower_idx", "customuser_user_lower_idx", "customuser_email_lower_idx"):
+            self.assertIn(index, plan)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        small = self.count_queries(self.get_page, length=2)
+        self.assertEqual(self.count_queries(self.get_page, length=10), small)
+
+    def test_staff_listing(self):
+        response = self.client.get("/manage_staff_data/", {"length": 10})
+        self.assertEqual([row["username"] for row in response.json()["data"]], ["u-staff-0", "u-staff-1"])
+        self.assertEqual(self.client.get("/manage_staff/").status_code, 200)
+        self.assertEqual(self.client.get("/manage_student/").status_code, 200)
+
+
+class StudentFormChoicesTest(UniversityTestCase):
+
+    def test_warm_cache_costs_no_queries(self):
+        AddStudentForm().as_p()
+        self.assertEqual(self.count_queries(lambda: (AddStudentForm().as_p(), EditStudentForm().as_p())), 0)
+
+    def test_new_course_and_session_year_show_up(self):
+        self.assertEqual(dict(AddStudentForm().fields["course_id"].choices), {1: "Default"})
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Courses.objects.create(course_name="Physics")
+            SessionYearModel.objects.create(session_start_year=datetime.date(2021, 9, 1), session_end_year=datetime.date(2022, 6, 30))
+        form = EditStudentForm()
+        self.assertEqual(dict(form.fields["course_id"].choices), {1: "Default", course.id: "Physics"})
+        self.assertIn("2021-09-01 to 2022-06-30", dict(form.fields["session_year_id"].choices).values())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(dict(AddStudentForm().fields["course_id"].choices), {1: "Default"})
+
+
+class DashboardCacheTest(StaffAttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0, 1])
+        self.hod = make_user("hod", 1)
+
+    def get_dashboard(self, user, path):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        # Queries of the view itself, without the session and user lookups
+        return response, len([query for query in queries if "django_session" not in query["sql"] and 'FROM "student_management_app_customuser"' not in query["sql"]])
+
+    def test_second_visit_is_served_from_cache(self):
+        dashboards = (
+            (self.hod, "/admin_home/", "student_attendance_present_list"),
+            (self.subject.staff_id, "/staff_home/", "attendance_present_list"),
+            (self.students[0].admin, "/student_home/", "data_present"),
+        )
+        for user, path, key in dashboards:
+            first, first_queries = self.get_dashboard(user, path)
+            second, second_queries = self.get_dashboard(user, path)
+            self.assertGreater(first_queries, 0, path)
+            self.assertEqual(second_queries, 0, path)
+            self.assertEqual(first.context[key], second.context[key], path)
+
+        stats = dashboard_cache_stats()
+        self.assertEqual({role: (counts["hits"], counts["misses"]) for role, counts in stats.items()}, {"admin": (1, 1), "staff": (1, 1), "student": (1, 1)})
+
+        self.client.force_login(self.hod)
+        self.assertEqual(self.client.get("/dashboard_cache_stats/").json()["admin"]["hit_ratio"], 0.5)
+
+    def test_attendance_update_invalidates_staff_student_and_admin(self):
+        staff, student = self.subject.staff_id, self.students[1].admin
+        self.assertEqual(self.get_dashboard(staff, "/staff_home/")[0].context["attendance_present_list"], [1, 0, 1])
+        self.assertEqual(self.get_dashboard(student, "/student_home/")[0].context["attendance_present"], 0)
+        self.get_dashboard(self.hod, "/admin_home/")
+
+        self.client.force_login(staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.update_attendance(Attendance.objects.get(), [1, 1, 1])
+
+        self.assertEqual(self.get_dashboard(staff, "/staff_home/")[0].context["attendance_present_list"], [1, 1, 1])
+        self.assertEqual(self.get_dashboard(student, "/student_home/")[0].context["attendance_present"], 1)
+        self.assertEqual(self.get_dashboard(self.hod, "/admin_home/")[0].context["student_attendance_present_list"], naive_admin_dashboard_context()["student_attendance_present_list"])
+
+    def test_invalidation_is_limited_to_affected_users(self):
+        other_course = Courses.objects.create(course_name="Other")
+        other_staff = make_user("other-staff", 2)
+        Subjects.objects.create(subject_name="Other subject", course_id=other_course, staff_id=other_staff)
+        self.get_dashboard(other_staff, "/staff_home/")
+        self.get_dashboard(self.subject.staff_id, "/staff_home/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaveReportStaff.objects.create(staff_id=self.subject.staff_id.staffs, leave_date="2020-11-01", leave_message="", leave_status=1)
+        self.assertGreater(self.get_dashboard(self.subject.staff_id, "/staff_home/")[1], 0)
+        self.assertEqual(self.get_dashboard(other_staff, "/staff_home/")[1], 0)
+
+        # Moving a Student to the other Course changes both staff dashboards
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Students.objects.get(id=self.students[0].id)
+            student.course_id = other_course
+            student.save()
+        self.assertEqual(self.get_dashboard(other_staff, "/staff_home/")[0].context["students_count"], 1)
+
+    def test_saving_user_does_not_invalidate(self):
+        self.get_dashboard(self.hod, "/admin_home/")
+        with self.captureOnCommitCallbacks(execute=True):
+            # Every login saves the user
+            self.students[0].admin.save(update_fields=["last_login"])
+        self.assertEqual(self.get_dashboard(self.hod, "/admin_home/")[1], 0)
+
+    def test_rename_invalidates(self):
+        self.assertIn(self.students[0].admin.first_name, self.get_dashboard(self.hod, "/admin_home/")[0].context["student_name_list"])
+        self.get_dashboard(self.subject.staff_id, "/staff_home/")
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Students.objects.select_related("admin").get(id=self.students[0].id)
+            update_profile(student.admin, {"first_name": "Renamed"}, student)
+            staff = CustomUser.objects.get(id=self.subject.staff_id_id)
+            update_profile(staff, {"first_name": "Renamed staff"})
+
+        context = self.get_dashboard(self.hod, "/admin_home/")[0].context
+        self.assertEqual((context["student_name_list"][0], context["staff_name_list"]), ("Renamed", ["Renamed staff"]))
+        self.assertIn("Renamed", str(self.get_dashboard(self.subject.staff_id, "/staff_home/")[0].context["student_list"]))
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backends = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "dashboard": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+            }
+            with override_settings(CACHES=backends, DASHBOARD_CACHE_ALIAS="dashboard"):
+                staff = self.subject.staff_id
+                self.get_dashboard(staff, "/staff_home/")
+                self.assertEqual(self.get_dashboard(staff, "/staff_home/")[1], 0)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.force_login(staff)
+                    self.save_attendance([0, 0, 0], date="2020-11-03")
+                self.assertEqual(self.get_dashboard(staff, "/staff_home/")[0].context["attendance_absent_list"], [1, 2, 1])
+                self.assertEqual(dashboard_cache_stats()["staff"]["hits"], 1)
+                caches["dashboard"].clear()
+
+
+class AttendanceApiTest(StaffAttendanceTestCase):
+    students_per_course = 30
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0] * 15)
+        self.attendance = Attendance.objects.get()
+        self.roll_call_params = {"subject": self.subject.id, "session_year": self.session_year.id}
+
+    def get_json(self, path, params, **headers):
+        response = self.client.get(path, params, **headers)
+        return response, json.loads(b"".join(response.streaming_content)) if response.status_code == 200 else None
+
+    def test_endpoints_return_json_arrays(self):
+        response, roll_call = self.get_json("/api/v1/attendance/roll_call/", self.roll_call_params)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(roll_call, [{"id": student.admin_id, "name": student.admin.first_name+" "+student.admin.last_name} for student in self.students])
+
+        dates = self.get_json("/api/v1/attendance/dates/", self.roll_call_params)[1]
+        self.assertEqual(dates, [{"id": self.attendance.id, "attendance_date": "2020-11-02", "session_year_id": self.session_year.id}])
+
+        reports = self.get_json("/api/v1/attendance/students/", {"attendance": self.attendance.id})[1]
+        self.assertEqual([(row["id"], row["status"]) for row in reports], [(student.admin_id, i % 2 == 0) for i, student in enumerate(self.students)])
+
+        # The older POST endpoints return the same arrays, no longer encoded twice
+        response = self.client.post("/get_attendance_student/", {"attendance_date": self.attendance.id})
+        self.assertEqual(response.json(), reports)
+
+    def test_unchanged_roll_call_is_not_modified(self):
+        etag = self.client.get("/api/v1/attendance/roll_call/", self.roll_call_params)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/attendance/roll_call/", self.roll_call_params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any("SELECT \"student_management_app_students\".\"admin_id\"" in query["sql"] for query in queries))
+
+        # A student changing their name changes the roll call
+        self.client.force_login(self.students[0].admin)
+        self.client.post("/student_profile_update/", {"first_name": "Renamed", "last_name": "Test", "password": "", "address": ""})
+        self.client.force_login(self.subject.staff_id)
+        response, roll_call = self.get_json("/api/v1/attendance/roll_call/", self.roll_call_params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(roll_call[0]["name"], "Renamed Test")
+
+    def test_updated_reports_change_etag(self):
+        params = {"attendance": self.attendance.id}
+        etag = self.client.get("/api/v1/attendance/students/", params)["ETag"]
+        self.assertEqual(self.client.get("/api/v1/attendance/students/", params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.update_attendance(self.attendance, [0, 1] * 15)
+        self.assertEqual(self.client.get("/api/v1/attendance/students/", params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_count_does_not_depend_on_cohort(self):
+        def fetch():
+            b"".join(self.client.get("/api/v1/attendance/students/", {"attendance": self.attendance.id}).streaming_content)
+        large = self.count_queries(fetch)
+        self.students = self.students[:2]
+        self.save_attendance([1, 1], date="2020-11-03")
+        self.attendance = Attendance.objects.get(attendance_date="2020-11-03")
+        self.assertEqual(self.count_queries(fetch), large)
+
+    def test_invalid_parameters_and_roles(self):
+        response = self.client.get("/api/v1/attendance/roll_call/", {"subject": "x"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_parameters")
+        self.assertEqual(self.client.post("/api/v1/attendance/roll_call/", self.roll_call_params).status_code, 405)
+
+        self.client.force_login(self.students[0].admin)
+        self.assertRedirects(self.client.get("/api/v1/attendance/roll_call/", self.roll_call_params), "/student_home/")
+
+
+class ExportTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_university(self.session_year, courses=2, students_per_course=3, lectures=2)
+        self.course = Courses.objects.get(course_name="u-course-0")
+        self.client.force_login(make_user("hod", 1))
+
+    def get_csv(self, name, **params):
+        response = self.client.get("/export/%s.csv" % name, params)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_attendance_csv(self):
+        rows = self.get_csv("attendance", session_year=self.session_year.id)
+        self.assertEqual(rows[0][-2:], ["Date", "Status"])
+        self.assertEqual(len(rows) - 1, AttendanceReport.objects.count())
+        self.assertEqual(sum(row[-1] == "Present" for row in rows[1:]), AttendanceReport.objects.filter(status=True).count())
+
+        rows = self.get_csv("attendance", course=self.course.id)
+        self.assertEqual({row[4] for row in rows[1:]}, {"u-course-0"})
+        self.assertEqual(len(rows) - 1, 3 * 2)
+
+    def test_leaves_and_filters(self):
+        rows = self.get_csv("student_leaves", course=self.course.id)
+        self.assertEqual([row[-1] for row in rows[1:]], ["Pending", "Approved", "Rejected"])
+        rows = self.get_csv("staff_leaves", subject=Subjects.objects.get(course_id=self.course).id)
+        self.assertEqual([row[-1] for row in rows[1:]], ["Approved", "Rejected"])
+
+        response = self.client.get("/export/staff_leaves.csv", {"session_year": self.session_year.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/export/attendance.pdf").status_code, 400)
+        self.assertEqual(self.client.get("/export/attendance.csv", {"course": "x"}).status_code, 400)
+
+    def test_xlsx_is_a_workbook(self):
+        response = self.client.get("/export/attendance.xlsx", {"course": self.course.id})
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as workbook:
+            sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 1 + 3 * 2)
+        self.assertIn("<t>u-course-0</t>", sheet)
+
+    def test_formulas_are_written_as_text(self):
+        student = Students.objects.filter(course_id=self.course).select_related("admin").first()
+        CustomUser.objects.filter(id=student.admin_id).update(first_name="=HYPERLINK(\"http://example.com\")", last_name="-1+2")
+        rows = self.get_csv("attendance", course=self.course.id)
+        self.assertIn(["'=HYPERLINK(\"http://example.com\")", "'-1+2"], [row[2:4] for row in rows[1:]])
+
+        response = self.client.get("/export/attendance.xlsx", {"course": self.course.id})
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as workbook:
+            self.assertIn("<t>'-1+2</t>", workbook.read("xl/worksheets/sheet1.xml").decode())
+
+    def test_query_count_does_not_depend_on_size(self):
+        def export():
+            b"".join(self.client.get("/export/attendance.csv").streaming_content)
+        small = self.count_queries(export)
+        build_university(self.session_year, courses=3, students_per_course=5, lectures=3, prefix="more")
+        self.assertEqual(self.count_queries(export), small)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "attendance.csv")
+            call_command("export_data", "attendance", "--subject", str(Subjects.objects.get(course_id=self.course).id), "--output", path, stdout=io.StringIO())
+            with open(path, newline="") as f:
+                self.assertEqual(len(list(csv.reader(f))), 1 + 3 * 2)
+
+
+class AttendanceMatrixTest(StaffAttendanceTestCase):
+    students_per_course = 4
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0, 1, 1], date="2020-11-03")
+        self.save_attendance([0, 0, 1, 1], date="2020-11-02")
+        # The last student only joined for the third lecture
+        self.students, late = self.students[:3], self.students[3]
+        self.save_attendance([1, 1, 1], date="2020-11-01")
+        self.students.append(late)
+
+    def test_matches_per_date_reports(self):
+        matrix = self.client.get("/api/v1/attendance/matrix/", {"subject": self.subject.id, "session_year": self.session_year.id}).json()
+        self.assertEqual([date["date"] for date in matrix["dates"]], ["2020-11-01", "2020-11-02", "2020-11-03"])
+        names = {student.admin_id: student.admin.first_name+" "+student.admin.last_name for student in self.students}
+        self.assertEqual(matrix["students"], sorted(({"id": admin_id, "name": name} for admin_id, name in names.items()), key=lambda s: s["name"]))
+
+        # Every column holds what get_attendance_student returns for that date
+        cells = dict(zip((student["id"] for student in matrix["students"]), matrix["cells"]))
+        for column, date in enumerate(matrix["dates"]):
+            reports = self.client.post("/get_attendance_student/", {"attendance_date": date["id"]}).json()
+            expected = {report["id"]: "1" if report["status"] else "0" for report in reports}
+            self.assertEqual({admin_id: row[column] for admin_id, row in cells.items() if row[column] != "-"}, expected)
+        self.assertEqual(cells[self.students[3].admin_id], "-11")
+
+        self.assertEqual(matrix["date_percentages"], [100.0, 50.0, 75.0])
+        self.assertEqual(matrix["student_percentages"][[s["id"] for s in matrix["students"]].index(self.students[1].admin_id)], 33.3)
+        self.assertEqual(matrix["overall_percentage"], round(100.0 * 8 / 11, 1))
+
+    def test_query_count(self):
+        # The dates, then the reports
+        self.assertEqual(self.count_queries(AttendanceMatrix.build, self.subject.id, self.session_year.id), 2)
+
+    def test_not_modified_and_page(self):
+        params = {"subject": self.subject.id, "session_year": self.session_year.id}
+        etag = self.client.get("/api/v1/attendance/matrix/", params)["ETag"]
+        self.assertEqual(self.client.get("/api/v1/attendance/matrix/", params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertContains(self.client.get("/staff_attendance_matrix/"), "api/v1/attendance/matrix/")
+
+    def test_attendance_saved_between_the_reads(self):
+        # Attendance saved after the dates were read shows up in the reports only
+        storage = attendance_storage()
+        named_reports = storage.named_reports
+
+        def reports_after_save(**lookups):
+            self.save_attendance([1, 1, 1, 1], date="2020-11-04")
+            return named_reports(**lookups)
+
+        with mock.patch.object(storage, "named_reports", reports_after_save):
+            matrix = AttendanceMatrix.build(self.subject.id, self.session_year.id).as_json()
+        self.assertEqual(len(matrix["dates"]), 3)
+        self.assertEqual(sorted(matrix["cells"]), ["-11", "100", "101", "111"])
+
+    def test_empty(self):
+        matrix = AttendanceMatrix.build(self.subject.id, 0).as_json()
+        self.assertEqual((matrix["dates"], matrix["cells"], matrix["date_percentages"], matrix["overall_percentage"]), ([], [], [], None))
+
+
+@override_settings(ATTENDANCE_STORAGE="packed")
+class PackedAttendanceStorageTest(StaffAttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0, 1])
+        self.save_attendance([1, 1, 0], date="2020-11-03")
+        self.update_attendance(Attendance.objects.get(attendance_date="2020-11-03"), [0, 1, 1])
+
+    def reports(self, storage):
+        return sorted(attendance_storage(storage).named_reports(subject_id=self.subject.id))
+
+    def test_packing(self):
+        statuses = [True, False, False, True, True, False, True, True, False, True]
+        self.assertEqual(unpack_statuses(pack_statuses(statuses), len(statuses)), statuses)
+        self.assertEqual(list(unpack_student_ids(pack_student_ids([1, 70000, 4294967295]))), [1, 70000, 4294967295])
+
+    def test_views_use_packed_rows(self):
+        self.assertFalse(AttendanceReport.objects.exists())
+        self.assertEqual(list(PackedAttendance.objects.order_by("attendance_id").values_list("student_count", "present_count")), [(3, 2), (3, 2)])
+        self.assertEqual([row[3:] for row in summary_rows()], [(1, 1, 2), (1, 1, 2), (2, 0, 2)])
+
+        attendance = Attendance.objects.get(attendance_date="2020-11-03")
+        reports = self.client.post("/get_attendance_student/", {"attendance_date": attendance.id}).json()
+        self.assertEqual([report["status"] for report in reports], [False, True, True])
+        matrix = AttendanceMatrix.build(self.subject.id, self.session_year.id).as_json()
+        self.assertEqual(sorted(matrix["cells"]), ["01", "10", "11"])
+
+        self.client.force_login(self.students[0].admin)
+        response = self.client.post("/student_view_attendance_post/", {"subject": self.subject.id, "start_date": "2020-11-01", "end_date": "2020-11-30"})
+        self.assertEqual([report["status"] for report in response.context["attendance_reports"]], [True, False])
+
+    def test_conversion_round_trip(self):
+        packed = self.reports("packed")
+        summary = summary_rows()
+
+        call_command("convert_attendance_storage", "--to", "rows", stdout=io.StringIO())
+        self.assertFalse(PackedAttendance.objects.exists())
+        self.assertEqual(AttendanceReport.objects.count(), 6)
+        self.assertEqual(self.reports("rows"), packed)
+
+        call_command("convert_attendance_storage", "--to", "packed", "--batch-size", "1", stdout=io.StringIO())
+        self.assertFalse(AttendanceReport.objects.exists())
+        self.assertEqual(self.reports("packed"), packed)
+
+        call_command("rebuild_attendance_summary", stdout=io.StringIO())
+        self.assertEqual(summary_rows(), summary)
+
+    def test_deleted_student_is_skipped(self):
+        self.students[0].admin.delete()
+        attendance = Attendance.objects.get(attendance_date="2020-11-03")
+        self.assertEqual(len(self.client.post("/get_attendance_student/", {"attendance_date": attendance.id}).json()), 2)
+        call_command("rebuild_attendance_summary", stdout=io.StringIO())
+        self.assertEqual(len(summary_rows()), 2)
+
+
+class BackgroundTaskTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        build_university(self.session_year, courses=1, students_per_course=3, lectures=2)
+        self.client.force_login(make_user("hod", 1))
+        self.calls = []
+
+        @task("test_flaky", "Flaky")
+        def flaky(progress, fail_times=0):
+            self.calls.append(fail_times)
+            progress(len(self.calls), 2, "call %d" % len(self.calls))
+            if len(self.calls) <= fail_times:
+                raise RuntimeError("temporary")
+            return {"calls": len(self.calls)}
+        self.addCleanup(TASKS.pop, "test_flaky")
+
+    def run_worker(self):
+        call_command("run_task_worker", "--once", "--threads", "1", stdout=io.StringIO())
+        return list(BackgroundTask.objects.order_by("id"))
+
+    def test_retries_then_succeeds(self):
+        submit("test_flaky", {"fail_times": 1})
+        [background_task] = self.run_worker()
+        self.assertEqual((background_task.status, background_task.attempts, background_task.message), (PENDING, 1, "Retrying: temporary"))
+
+        # Not runnable before its retry delay
+        self.assertIsNone(claim_task("test"))
+        BackgroundTask.objects.update(run_after=background_task.created_at)
+        [background_task] = self.run_worker()
+        self.assertEqual((background_task.status, background_task.attempts, background_task.result), (DONE, 2, '{"calls": 2}'))
+        self.assertEqual((background_task.progress, background_task.total), (2, 2))
+
+    def test_gives_up_after_max_attempts_and_on_bad_parameters(self):
+        BackgroundTask.objects.filter(id=submit("test_flaky", {"fail_times": 5}).id).update(max_attempts=1)
+        submit("test_flaky", {"unknown": 1})
+        self.assertEqual([(t.status, t.attempts) for t in self.run_worker()], [(FAILED, 1), (FAILED, 1)])
+        self.assertIn("TypeError", BackgroundTask.objects.get(status=FAILED, params='{"unknown": 1}').error)
+
+    def test_claim_is_exclusive_and_stale_tasks_are_taken_over(self):
+        submit("test_flaky")
+        self.assertEqual(claim_task("first").worker, "first")
+        self.assertIsNone(claim_task("second"))
+        BackgroundTask.objects.update(heartbeat_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(claim_task("second").attempts, 2)
+
+    def test_hod_page_queues_export_and_rebuild(self):
+        self.assertContains(self.client.get("/background_tasks/"), "Queue Export")
+        response = self.client.post("/submit_background_task/", {"task": "export", "name": "attendance", "file_format": "csv", "course": "x"})
+        self.assertRedirects(response, "/background_tasks/", fetch_redirect_response=False)
+        self.assertFalse(BackgroundTask.objects.exists())
+
+        self.client.post("/submit_background_task/", {"task": "export", "name": "attendance", "file_format": "csv", "session_year": self.session_year.id, "course": ""})
+        self.client.post("/submit_background_task/", {"task": "rebuild_attendance_summary"})
+        with tempfile.TemporaryDirectory() as private_root, override_settings(PRIVATE_FILES_ROOT=private_root):
+            self.run_worker()
+            tasks = self.client.get("/background_tasks_data/").json()["tasks"]
+            self.assertEqual([(t["name"], t["status_label"]) for t in tasks], [("rebuild_attendance_summary", "Done"), ("export", "Done")])
+            self.assertEqual(tasks[0]["result"], {"rows": 3})
+            url = tasks[1]["result"]["url"]
+            self.assertEqual(url, "/download_export/%d/" % tasks[1]["id"])
+            response = self.client.get(url)
+            self.assertEqual(len(list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))), 1 + 3 * 2)
+            response.close()
+
+            # Only the HOD who queued the export gets it
+            self.client.force_login(make_user("other-hod", 1))
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.client.logout()
+            self.assertRedirects(self.client.get(url), "/", fetch_redirect_response=False)
+
+
+class StudentImportTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course = Courses.objects.create(course_name="Import Course")
+        make_student("taken", self.course, self.session_year)
+
+    def csv_data(self, *rows):
+        lines = ["username,email,password,first_name,last_name,address,gender,course_id,session_year_id"]
+        lines += [",".join(str(value) for value in row) for row in rows]
+        return "\n".join(lines).encode()
+
+    def student_row(self, i, **values):
+        row = {"username": "new%d" % i, "email": "new%d@example.com" % i, "password": "secret%d" % i, "first_name": "New", "last_name": str(i),
+               "address": "Street", "gender": "Female", "course_id": self.course.id, "session_year_id": self.session_year.id}
+        row.update(values)
+        return row.values()
+
+    def test_reports_every_invalid_line_and_creates_nothing(self):
+        result = import_students(self.csv_data(
+            self.student_row(0),
+            self.student_row(1, username="Taken"),
+            self.student_row(2, email="new0@example.com", gender="Other"),
+            self.student_row(3, course_id=999999),
+        ))
+        self.assertEqual(result["created"], 0)
+        self.assertEqual([(error["line"], sorted(error["errors"])) for error in result["errors"]], [(3, ["username"]), (4, ["email", "gender"]), (5, ["course_id"])])
+        self.assertFalse(CustomUser.objects.filter(username__startswith="new").exists())
+
+        with self.assertRaises(ValueError):
+            import_students(b"username,email\nx,x@example.com")
+
+    def test_creates_users_and_students_in_batches(self):
+        result = import_students(self.csv_data(*(self.student_row(i, password="same") for i in range(6))), batch_size=4, processes=2)
+        self.assertEqual(result, {"created": 6, "errors": []})
+        # Hashed in the pool, each with its own salt
+        self.assertEqual(len(set(CustomUser.objects.filter(username__startswith="new").values_list("password", flat=True))), 6)
+
+        # The choice lists are cached now, so only the batches add queries
+        small = self.count_queries(import_students, self.csv_data(*(self.student_row(i) for i in range(6, 8))), processes=1)
+        self.assertEqual(self.count_queries(import_students, self.csv_data(*(self.student_row(i) for i in range(8, 16))), processes=1), small)
+
+        student = Students.objects.select_related("admin").get(admin__username="new12")
+        self.assertEqual((student.course_id_id, student.session_year_id_id, student.gender, student.admin.user_type), (self.course.id, self.session_year.id, "Female", "3"))
+        self.assertTrue(student.admin.check_password("secret12"))
+
+    def test_upload_is_imported_by_a_task(self):
+        self.client.force_login(make_user("hod", 1))
+        upload = io.BytesIO(self.csv_data(self.student_row(0), self.student_row(1)))
+        upload.name = "intake.csv"
+        with tempfile.TemporaryDirectory() as private_root, override_settings(PRIVATE_FILES_ROOT=private_root):
+            response = self.client.post("/import_students_save/", {"students_csv": upload})
+            self.assertRedirects(response, "/background_tasks/", fetch_redirect_response=False)
+            call_command("run_task_worker", "--once", "--threads", "1", stdout=io.StringIO())
+            self.assertEqual(os.listdir(os.path.join(private_root, "imports")), [])
+
+            # A rejected file is removed too
+            upload = io.BytesIO(b"username,email\nx,x@example.com")
+            upload.name = "broken.csv"
+            self.client.post("/import_students_save/", {"students_csv": upload})
+            call_command("run_task_worker", "--once", "--threads", "1", stdout=io.StringIO())
+            self.assertEqual(os.listdir(os.path.join(private_root, "imports")), [])
+        self.assertEqual([task.status for task in BackgroundTask.objects.order_by("id")], [DONE, FAILED])
+        self.assertEqual(json.loads(BackgroundTask.objects.order_by("id").first().result), {"created": 2, "error_count": 0, "errors": []})
+        self.assertEqual(Students.objects.filter(admin__username__startswith="new").count(), 2)
+
+
+class ProfileWritesTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = make_student("student", Courses.objects.get(id=1), self.session_year)
+        self.student.admin.set_password("secret")
+        self.student.admin.save(update_fields=["password"])
+
+    def test_roles_are_created_with_their_data(self):
+        staff = create_staff(username="teacher", email="teacher@example.com", address="Street 1")
+        self.assertEqual((staff.user_type, staff.staffs.address), ("2", "Street 1"))
+        self.assertEqual((self.student.session_year_id_id, self.student.admin.user_type), (self.session_year.id, "3"))
+
+    def test_login_writes_only_the_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/doLogin/", {"email": "student@example.com", "password": "secret"})
+        self.assertRedirects(response, "/student_home/", fetch_redirect_response=False)
+        statements = [query["sql"] for query in queries if not query["sql"].split()[0] in ("SAVEPOINT", "RELEASE")]
+        # The user, the new session and the last_login UPDATE, no role row is read or written
+        self.assertEqual(len(statements), 5)
+        [user_write] = [sql for sql in statements if not sql.startswith("SELECT") and '"django_session"' not in sql]
+        self.assertTrue(user_write.startswith('UPDATE "student_management_app_customuser" SET "last_login"'))
+        self.assertFalse([sql for sql in statements if "student_management_app_students" in sql])
+
+    def test_profile_update_writes_only_changes(self):
+        self.client.force_login(self.student.admin)
+        unchanged = {"first_name": "student", "last_name": "Test", "password": "", "address": ""}
+        self.assertEqual(self.count_queries(self.client.post, "/student_profile_update/", unchanged), 3)
+
+        # The name and the Student (for its updated_at) are written, nothing else
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post("/student_profile_update/", dict(unchanged, first_name="Renamed"))
+        updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertIn('SET "first_name"', updates[0])
+        self.assertIn('SET "updated_at"', updates[1])
+
+
+def student_home_view(request):
+    pass
+
+
+student_home_view.__module__ = "student_management_app.StudentViews"
+
+
+class LoginCheckTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = make_student("student", Courses.objects.get(id=1), self.session_year)
+        self.staff = make_user("staff", 2)
+        self.middleware = LoginCheckMiddleWare(lambda request: None)
+
+    def logged_in_request(self, path, user):
+        self.client.force_login(user)
+        request = RequestFactory().get(path)
+        request.session = SessionStore(self.client.session.session_key)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        return request
+
+    def test_roles_are_sent_home(self):
+        self.assertRedirects(self.client.get("/admin_home/"), "/", fetch_redirect_response=False)
+        self.client.force_login(self.student.admin)
+        self.assertRedirects(self.client.get("/admin_home/"), "/student_home/", fetch_redirect_response=False)
+        self.client.force_login(self.staff)
+        self.assertRedirects(self.client.get("/student_home/"), "/staff_home/", fetch_redirect_response=False)
+        self.assertEqual(self.client.get("/staff_home/").status_code, 200)
+
+    def test_allow_roles_opens_a_view_to_other_roles(self):
+        request = self.logged_in_request("/student_view/", self.staff)
+        self.assertEqual(self.middleware.process_view(request, student_home_view, (), {}).url, "/staff_home/")
+        view = allow_roles(2)(lambda request: None)
+        view.__module__ = student_home_view.__module__
+        self.assertIsNone(self.middleware.process_view(request, view, (), {}))
+
+    def test_static_files_do_not_load_the_session(self):
+        request = self.logged_in_request("/static/dist/css/adminlte.min.css", self.student.admin)
+        self.assertEqual(self.count_queries(self.middleware.process_view, request, serve, (), {}), 0)
+        request = self.logged_in_request("/student_home/", self.student.admin)
+        self.assertEqual(self.count_queries(self.middleware.process_view, request, student_home_view, (), {}), 2)
+
+
+    def test_media_needs_a_login(self):
+        request = self.logged_in_request("/media/picture.png", self.student.admin)
+        self.assertIsNone(self.middleware.process_view(request, serve, (), {}))
+        request.user = AnonymousUser()
+        self.assertEqual(self.middleware.process_view(request, serve, (), {}).url, "/")
+
+
+class LoginFastPathTest(UniversityTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = make_student("student", Courses.objects.get(id=1), self.session_year)
+        self.student.admin.set_password("secret")
+        self.student.admin.save(update_fields=["password"])
+        self.backend = EmailBackEnd()
+
+    def test_email_is_compared_without_case(self):
+        response = self.client.post("/doLogin/", {"email": "Student@Example.com", "password": "secret"})
+        self.assertRedirects(response, "/student_home/", fetch_redirect_response=False)
+
+    def test_unknown_email_is_answered_from_the_cache(self):
+        self.assertIsNone(self.backend.authenticate(None, username="nobody@example.com", password="secret"))
+        self.assertEqual(self.count_queries(self.backend.authenticate, None, username="nobody@example.com", password="secret"), 0)
+        # Until a user gets the email
+        with self.captureOnCommitCallbacks(execute=True):
+            create_staff(username="nobody", email="nobody@example.com", password="secret")
+        self.assertEqual(self.backend.authenticate(None, username="nobody@example.com", password="secret").username, "nobody")
+
+    @override_settings(LOGIN_FAILURE_LIMIT=2)
+    def test_failed_logins_are_throttled(self):
+        # From the address of the test client
+        request = RequestFactory().post("/doLogin/")
+        for i in range(2):
+            self.assertIsNone(self.backend.authenticate(request, username="student@example.com", password="wrong"))
+        with self.assertRaises(PermissionDenied):
+            self.backend.authenticate(request, username="student@example.com", password="secret")
+        response = self.client.post("/doLogin/", {"email": "student@example.com", "password": "secret"}, follow=True)
+        self.assertContains(response, "Too many failed logins")
+
+    @override_settings(LOGIN_FAILURE_LIMIT=2, LOGIN_EMAIL_FAILURE_LIMIT=5)
+    def test_lockout_is_per_address(self):
+        # Wrong passwords posted from one address do not lock the user out on another
+        attacker = RequestFactory().post("/doLogin/", REMOTE_ADDR="203.0.113.9")
+        for i in range(2):
+            self.assertIsNone(self.backend.authenticate(attacker, username="student@example.com", password="wrong"))
+        with self.assertRaises(PermissionDenied):
+            self.backend.authenticate(attacker, username="student@example.com", password="secret")
+        owner = RequestFactory().post("/doLogin/", REMOTE_ADDR="198.51.100.7")
+        self.assertEqual(self.backend.authenticate(owner, username="student@example.com", password="secret"), self.student.admin)
+
+        # Guessing spread over many addresses still meets the email ceiling
+        for i in range(3):
+            self.backend.authenticate(RequestFactory().post("/doLogin/", REMOTE_ADDR="192.0.2.%d" % i), username="student@example.com", password="wrong")
+        with self.assertRaises(PermissionDenied):
+            self.backend.authenticate(owner, username="student@example.com", password="secret")
+
+    @override_settings(LOGIN_FAILURE_LIMIT=2)
+    def test_no_lockout_per_address(self):
+        # Users behind one NAT address are not locked out by the failures of the others
+        shared = RequestFactory().post("/doLogin/", REMOTE_ADDR="203.0.113.9")
+        for i in range(250):
+            self.backend.authenticate(shared, username="user%d@example.com" % i, password="wrong")
+        self.assertEqual(self.backend.authenticate(shared, username="student@example.com", password="secret"), self.student.admin)
+
+    def test_async_authenticate_and_cost_change(self):
+        user = async_to_sync(self.backend.aauthenticate)(None, username="student@example.com", password="secret")
+        self.assertEqual(user.id, self.student.admin.id)
+        # A lower cost leaves the stored hash alone
+        stored = CustomUser.objects.get(id=user.id).password
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.backend.authenticate(None, username="student@example.com", password="secret")
+            self.assertEqual(CustomUser.objects.get(id=user.id).password, stored)
+
+            user.set_password("secret")
+            user.save(update_fields=["password"])
+        # A hash made with a lower cost is saved again with the current one
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.backend.authenticate(None, username="student@example.com", password="secret")
+            self.assertTrue(CustomUser.objects.get(id=user.id).password.startswith("pbkdf2_sha256$2000$"))
+
+
+class AsyncViewsTest(StaffAttendanceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.save_attendance([1, 0] * 5)
+        self.attendance = Attendance.objects.get()
+
+    def post_both(self, path, data):
+        # The response of the sync and of the async view
+        responses = []
+        for async_views in (False, True):
+            with override_settings(ROOT_URLCONF=app_urlconf(async_views)):
+                responses.append(self.client.post(path, data))
+        return responses
+
+    def test_async_views_answer_like_the_sync_ones(self):
+        self.client.force_login(self.subject.staff_id)
+        for path, data in [
+            ("/get_students/", {"subject": self.subject.id, "session_year": self.session_year.id}),
+            ("/get_attendance_dates/", {"subject": self.subject.id, "session_year_id": self.session_year.id}),
+            ("/get_attendance_student/", {"attendance_date": self.attendance.id}),
+        ]:
+            sync_response, async_response = self.post_both(path, data)
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+        self.client.force_login(make_user("hod", 1))
+        for path, data in [("/check_email_exist/", {"email": "hod@example.com"}), ("/check_username_exist/", {"username": "nobody"})]:
+            sync_response, async_response = self.post_both(path, data)
+            self.assertEqual(async_response.content, sync_response.content)
+
+    def test_async_views_keep_their_roles(self):
+        self.client.force_login(self.students[0].admin)
+        with override_settings(ROOT_URLCONF=app_urlconf(True)):
+            response = self.client.post("/get_students/", {"subject": self.subject.id, "session_year": self.session_year.id})
+        self.assertRedirects(response, "/student_home/", fetch_redirect_response=False)
+
+
+class DatabaseConfigTest(TestCase):
+
+    def test_environment_settings(self):
+        self.assertEqual(database_settings({}, "db.sqlite3"), {
+            "ENGINE": "django.db.backends.sqlite3", "NAME": "db.sqlite3", "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False,
+        })
+        postgresql = database_settings({"DATABASE_ENGINE": "postgresql", "DATABASE_USER": "crm", "DATABASE_POOL_SIZE": "8"}, "db.sqlite3")
+        self.assertEqual((postgresql["ENGINE"], postgresql["USER"], postgresql["CONN_MAX_AGE"], postgresql["CONN_HEALTH_CHECKS"]), ("student_management_app.db_backends.postgresql", "crm", 60, True))
+        self.assertEqual(postgresql["POOL"], {"SIZE": 8, "TIMEOUT": 10.0})
+        for engine in ("mysql", "oracle"):
+            with self.assertRaises(ValueError):
+                database_settings({"DATABASE_ENGINE": engine}, "db.sqlite3")
+
+    def test_replica_settings(self):
+        primary = database_settings({"DATABASE_ENGINE": "postgresql", "DATABASE_USER": "crm"}, "db.sqlite3")
+        self.assertIsNone(replica_database_settings({}, primary))
+        replica = replica_database_settings({"DATABASE_REPLICA_HOST": "replica.local"}, primary)
+        self.assertEqual((replica["HOST"], replica["USER"], replica["NAME"]), ("replica.local", "crm", "crm_university"))
+        self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+
+    def test_sqlite_tuning(self):
+        tuned = database_settings({"DATABASE_SQLITE_TUNING": "1", "DATABASE_SQLITE_TEMP_STORE_MEMORY": "1"}, "db.sqlite3")
+        self.assertEqual(tuned["ENGINE"], "student_management_app.db_backends.sqlite3")
+        self.assertEqual(list(tuned["PRAGMAS"]), ["journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store"])
+        self.assertNotIn("PRAGMAS", database_settings({"DATABASE_ENGINE": "postgresql", "DATABASE_SQLITE_TUNING": "1"}, "db.sqlite3"))
+
+        directory = tempfile.mkdtemp()
+        settings_dict = dict(connection.settings_dict, ENGINE=tuned["ENGINE"], NAME=os.path.join(directory, "tuned.sqlite3"), PRAGMAS=tuned["PRAGMAS"])
+        wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, alias="tuning_test")
+        try:
+            with wrapper.cursor() as cursor:
+                values = [cursor.execute("PRAGMA %s" % name).fetchone()[0] for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store")]
+            # synchronous NORMAL is 1, temp_store MEMORY is 2
+            self.assertEqual(values, ["wal", 1, 30000, 2])
+        finally:
+            wrapper.close()
+            shutil.rmtree(directory)
+
+    def test_pooled_connections_are_reused(self):
+        # A file database: Django never closes in-memory SQLite connections
+        directory = tempfile.mkdtemp()
+        settings_dict = dict(connection.settings_dict, ENGINE="student_management_app.db_backends.sqlite3", NAME=os.path.join(directory, "pool.sqlite3"), POOL={"SIZE": 1, "TIMEOUT": 0.1}, CONN_HEALTH_CHECKS=True)
+        wrappers = [load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, alias="pool_test") for i in range(2)]
+        try:
+            wrappers[0].ensure_connection()
+            raw_connection = wrappers[0].connection
+            self.assertEqual(wrappers[0].connection_pool().stats()["saturation"], 1.0)
+            # The only connection is taken
+            with self.assertRaises(OperationalError):
+                wrappers[1].ensure_connection()
+
+            wrappers[0].close()
+            wrappers[1].ensure_connection()
+            self.assertIs(wrappers[1].connection, raw_connection)
+            # A broken idle connection is replaced
+            wrappers[1].close()
+            raw_connection.close()
+            wrappers[0].ensure_connection()
+            self.assertIsNot(wrappers[0].connection, raw_connection)
+            wrappers[0].close()
+            stats = wrappers[0].connection_pool().stats()
+            self.assertEqual((stats["created"], stats["timeouts"], stats["in_use"], stats["peak_in_use"]), (2, 1, 0, 1))
+        finally:
+            POOLS.pop("pool_test").close_idle()
+            shutil.rmtree(directory)
+
+
+@override_settings(DATABASE_REPLICA="default")
+class ReplicaRouterTest(SimpleTestCase):
+
+    def test_reads_follow_the_decorator(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Students))
+        with use_replica():
+            self.assertEqual(router.db_for_read(Students), "default")
+        self.assertEqual(router.db_for_write(Students), "default")
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_no_replica(self):
+        with use_replica():
+            self.assertIsNone(ReplicaRouter().db_for_read(Students))
+        self.assertIsNone(ReplicaRouter().db_for_write(Students))
+
+
+@override_settings(DATABASE_REPLICA="default")
+class ReadYourWritesTest(StaffAttendanceTestCase):
+
+    def test_writer_reads_the_primary(self):
+        replica_used = []
+        view = read_replica(lambda request: replica_used.append(replica_reads.get()))
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        view(request)
+
+        self.save_attendance([1, 0, 1])
+        self.assertIn(WRITE_MARKER, self.client.session)
+        request.session = self.client.session
+        view(request)
+        with override_settings(DATABASE_REPLICA_LAG_SECONDS=0):
+            view(request)
+        self.assertEqual(replica_used, [True, False, True])
+
+    def test_async_requests_mark_the_session(self):
+        self.async_client.force_login(self.subject.staff_id)
+        student_data = [{"id": student.admin_id, "status": 1} for student in self.students]
+        response = async_to_sync(self.async_client.post)("/save_attendance_data/", {"student_ids": json.dumps(student_data), "subject_id": self.subject.id, "attendance_date": "2020-11-02", "session_year_id": self.session_year.id})
+        self.assertEqual(response.content, b"OK")
+        self.assertIn(WRITE_MARKER, self.async_client.session)
+
+    def test_reads_do_not_mark_the_session(self):
+        self.client.get("/staff_take_attendance/")
+        self.assertNotIn(WRITE_MARKER, self.client.session)
+
+    def test_no_replica_reads_in_transactions(self):
+        # TestCase runs every test in a transaction
+        with use_replica():
+            self.assertIsNone(ReplicaRouter().db_for_read(Students))
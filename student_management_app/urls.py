@@ -1,19 +1,28 @@
 
+from django.conf import settings
 from django.urls import path, include
 from . import views
-from .import HodViews, StaffViews, StudentViews
+from .import HodViews, StaffViews, StudentViews, ApiViews, AsyncViews
+
+
+def sync_or_async(sync_view, async_view):
+    # The async version (AsyncViews) in ASGI deployments, see ASYNC_VIEWS in settings.py
+    return async_view if getattr(settings, "ASYNC_VIEWS", False) else sync_view
 
 
 urlpatterns = [
     path('', views.loginPage, name="login"),
     # path('accounts/', include('django.contrib.auth.urls')),
-    path('doLogin/', views.doLogin, name="doLogin"),
+    path('doLogin/', sync_or_async(views.doLogin, views.doLoginAsync), name="doLogin"),
     path('get_user_details/', views.get_user_details, name="get_user_details"),
     path('logout_user/', views.logout_user, name="logout_user"),
     path('admin_home/', HodViews.admin_home, name="admin_home"),
+    path('dashboard_cache_stats/', HodViews.dashboard_cache_stats_view, name="dashboard_cache_stats"),
+    path('database_pool_stats/', HodViews.database_pool_stats_view, name="database_pool_stats"),
     path('add_staff/', HodViews.add_staff, name="add_staff"),
     path('add_staff_save/', HodViews.add_staff_save, name="add_staff_save"),
     path('manage_staff/', HodViews.manage_staff, name="manage_staff"),
+    path('manage_staff_data/', HodViews.manage_staff_data, name="manage_staff_data"),
     path('edit_staff/<staff_id>/', HodViews.edit_staff, name="edit_staff"),
     path('edit_staff_save/', HodViews.edit_staff_save, name="edit_staff_save"),
     path('delete_staff/<staff_id>/', HodViews.delete_staff, name="delete_staff"),
@@ -34,6 +43,7 @@ urlpatterns = [
     path('edit_student/<student_id>', HodViews.edit_student, name="edit_student"),
     path('edit_student_save/', HodViews.edit_student_save, name="edit_student_save"),
     path('manage_student/', HodViews.manage_student, name="manage_student"),
+    path('manage_student_data/', HodViews.manage_student_data, name="manage_student_data"),
     path('delete_student/<student_id>/', HodViews.delete_student, name="delete_student"),
     path('add_subject/', HodViews.add_subject, name="add_subject"),
     path('add_subject_save/', HodViews.add_subject_save, name="add_subject_save"),
@@ -41,8 +51,8 @@ urlpatterns = [
     path('edit_subject/<subject_id>/', HodViews.edit_subject, name="edit_subject"),
     path('edit_subject_save/', HodViews.edit_subject_save, name="edit_subject_save"),
     path('delete_subject/<subject_id>/', HodViews.delete_subject, name="delete_subject"),
-    path('check_email_exist/', HodViews.check_email_exist, name="check_email_exist"),
-    path('check_username_exist/', HodViews.check_username_exist, name="check_username_exist"),
+    path('check_email_exist/', sync_or_async(HodViews.check_email_exist, AsyncViews.check_email_exist), name="check_email_exist"),
+    path('check_username_exist/', sync_or_async(HodViews.check_username_exist, AsyncViews.check_username_exist), name="check_username_exist"),
     path('student_feedback_message/', HodViews.student_feedback_message, name="student_feedback_message"),
     path('student_feedback_message_reply/', HodViews.student_feedback_message_reply, name="student_feedback_message_reply"),
     path('staff_feedback_message/', HodViews.staff_feedback_message, name="staff_feedback_message"),
@@ -56,6 +66,12 @@ urlpatterns = [
     path('admin_view_attendance/', HodViews.admin_view_attendance, name="admin_view_attendance"),
     path('admin_get_attendance_dates/', HodViews.admin_get_attendance_dates, name="admin_get_attendance_dates"),
     path('admin_get_attendance_student/', HodViews.admin_get_attendance_student, name="admin_get_attendance_student"),
+    path('export/<slug:name>.<slug:file_format>', HodViews.export_data, name="export_data"),
+    path('background_tasks/', HodViews.background_tasks, name="background_tasks"),
+    path('background_tasks_data/', HodViews.background_tasks_data, name="background_tasks_data"),
+    path('download_export/<int:task_id>/', HodViews.download_export, name="download_export"),
+    path('submit_background_task/', HodViews.submit_background_task, name="submit_background_task"),
+    path('import_students_save/', HodViews.import_students_save, name="import_students_save"),
     path('admin_profile/', HodViews.admin_profile, name="admin_profile"),
     path('admin_profile_update/', HodViews.admin_profile_update, name="admin_profile_update"),
     
@@ -64,11 +80,12 @@ urlpatterns = [
     # URLS for Staff
     path('staff_home/', StaffViews.staff_home, name="staff_home"),
     path('staff_take_attendance/', StaffViews.staff_take_attendance, name="staff_take_attendance"),
-    path('get_students/', StaffViews.get_students, name="get_students"),
+    path('get_students/', sync_or_async(StaffViews.get_students, AsyncViews.get_students), name="get_students"),
     path('save_attendance_data/', StaffViews.save_attendance_data, name="save_attendance_data"),
     path('staff_update_attendance/', StaffViews.staff_update_attendance, name="staff_update_attendance"),
-    path('get_attendance_dates/', StaffViews.get_attendance_dates, name="get_attendance_dates"),
-    path('get_attendance_student/', StaffViews.get_attendance_student, name="get_attendance_student"),
+    path('staff_attendance_matrix/', StaffViews.staff_attendance_matrix, name="staff_attendance_matrix"),
+    path('get_attendance_dates/', sync_or_async(StaffViews.get_attendance_dates, AsyncViews.get_attendance_dates), name="get_attendance_dates"),
+    path('get_attendance_student/', sync_or_async(StaffViews.get_attendance_student, AsyncViews.get_attendance_student), name="get_attendance_student"),
     path('update_attendance_data/', StaffViews.update_attendance_data, name="update_attendance_data"),
     path('staff_apply_leave/', StaffViews.staff_apply_leave, name="staff_apply_leave"),
     path('staff_apply_leave_save/', StaffViews.staff_apply_leave_save, name="staff_apply_leave_save"),
@@ -90,4 +107,10 @@ urlpatterns = [
     path('student_profile/', StudentViews.student_profile, name="student_profile"),
     path('student_profile_update/', StudentViews.student_profile_update, name="student_profile_update"),
     path('student_view_result/', StudentViews.student_view_result, name="student_view_result"),
+
+    # JSON API for HOD and Staff
+    path('api/v1/attendance/roll_call/', ApiViews.attendance_roll_call, name="api_v1_attendance_roll_call"),
+    path('api/v1/attendance/dates/', ApiViews.attendance_dates, name="api_v1_attendance_dates"),
+    path('api/v1/attendance/students/', ApiViews.attendance_students, name="api_v1_attendance_students"),
+    path('api/v1/attendance/matrix/', ApiViews.attendance_matrix, name="api_v1_attendance_matrix"),
 ]
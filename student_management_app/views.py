@@ -1,47 +1,81 @@
 # from channels.auth import login, logout
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login, logout
 from django.http import HttpResponseRedirect, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
 
 from student_management_app.EmailBackEnd import EmailBackEnd
+from student_management_app.LoginCheckMiddleWare import login_not_required
 
 
 def home(request):
     return render(request, 'index.html')
 
 
+@login_not_required
 def loginPage(request):
     return render(request, 'login.html')
 
 
 
+def login_redirect(request, user):
+    # The home page of the role of a logged in user
+    user_type = user.user_type
+    #return HttpResponse("Email: "+request.POST.get('email')+ " Password: "+request.POST.get('password'))
+    if user_type == '1':
+        return redirect('admin_home')
+
+    elif user_type == '2':
+        # return HttpResponse("Staff Login")
+        return redirect('staff_home')
+
+    elif user_type == '3':
+        # return HttpResponse("Student Login")
+        return redirect('student_home')
+    else:
+        messages.error(request, "Invalid Login!")
+        return redirect('login')
+
+
+def login_failed(request, throttled=False):
+    if throttled:
+        messages.error(request, "Too many failed logins, try again in a few minutes.")
+    else:
+        messages.error(request, "Invalid Login Credentials!")
+    #return HttpResponseRedirect("/")
+    return redirect('login')
+
+
+@login_not_required
 def doLogin(request):
     if request.method != "POST":
         return HttpResponse("<h2>Method Not Allowed</h2>")
-    else:
-        user = EmailBackEnd.authenticate(request, username=request.POST.get('email'), password=request.POST.get('password'))
-        if user != None:
-            login(request, user)
-            user_type = user.user_type
-            #return HttpResponse("Email: "+request.POST.get('email')+ " Password: "+request.POST.get('password'))
-            if user_type == '1':
-                return redirect('admin_home')
-                
-            elif user_type == '2':
-                # return HttpResponse("Staff Login")
-                return redirect('staff_home')
-                
-            elif user_type == '3':
-                # return HttpResponse("Student Login")
-                return redirect('student_home')
-            else:
-                messages.error(request, "Invalid Login!")
-                return redirect('login')
-        else:
-            messages.error(request, "Invalid Login Credentials!")
-            #return HttpResponseRedirect("/")
-            return redirect('login')
+    try:
+        user = EmailBackEnd().authenticate(request, username=request.POST.get('email'), password=request.POST.get('password'))
+    except PermissionDenied:
+        return login_failed(request, throttled=True)
+    if user is None:
+        return login_failed(request)
+    login(request, user)
+    return login_redirect(request, user)
+
+
+# doLogin for ASGI deployments (ASYNC_VIEWS): the password hash runs in a worker thread
+# instead of holding the event loop
+@login_not_required
+async def doLoginAsync(request):
+    if request.method != "POST":
+        return HttpResponse("<h2>Method Not Allowed</h2>")
+    try:
+        user = await EmailBackEnd().aauthenticate(request, username=request.POST.get('email'), password=request.POST.get('password'))
+    except PermissionDenied:
+        return login_failed(request, throttled=True)
+    if user is None:
+        return login_failed(request)
+    await sync_to_async(login)(request, user)
+    return login_redirect(request, user)
 
 
 